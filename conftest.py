@@ -0,0 +1,36 @@
+import threading
+from http.server import ThreadingHTTPServer
+import pytest
+
+"""
+Shared pytest fixtures.
+
+`http_server` starts local HTTP servers for the tests of the network clients (the OFLC downloader, the BLS
+API client), so the stand-ins of the remote services only have to define their request handler.
+"""
+
+@pytest.fixture
+def http_server():
+    """
+    Factory of local HTTP servers: `http_server(handler, **attributes)` serves `handler` on a free port of
+    127.0.0.1 in a background thread and returns the server, with the given attributes set on it (state
+    shared with the handler, e.g. the requests received) and its base URL in `server.url`.
+    The servers are shut down at the end of the test.
+    """
+    servers = []
+
+    def start(handler, **attributes):
+        # The request log of the handler would only clutter the test output
+        quiet_handler = type(handler.__name__, (handler,), {'log_message': lambda self, *args: None})
+        server = ThreadingHTTPServer(('127.0.0.1', 0), quiet_handler)
+        for name, value in attributes.items():
+            setattr(server, name, value)
+        server.url = f"http://127.0.0.1:{server.server_port}/"
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
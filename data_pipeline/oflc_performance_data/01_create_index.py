@@ -1,9 +1,13 @@
+import os
 import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 import re
 import logging
 from config import SCRAPE_URL, LOG_LEVEL, LOG_FORMAT, LOG_FILE, INDEX_FILE_PATH
+from config import DOWNLOAD_URL_BASE, FETCH_PLAN_PATH, INDEX_METADATA_COLUMNS, RAW_DATA_DIR, RAW_FILE_TEMPLATE
+from config import MAX_DOWNLOAD_WORKERS, TIMEOUT, ensure_directories
+from downloader import create_session, download_many
 
 # Set up logging
 logging.basicConfig(filename=LOG_FILE, level=LOG_LEVEL, format=LOG_FORMAT)
@@ -118,6 +122,123 @@ def scrape_links(soup):
             data.append(result)
     return pd.DataFrame(data, columns=['year', 'program', 'link'])
 
+def fetch_remote_metadata(links, download_url_base=DOWNLOAD_URL_BASE, session=None, max_workers=MAX_DOWNLOAD_WORKERS):
+    """
+    Adds the remote metadata of each link (Content-Length, ETag and Last-Modified) to the index.
+
+    The metadata is obtained with concurrent HEAD requests. Links whose HEAD request fails get missing
+    metadata, which makes them count as changed when building the fetch plan.
+
+    Args:
+        links (pd.DataFrame): A DataFrame with columns ['year', 'program', 'link'].
+        download_url_base (str): The base URL the links are relative to. Defaults to DOWNLOAD_URL_BASE.
+        session (requests.Session): Pooled session used for the requests. Defaults to a new session.
+        max_workers (int): Maximum number of concurrent HEAD requests.
+
+    Returns:
+        pd.DataFrame: The links with the columns in INDEX_METADATA_COLUMNS added.
+    """
+    session = session or create_session(pool_size=max_workers)
+
+    def head(link):
+        response = session.head(download_url_base + link, allow_redirects=True, timeout=TIMEOUT)
+        response.raise_for_status()
+        return (
+            response.headers.get('Content-Length'),
+            response.headers.get('ETag'),
+            response.headers.get('Last-Modified'),
+        )
+
+    results = download_many(links['link'].tolist(), head, max_workers=max_workers)
+    metadata = pd.DataFrame(
+        [result if error is None else (None, None, None) for _, result, error in results],
+        columns=INDEX_METADATA_COLUMNS, index=links.index
+    )
+    metadata['content_length'] = pd.to_numeric(metadata['content_length'], errors='coerce').astype('Int64')
+    logger.info(f"Fetched remote metadata for {metadata['etag'].notna().sum()} of {len(links)} links")
+    return pd.concat([links, metadata], axis=1)
+
+def create_fetch_plan(index, previous_index=None, previous_plan=None, raw_data_dir=RAW_DATA_DIR):
+    """
+    Compares the new index against the previous one and returns the files that need to be downloaded.
+
+    A file is planned for download when:
+        - 'new': the link was not in the previous index.
+        - 'changed': the ETag, Last-Modified or Content-Length reported by the server differ from the
+            previous index, or the server did not report any metadata for the link.
+        - 'missing': the converted raw file does not exist locally.
+        - 'pending': the file was in the previous plan and has not been downloaded successfully yet.
+
+    Args:
+        index (pd.DataFrame): The new index, with the columns in INDEX_METADATA_COLUMNS.
+        previous_index (pd.DataFrame): The index saved by the previous run, if any.
+        previous_plan (pd.DataFrame): The fetch plan left by the previous run, if any.
+        raw_data_dir (str): Directory holding the raw data files.
+
+    Returns:
+        pd.DataFrame: The rows of the index to download, with an additional 'reason' column.
+    """
+    plan = index.copy()
+    plan['reason'] = None
+
+    if previous_index is not None and not previous_index.empty:
+        previous = previous_index.set_index('link').reindex(index=plan['link'], columns=['year'] + INDEX_METADATA_COLUMNS)
+        previous.index = plan.index
+        # Content-Length is read back from the CSV as float when some values are missing
+        previous['content_length'] = pd.to_numeric(previous['content_length'], errors='coerce').astype('Int64')
+        # Missing metadata on both sides counts as equal, missing on one side only counts as a change
+        new_metadata = plan[INDEX_METADATA_COLUMNS].astype('string').fillna('')
+        old_metadata = previous[INDEX_METADATA_COLUMNS].astype('string').fillna('')
+        changed = (new_metadata != old_metadata).any(axis=1) | plan[INDEX_METADATA_COLUMNS].isna().all(axis=1)
+        plan.loc[changed, 'reason'] = 'changed'
+        plan.loc[previous['year'].isna(), 'reason'] = 'new'
+    else:
+        plan['reason'] = 'new'
+
+    local_files = [
+        os.path.join(raw_data_dir, program, RAW_FILE_TEMPLATE.format(year=year, program=program))
+        for year, program in zip(plan['year'], plan['program'])
+    ]
+    missing = ~pd.Series([os.path.exists(f) for f in local_files], index=plan.index)
+    plan.loc[plan['reason'].isna() & missing, 'reason'] = 'missing'
+
+    if previous_plan is not None and not previous_plan.empty:
+        pending = plan['link'].isin(previous_plan['link'])
+        plan.loc[plan['reason'].isna() & pending, 'reason'] = 'pending'
+
+    plan = plan[plan['reason'].notna()].reset_index(drop=True)
+    logger.info(f"Fetch plan: {len(plan)} of {len(index)} files, {plan['reason'].value_counts().to_dict()}")
+    return plan
+
+def read_previous(path):
+    """
+    Reads a CSV file saved by a previous run, returning None if it does not exist or cannot be read.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        return pd.read_csv(path)
+    except Exception as e:
+        logger.warning(f"Could not read {path}: {e}")
+        return None
+
+def write_if_changed(df, path):
+    """
+    Writes a DataFrame to a CSV file, leaving the file (and its modification time) untouched when its
+    content would not change, so the stages reading it (see run_pipeline.py) are not rerun for nothing.
+
+    Returns:
+        bool: True if the file was written.
+    """
+    content = df.to_csv(index=False)
+    if os.path.exists(path):
+        with open(path, newline='') as f:
+            if f.read() == content:
+                return False
+    with open(path, 'w', newline='') as f:
+        f.write(content)
+    return True
+
 def create_index():
     """
     Creates an index by scraping links from a specified URL and prints a summary of the indexed data.
@@ -127,11 +248,12 @@ def create_index():
     3. Parses the HTML content using BeautifulSoup.
     4. Scrapes links from the parsed HTML content.
     5. Logs the number of valid links found.
-    6. Prints a summary of the indexed data, including the programs, available years, total years, most recent year, oldest year, and the number of files for each program.
-    7. Prints the total number of files indexed.
-    8. Returns the scraped links.
+    6. Fetches the remote metadata (Content-Length, ETag, Last-Modified) of each link.
+    7. Prints a summary of the indexed data, including the programs, available years, total years, most recent year, oldest year, and the number of files for each program.
+    8. Prints the total number of files indexed.
+    9. Returns the scraped links.
     Returns:
-        DataFrame: A DataFrame containing the scraped links if the request is successful.
+        DataFrame: A DataFrame containing the scraped links and their remote metadata if the request is successful.
         None: If there is an error fetching the URL.
     Raises:
         requests.RequestException: If there is an error with the GET request.
@@ -144,6 +266,8 @@ def create_index():
         links = scrape_links(soup)
         
         logger.info(f"Found {len(links)} valid links")
+
+        links = fetch_remote_metadata(links)
         
         # Print summary
         print("\nIndex Creation Summary:")
@@ -165,10 +289,20 @@ def create_index():
         return None
 
 if __name__ == "__main__":
+    ensure_directories()
     index = create_index()
     if index is not None:
+        # Compare against the previous run before overwriting it
+        plan = create_fetch_plan(index, read_previous(INDEX_FILE_PATH), read_previous(FETCH_PLAN_PATH))
+        if write_if_changed(plan, FETCH_PLAN_PATH):
+            logger.info(f"Fetch plan with {len(plan)} files saved to {FETCH_PLAN_PATH}")
+        print(f"Files to fetch: {len(plan)}")
         # Save the index to a CSV file
-        index.to_csv(INDEX_FILE_PATH, index=False)
-        logger.info(f"Index saved to {INDEX_FILE_PATH}")
+        if write_if_changed(index, INDEX_FILE_PATH):
+            logger.info(f"Index saved to {INDEX_FILE_PATH}")
+        else:
+            logger.info("Index unchanged since the last run")
     else:
         logger.error("Failed to create index")
+        # A non-zero exit status stops the stages that depend on the index (see run_pipeline.py)
+        raise SystemExit(1)
@@ -1,8 +1,11 @@
 import os
+from contextlib import nullcontext
 import pandas as pd
-import requests
-from config import RAW_DATA_DIR, INDEX_FILE_PATH, DOWNLOAD_URL_BASE
-from xlsx2csv import Xlsx2csv
+from config import RAW_DATA_DIR, INDEX_FILE_PATH, FETCH_PLAN_PATH, DOWNLOAD_URL_BASE, MAX_DOWNLOAD_WORKERS
+from config import RAW_FILE_TEMPLATE, ensure_directories
+from downloader import create_session, download_file, download_many
+from convert import excel_to_parquet
+from metrics import Metrics, profiled, profiling_modes
 import logging
 from tqdm import tqdm
 
@@ -10,26 +13,23 @@ from tqdm import tqdm
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Function to convert Excel file to CSV
-def excel_to_csv(excel_file, csv_file):
-    try:
-        Xlsx2csv(excel_file, outputencoding="utf-8").convert(csv_file)
-        logger.info(f"Converted {excel_file} to {csv_file}")
-    except Exception as e:
-        logger.error(f"Error converting {excel_file} to CSV: {e}")
-        raise
-
-def download_and_convert(row, program_dir, download_url_base=DOWNLOAD_URL_BASE):
+def download_and_convert(row, program_dir, download_url_base=DOWNLOAD_URL_BASE, session=None, profile=False):
     """
-    Downloads an Excel file from a given URL, converts it to CSV format, and deletes the original Excel file.
+    Downloads an Excel file from a given URL, converts it to Parquet format, and deletes the original Excel file.
+
+    The file is streamed to disk in chunks and partial downloads are resumed (see `downloader.download_file`),
+    then the worksheet rows are streamed into the Parquet file (see `convert.excel_to_parquet`).
 
     Args:
         row (tuple): A tuple containing the year, program name, and the link to the Excel file.
         program_dir (str): The directory where the downloaded file will be saved.
         download_url_base (str): The base URL for downloading the file. Defaults to DOWNLOAD_URL_BASE.
+        session (requests.Session): Pooled session used for the download. Defaults to a new session.
+        profile (bool): Profile the file when profiling is enabled (see `metrics.profiled`). Only for files
+            fetched one at a time: profiles of files fetched concurrently in threads would mix.
 
     Returns:
-        tuple: A tuple containing the status ("Success" or "Failed") and the path to the CSV file or the original filename in case of failure.
+        tuple: A tuple containing the status ("Success" or "Failed") and the path to the Parquet file or the original filename in case of failure.
 
     Raises:
         Exception: If there is an error during the download or conversion process, it will be logged and the function will return "Failed".
@@ -39,88 +39,146 @@ def download_and_convert(row, program_dir, download_url_base=DOWNLOAD_URL_BASE):
     filename = os.path.join(program_dir, f"{year}_{program}.xlsx")
     logger.info(f"Downloading {filename}...")
     try:
-        response = requests.get(link, timeout=30)
-        response.raise_for_status()
-        with open(filename, 'wb') as f:
-            f.write(response.content)
-        logger.info(f"Downloaded {filename}")
-
-        csv_filename = filename.replace(".xlsx", ".csv")
-        excel_to_csv(filename, csv_filename)
+        # Files are downloaded in threads of one process, so the peak memory is the peak of the process
+        with Metrics('download', scope='file', reset_peak=False, program=program, year=year) as metrics, \
+                (profiled(f"download_{program}_{year}") if profile else nullcontext()):
+            with metrics.step('download'):
+                download_file(link, filename, session=session)
+            metrics.count(bytes_read=os.path.getsize(filename))
+            logger.info(f"Downloaded {filename}")
+
+            parquet_filename = os.path.join(program_dir, RAW_FILE_TEMPLATE.format(year=year, program=program))
+            with metrics.step('convert'):
+                n_rows = excel_to_parquet(filename, parquet_filename)
+            metrics.count(rows_out=n_rows, bytes_written=os.path.getsize(parquet_filename))
 
         os.remove(filename)
         logger.info(f"Deleted original file {filename}")
-        return "Success", csv_filename
+        return "Success", parquet_filename
     except Exception as e:
         logger.error(f"Error processing {filename}: {e}")
         return "Failed", filename
 
 def process_error_files(error_files):
     """
-    Processes a list of error files by attempting to read each file with pandas,
-    converting it to a CSV file, and then deleting the original file.
+    Processes a list of error files by converting them again with the streaming reader, this time
+    ignoring the sheet dimensions stored in the workbook (a common reason for the first conversion to fail),
+    and then deleting the original file.
 
     Args:
         error_files (list of str): List of file paths to the error files to be processed.
 
+    Returns:
+        list of str: The files that were successfully processed.
+
     Logs:
-        - Info: When attempting to read a file and save it as CSV.
+        - Info: When attempting to convert a file again.
         - Info: When a file is successfully processed.
-        - Error: When there is an error reading a file with pandas.
+        - Error: When the file cannot be converted.
     """
+    processed_files = []
     for file in error_files:
-        logger.info(f"Attempting to read {file} with pandas and save as CSV...")
+        logger.info(f"Attempting to convert {file} again ignoring the stored sheet dimensions...")
         try:
-            df = pd.read_excel(file, engine='openpyxl')
-            df.to_csv(file.replace(".xlsx", ".csv"), index=False)
+            year, program = os.path.splitext(os.path.basename(file))[0].split('_', 1)
+            parquet_file = os.path.join(os.path.dirname(file), RAW_FILE_TEMPLATE.format(year=year, program=program))
+            with Metrics('download', scope='file', reset_peak=False, program=program, year=year, retry=True) as metrics:
+                metrics.count(bytes_read=os.path.getsize(file))
+                with metrics.step('convert'):
+                    n_rows = excel_to_parquet(file, parquet_file, reset_dimensions=True)
+                metrics.count(rows_out=n_rows, bytes_written=os.path.getsize(parquet_file))
             os.remove(file)
-            logger.info(f"Successfully processed {file} with pandas")
+            logger.info(f"Successfully processed {file}")
+            processed_files.append(file)
         except Exception as e:
-            logger.error(f"Error reading {file} with pandas: {e}")
+            logger.error(f"Error converting {file}: {e}")
+    return processed_files
 
-def main():
+def main(download_url_base=DOWNLOAD_URL_BASE, max_workers=MAX_DOWNLOAD_WORKERS, use_plan=True):
     """
     Main function to download and process raw data files.
 
-    This function reads an index file containing links to raw data files,
-    processes each file by downloading and converting it, and logs the progress.
+    This function reads the fetch plan written by `01_create_index.py` (or the full index file),
+    downloads and converts the files concurrently, and logs the progress.
     If any errors occur during the process, they are logged and handled separately.
 
     The function performs the following steps:
-    1. Reads the index file containing links to raw data files.
+    1. Reads the fetch plan listing new and changed files, falling back to the full index file.
     2. Initializes a progress bar to track the processing of files.
-    3. Iterates over the grouped data by 'program' and processes each file.
-    4. Downloads and converts each file, logging any errors encountered.
+    3. Creates a pooled session shared by all the download workers.
+    4. Downloads and converts up to `max_workers` files at a time, logging any errors encountered.
     5. Updates the progress bar with the status of each processed file.
     6. Handles any files that encountered errors during processing.
+    7. Rewrites the fetch plan so it only keeps the files that failed (retried on the next run).
+
+    The download and conversion times, sizes and rows of every file are written to the metrics file
+    (see metrics.py). When profiling is enabled, the files are fetched one at a time.
+
+    Args:
+        download_url_base (str): The base URL for downloading the files. Defaults to DOWNLOAD_URL_BASE.
+        max_workers (int): Maximum number of files downloaded at the same time. Defaults to MAX_DOWNLOAD_WORKERS.
+        use_plan (bool): Download only the files in the fetch plan (if there is one). Defaults to True.
 
     Returns:
-        None
+        dict: Counters of the run (files fetched and failed), None if the file list could not be loaded.
     """
+    source = FETCH_PLAN_PATH if use_plan and os.path.exists(FETCH_PLAN_PATH) else INDEX_FILE_PATH
     try:
-        links = pd.read_csv(INDEX_FILE_PATH)
-        logger.info(f"Loaded index file from {INDEX_FILE_PATH}")
+        links = pd.read_csv(source)
+        logger.info(f"Loaded {len(links)} links from {source}")
     except Exception as e:
         logger.error(f"Error loading index file: {e}")
-        return
-
-    error_files = []
-    total_files = len(links)
-
-    with tqdm(total=total_files, desc="Processing files", unit="file", colour='green') as pbar:
-        for group, g in links.groupby('program'):
-            pbar.set_description(f"Processing {group}")
-            program_dir = os.path.join(RAW_DATA_DIR, group)
-            os.makedirs(program_dir, exist_ok=True)
-
-            for _, row in g.iterrows():
-                message, file = download_and_convert((row['year'], row['program'], row['link']), program_dir)
-                if message == "Failed":
-                    error_files.append(file)
-                pbar.update(1)
-                pbar.set_postfix_str(f"Last processed: {row['year']}_{row['program']}")
-
-    process_error_files(error_files)
+        return None
+
+    if 'reason' in links.columns:
+        # Partial downloads of files that changed on the server cannot be resumed
+        for _, row in links[links['reason'] == 'changed'].iterrows():
+            part_file = os.path.join(RAW_DATA_DIR, row['program'], f"{row['year']}_{row['program']}.xlsx.part")
+            if os.path.exists(part_file):
+                os.remove(part_file)
+
+    for program in links['program'].unique():
+        os.makedirs(os.path.join(RAW_DATA_DIR, program), exist_ok=True)
+
+    tasks = list(links[['year', 'program', 'link']].itertuples(index=False, name=None))
+    if profiling_modes() and max_workers > 1:
+        # Profiles of files fetched concurrently in threads would mix (see `metrics.profiled`)
+        logger.info("Profiling enabled, fetching the files one at a time")
+        max_workers = 1
+    session = create_session(pool_size=max_workers)
+    failed_files = {}
+
+    def worker(row):
+        program_dir = os.path.join(RAW_DATA_DIR, row[1])
+        return download_and_convert(row, program_dir, download_url_base=download_url_base, session=session,
+                                    profile=max_workers == 1)
+
+    with tqdm(total=len(tasks), desc="Processing files", unit="file", colour='green') as pbar:
+        def on_done(row, result, error):
+            if error is not None or result[0] == "Failed":
+                file = result[1] if result else os.path.join(RAW_DATA_DIR, row[1], f"{row[0]}_{row[1]}.xlsx")
+                failed_files[file] = row[2]
+            pbar.update(1)
+            pbar.set_postfix_str(f"Last processed: {row[0]}_{row[1]}")
+
+        download_many(tasks, worker, max_workers=max_workers, on_done=on_done)
+
+    # Only files that were downloaded but could not be converted can be recovered
+    recovered_files = process_error_files([f for f in failed_files if os.path.exists(f)])
+    failed_links = [link for file, link in failed_files.items() if file not in recovered_files]
+
+    if source == FETCH_PLAN_PATH:
+        remaining = links[links['link'].isin(failed_links)]
+        remaining.to_csv(FETCH_PLAN_PATH, index=False)
+        logger.info(f"{len(links) - len(remaining)} files fetched, {len(remaining)} left in {FETCH_PLAN_PATH}")
+
+    return {'files': len(tasks), 'files_failed': len(failed_links)}
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    ensure_directories()
+    # Metrics of the whole stage; the metrics of every file are written by `download_and_convert`
+    with Metrics('download', scope='stage', reset_peak=False) as metrics:
+        counters = main()
+        if counters is None:
+            metrics.status = 'failed'
+        metrics.count(**(counters or {}))
\ No newline at end of file
@@ -1,9 +1,22 @@
 import os
+import numpy as np
 import pandas as pd
 import re
+import hashlib
+import inspect
 import logging
-from config import RAW_DATA_DIR, PROCESSED_DATA_DIR, PROGRAMS_PROCESS, COLUMNS_DICT
-from config import LOG_LEVEL, LOG_FORMAT, LOG_FILE, PROCESSED_FILE_TEMPLATE
+import argparse
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from config import RAW_DATA_DIR, PROCESSED_DATASET_DIR, PROGRAMS_PROCESS, COLUMNS_DICT, COLUMN_DTYPES
+from config import LOG_LEVEL, LOG_FORMAT, LOG_FILE, PROCESSED_FILE_TEMPLATE, MANIFEST_PATH, ROW_GROUP_SIZE
+from config import MAX_WORKERS, MEMORY_FACTOR, ensure_directories
+from config import HOURS_PER_YEAR, WAGE_UNIT_FACTORS, WAGE_UNIT_ALIASES, WINSOR_QUANTILES, WAGE_YR_BOUNDS
+from config import EMPLOYER_INDEX_DIR, EMPLOYER_LEGAL_SUFFIXES
+from manifest import file_digest, header_fingerprint, load_manifest, save_manifest, is_up_to_date
+import schema
+from employers import normalize_employer_names, employer_ids, add_employer_ids, build_employer_index, EMPLOYERS_FILE
+from metrics import Metrics, profiled, read_children_peak_rss
 from tqdm import tqdm
 
 # Set up logging
@@ -123,6 +136,31 @@ def handle_special_cases(df, year, program):
             logging.error(f"Error splitting WAGE_RATE_FROM: {e}")
     return df
 
+def has_numbered_columns(year, program):
+    """
+    Check whether the raw file uses numbered column names (e.g. WORKSITE_CITY_1), as the 2019-2024 LCA files do.
+
+    Parameters:
+    year (int): The year associated with the data.
+    program (str): The program type.
+
+    Returns:
+    bool: True if the `_1` suffix has to be stripped from the column names.
+    """
+    return (int(year) in range(2019, 2025)) & (program == 'LCA')
+
+def strip_numbered_suffix(columns):
+    """
+    Strip the `_1` suffix from column names (but not from names like `ADDRESS_11` or `2007_1`).
+
+    Parameters:
+    columns (pd.Index): The column names.
+
+    Returns:
+    pd.Index: The column names without the suffix.
+    """
+    return columns.str.replace(r'(?<!\d)_1$', '', regex=True)
+
 def process_data(df, year, program, columns_dict):
     """
     Process the given DataFrame by cleaning column names, renaming columns, handling special cases,
@@ -154,8 +192,8 @@ def process_data(df, year, program, columns_dict):
         logging.info(f"Program = {program}, year = {year}, all columns present.")
 
     # Pre-process the data to drop unnecessary columns and rows
-    if (int(year) in range(2019, 2025)) & (program == 'LCA'):
-        df.columns = df.columns.str.replace(r'(?<!\d)_1$', '', regex=True)
+    if has_numbered_columns(year, program):
+        df.columns = strip_numbered_suffix(df.columns)
         size_before = df.shape[0]
         df = df[(df['TOTAL_WORKERS'].isnull()) | (df['TOTAL_WORKERS'] == df['TOTAL_WORKERS'])]
         logging.info(f"Year = {year}, number of rows = {df.shape[0]}, percentage of rows = {df.shape[0] / size_before * 100:.2f}%")
@@ -165,46 +203,429 @@ def process_data(df, year, program, columns_dict):
     columns_to_keep = list(set(sum(columns_dict.values(), []))) + ['PROGRAM']
     return df[columns_to_keep]
 
-def process_and_save_program_data():
+def select_raw_columns(header, year, program, columns_dict):
+    """
+    Select the raw columns needed to build the required output columns, by running the raw header
+    through the same normalization as `process_data` (`clean_column_names`, `rename_columns` and the
+    `_1` suffix stripping of the 2019-2024 LCA files).
+
+    Parameters:
+    header (list): The raw column names, in file order.
+    year (int): The year associated with the data.
+    program (str): The program type, which can be "PERM" or "LCA".
+    columns_dict (Dict[str, List[str]]): A dictionary mapping column categories to lists of required columns.
+
+    Returns:
+    List[int]: The positions of the raw columns that map to a required output column.
+    """
+    required = set(sum(columns_dict.values(), []))
+    normalized = rename_columns(clean_column_names(pd.DataFrame(columns=header))).columns
+    if has_numbered_columns(year, program):
+        normalized = strip_numbered_suffix(normalized)
+    return [i for i, column in enumerate(normalized) if column in required]
+
+def read_raw_file(raw_file, year, program, columns_dict):
+    """
+    Read only the raw columns that map to required output columns, all of them as strings.
+
+    The header is read first to find the required columns, so the (up to 100+) unused columns of the
+    recent LCA files are never parsed, and the explicit dtype avoids the type guessing of `low_memory=False`.
+    Columns are cast to their registered dtypes when the processed data is written (see `to_output_frame`).
+    Raw files are Parquet files written by `02_download_raw_data.py` (CSV files from older runs are also supported).
+
+    Parameters:
+    raw_file (str): Path to the raw Parquet or CSV file.
+    year (int): The year associated with the data.
+    program (str): The program type, which can be "PERM" or "LCA".
+    columns_dict (Dict[str, List[str]]): A dictionary mapping column categories to lists of required columns.
+
+    Returns:
+    pd.DataFrame: The required raw columns, with their raw names.
+    """
+    if raw_file.endswith('.parquet'):
+        header = pd.Index(pq.read_schema(raw_file).names)
+    else:
+        header = pd.read_csv(raw_file, nrows=0).columns
+    usecols = select_raw_columns(header, year, program, columns_dict)
+    logger.info(f"Reading {len(usecols)} of {len(header)} columns from {raw_file}")
+    if raw_file.endswith('.parquet'):
+        return pq.read_table(raw_file, columns=list(header[usecols])).to_pandas()
+    return pd.read_csv(raw_file, usecols=usecols, dtype=str)
+
+def list_raw_files(program):
+    """
+    List the raw files of a program, sorted by name. When both a Parquet file and a CSV file from an
+    older run exist for the same year, only the Parquet file is listed.
+
+    Parameters:
+    program (str): The program name.
+
+    Returns:
+    List[str]: The raw file names (relative to the program directory).
+    """
+    files = {}
+    for f in sorted(os.listdir(os.path.join(RAW_DATA_DIR, program))):
+        stem, extension = os.path.splitext(f)
+        if extension == '.parquet' or (extension == '.csv' and stem not in files):
+            files[stem] = f
+    return sorted(files.values())
+
+def to_output_frame(df):
+    """
+    Casts the processed data to the schema registry (COLUMN_DTYPES, see `schema.enforce_schema`) so that
+    all partitions share one compact schema: categoricals for low-cardinality columns, integer-coded
+    SOC and NAICS codes, float32 wages and nullable integers.
+    The partition columns are dropped since they are encoded in the partition path.
+
+    Parameters:
+    df (pd.DataFrame): The processed DataFrame.
+
+    Returns:
+    pd.DataFrame: The DataFrame ready to be written as a partition.
+    """
+    return annualize_wages(schema.enforce_schema(df))
+
+def normalize_unit_of_pay(units):
+    """
+    Maps the units of pay to their canonical names (WAGE_UNIT_ALIASES, e.g. 'yr' -> 'Year'). Only the
+    categories are mapped, the rows are relabeled through their category codes.
+
+    Parameters:
+    units (pd.Series): The UNIT_OF_PAY column (categorical).
+
+    Returns:
+    pd.Categorical: The canonical units of pay.
+    """
+    units = units.astype('category')
+    labels = [WAGE_UNIT_ALIASES.get(str(c).strip().lower(), str(c).strip()) for c in units.cat.categories]
+    categories = list(dict.fromkeys(labels))
+    # The extra -1 at the end keeps missing values (code -1) missing
+    remap = np.array([categories.index(label) for label in labels] + [-1])
+    return pd.Categorical.from_codes(remap[units.cat.codes.to_numpy()], categories)
+
+def annualize_wages(df, unit_factors=WAGE_UNIT_FACTORS, quantiles=WINSOR_QUANTILES, bounds=WAGE_YR_BOUNDS):
+    """
+    Winsorizes WAGE_RATE_FROM within each unit of pay and converts it to annual and hourly wages.
+
+    The quantiles of every unit of pay are computed in a single groupby pass and broadcast back to the
+    rows through the unit codes, and the unit factors are looked up the same way, so no Python code runs
+    per row. A partition holds one fiscal year, so wages are winsorized per unit of pay and fiscal year.
+
+    Adds (or overwrites) the columns:
+        WAGE_RATE_FROM_W1: WAGE_RATE_FROM winsorized at `quantiles` within its unit of pay.
+        WAGE_YR: The winsorized wage times the number of pay periods per year of its unit of pay.
+        WAGE_HR: WAGE_YR divided by HOURS_PER_YEAR.
+        WAGE_WINSORIZED: Whether the wage was clipped by the winsorization.
+        WAGE_OUTLIER: Whether WAGE_YR falls outside `bounds`.
+    Wages with an unknown unit of pay get no annual or hourly wage.
+
+    Parameters:
+    df (pd.DataFrame): The processed DataFrame, with the schema registry dtypes.
+    unit_factors (dict): Number of pay periods per year for each canonical unit of pay.
+    quantiles (tuple): Lower and upper winsorization quantiles.
+    bounds (tuple): Lower and upper bounds of plausible annual wages.
+
+    Returns:
+    pd.DataFrame: The DataFrame with the derived wage columns.
+    """
+    units = normalize_unit_of_pay(df['UNIT_OF_PAY'])
+    codes = units.codes
+    wage = df['WAGE_RATE_FROM'].to_numpy(dtype='float64', na_value=np.nan)
+
+    # Quantiles of every unit (one row per unit code, plus a last row for the missing unit, code -1)
+    limits = pd.Series(wage).groupby(codes).quantile(list(quantiles)).unstack()
+    limits = limits.reindex(index=list(range(len(units.categories))) + [-1], columns=list(quantiles)).to_numpy()
+    lower, upper = limits[codes, 0], limits[codes, 1]
+    winsorized = np.clip(wage, lower, upper)
+    winsorized = np.where(np.isnan(lower), wage, winsorized)
+
+    factors = np.array([unit_factors.get(u, np.nan) for u in units.categories] + [np.nan], dtype='float64')
+    wage_yr = winsorized * factors[codes]
+    missing = np.isnan(wage_yr)
+
+    df['UNIT_OF_PAY'] = units
+    df['WAGE_RATE_FROM_W1'] = winsorized.astype('float32')
+    df['WAGE_YR'] = wage_yr.astype('float32')
+    df['WAGE_HR'] = (wage_yr / HOURS_PER_YEAR).astype('float32')
+    df['WAGE_WINSORIZED'] = pd.array(winsorized != wage, dtype='boolean')
+    df['WAGE_WINSORIZED'] = df['WAGE_WINSORIZED'].mask(np.isnan(wage))
+    df['WAGE_OUTLIER'] = pd.array((wage_yr < bounds[0]) | (wage_yr > bounds[1]), dtype='boolean')
+    df['WAGE_OUTLIER'] = df['WAGE_OUTLIER'].mask(missing)
+    return df
+
+def partition_path(program, year):
+    """
+    Returns the path of the partition of the processed dataset holding a raw file of a program and fiscal
+    year (raw files of the same program and year, e.g. a CSV and the Parquet file replacing it, share it).
+    """
+    return os.path.join(PROCESSED_DATASET_DIR, PROCESSED_FILE_TEMPLATE.format(program=program, year=year))
+
+def write_partition(df, program, year):
+    """
+    Writes the processed data of one raw file as a partition of the processed dataset.
+    The file is written to a temporary path first so readers never see a partially written partition.
+
+    Parameters:
+    df (pd.DataFrame): The processed DataFrame.
+    program (str): The program name.
+    year (int): The fiscal year of the raw file.
+
+    Returns:
+    str: The path to the written partition.
+    """
+    output_file = partition_path(program, year)
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    to_output_frame(df).to_parquet(output_file + '.tmp', index=False, row_group_size=ROW_GROUP_SIZE)
+    os.replace(output_file + '.tmp', output_file)
+    return output_file
+
+def processing_version():
+    """
+    Computes the version of the processing logic as a hash of the source code of the functions that
+    transform a raw file (and of COLUMNS_DICT and the output layout). Any change to them invalidates
+    the processed partitions.
+
+    Returns:
+        str: A short hash identifying the processing logic.
+    """
+    functions = (clean_column_names, rename_columns, handle_special_cases, has_numbered_columns,
+                 strip_numbered_suffix, process_data, select_raw_columns, read_raw_file, to_output_frame,
+                 normalize_unit_of_pay, annualize_wages, normalize_employer_names, employer_ids, add_employer_ids)
+    sources = [inspect.getsource(f) for f in functions]
+    sources += [inspect.getsource(schema), repr(COLUMNS_DICT), repr(COLUMN_DTYPES), PROCESSED_FILE_TEMPLATE]
+    sources += [repr(WAGE_UNIT_FACTORS), repr(WAGE_UNIT_ALIASES), repr(WINSOR_QUANTILES), repr(WAGE_YR_BOUNDS)]
+    sources += [repr(EMPLOYER_LEGAL_SUFFIXES)]
+    return hashlib.sha256("\n".join(sources).encode()).hexdigest()[:16]
+
+def process_file(program, f, year, entry, version):
+    """
+    Processes a raw file and writes it as a partition of the processed dataset, unless the raw file,
+    its header and the processing logic are unchanged since its partition was written.
+
+    This function does not touch the manifest (it may run in a worker process), the caller records the
+    returned entry. The timings of the steps (hash, parse, process, write), the rows and bytes in and out
+    and the peak memory of the file are written to the metrics file (see metrics.py).
+
+    Parameters:
+    program (str): The program name.
+    f (str): The raw file name (relative to the program directory).
+    year (int): The year associated with the data.
+    entry (dict): The manifest entry of the raw file from the previous run, or None.
+    version (str): The current version of the processing logic.
+
+    Returns:
+    dict: The new manifest entry, or None if the partition was up to date.
+    """
+    raw_file = os.path.join(RAW_DATA_DIR, program, f)
+    with Metrics('process', scope='file', program=program, year=year, file=f) as metrics:
+        with metrics.step('hash'):
+            content_hash, size, mtime_ns = file_digest(raw_file, previous=entry)
+            header = header_fingerprint(raw_file)
+
+        if is_up_to_date(entry, content_hash, header, version):
+            logger.info(f"Program {program} file year {year} unchanged, keeping {entry['artifact']}")
+            metrics.status = 'unchanged'
+            return None
+
+        logger.info(f"Processing program {program} file year {year}")
+        with profiled(f"process_{program}_{year}"):
+            with metrics.step('parse'):
+                data_year = read_raw_file(raw_file, year, program, COLUMNS_DICT).dropna(how='all')
+            metrics.count(rows_in=data_year.shape[0], bytes_read=size)
+            # Add a column for the program name
+            data_year['PROGRAM'] = program
+            with metrics.step('process'):
+                processed_data = add_employer_ids(process_data(data_year, year, program, COLUMNS_DICT))
+            with metrics.step('write'):
+                artifact = write_partition(processed_data, program, year)
+            metrics.count(rows_out=processed_data.shape[0], bytes_written=os.path.getsize(artifact))
+        logger.info(f"Saved {processed_data.shape[0]} rows to {artifact}")
+
+    return {
+        'content_hash': content_hash,
+        'size': size,
+        'mtime_ns': mtime_ns,
+        'header_fingerprint': header,
+        'processing_version': version,
+        'artifact': artifact,
+        'rows': int(processed_data.shape[0]),
+    }
+
+def available_memory():
+    """
+    Returns the physical memory currently available on the machine in bytes, or None if unknown.
+    """
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def run_tasks(tasks, workers=1, memory_budget=None):
+    """
+    Runs `process_file` over the given tasks, in a process pool when `workers` > 1.
+
+    Files are submitted in order, and a new file is only submitted while the estimated memory of the
+    files in flight (raw file size times MEMORY_FACTOR) fits in `memory_budget`. A single file is always
+    allowed to run, however large it is.
+
+    Parameters:
+    tasks (list): List of (program, f, year, entry, version) tuples, the arguments of `process_file`.
+    workers (int): Number of worker processes. With 1 the files are processed in this process.
+    memory_budget (int): Maximum estimated memory (in bytes) of the files in flight, None for no limit.
+
+    Yields:
+    tuple: (task, result, error) for each task as it finishes.
+    """
+    if workers <= 1:
+        for task in tasks:
+            try:
+                yield task, process_file(*task), None
+            except Exception as e:
+                yield task, None, e
+        return
+
+    def estimate(task):
+        return os.path.getsize(os.path.join(RAW_DATA_DIR, task[0], task[1])) * MEMORY_FACTOR
+
+    pending = list(tasks)
+    in_flight = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while pending or in_flight:
+            while pending and len(in_flight) < workers:
+                inflight_memory = sum(memory for _, memory in in_flight.values())
+                memory = estimate(pending[0])
+                if in_flight and memory_budget is not None and inflight_memory + memory > memory_budget:
+                    break
+                task = pending.pop(0)
+                in_flight[executor.submit(process_file, *task)] = (task, memory)
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                task, _ = in_flight.pop(future)
+                try:
+                    yield task, future.result(), None
+                except Exception as e:
+                    yield task, None, e
+
+def process_and_save_program_data(workers=MAX_WORKERS, memory_budget=None):
     """
     Process and save data for each program in the PROGRAMS_PROCESS list.
 
-    This function iterates over each program, reads the raw data files, processes the data,
-    and saves the processed data to the specified directory. It also logs statistics for each program dataset.
+    This function lists the raw data files of every program, processes the data (in parallel across
+    files when `workers` > 1), and saves each file as soon as it is processed as one partition of the
+    Parquet dataset at PROCESSED_DATASET_DIR (partitioned by program and fiscal year). It also logs
+    statistics for each program dataset.
+    Raw files that did not change since the last run (same content hash, header fingerprint and
+    processing logic version, see the manifest at MANIFEST_PATH) keep their existing partition.
+    A file that fails is logged and left out of the manifest, so it is retried on the next run; its
+    partition from a previous run (e.g. of the raw file it replaces) is kept.
+    The employer index (see `employers.build_employer_index`) is rebuilt when any partition changed or
+    was removed.
+
+    Parameters:
+    workers (int): Number of worker processes. Defaults to MAX_WORKERS.
+    memory_budget (int): Maximum estimated memory (in bytes) of the files in flight. Defaults to 80% of
+        the available memory.
+
+    Returns:
+    dict: Counters of the run (files processed, unchanged and failed, rows and bytes written), recorded in
+        the metrics of the stage.
     """
-    for program in tqdm(PROGRAMS_PROCESS, desc="Programs"):
-        program_data = pd.DataFrame()
-        list_files = [f for f in os.listdir(os.path.join(RAW_DATA_DIR, program)) if f.endswith('.csv')]
-        list_files.sort()
+    manifest = load_manifest(MANIFEST_PATH)
+    version = processing_version()
+    schema.save_schema(PROCESSED_DATASET_DIR)
+    if memory_budget is None and available_memory() is not None:
+        memory_budget = int(available_memory() * 0.8)
 
-        for f in tqdm(list_files, desc=f"Processing {program}", leave=False):
+    tasks = []
+    list_files = {}
+    for program in PROGRAMS_PROCESS:
+        list_files[program] = list_raw_files(program)
+        for f in list_files[program]:
             year = re.findall(r'\d{4}', f)
             if year:
-                year = int(year[0])
-                logger.info(f"Processing program {program} file year {year}")
+                tasks.append((program, f, int(year[0]), manifest.get(f"{program}/{f}"), version))
 
-                data_year = pd.read_csv(os.path.join(RAW_DATA_DIR, program, f), low_memory=False).dropna(how='all')
-                # Add a column for the program name
-                data_year['PROGRAM'] = program
-                processed_data = process_data(data_year, year, program, COLUMNS_DICT)
-                program_data = pd.concat([program_data, processed_data], ignore_index=True)
+    previous_artifacts = {key: entry.get('artifact') for key, entry in manifest.items()}
+    n_processed = {program: 0 for program in PROGRAMS_PROCESS}
+    n_failed = 0
+    failed_artifacts = set()
+    n_stale = 0
+    rows_out = bytes_written = 0
+    with tqdm(total=len(tasks), desc="Processing files", unit="file") as pbar:
+        for (program, f, year, entry, _), result, error in run_tasks(tasks, workers, memory_budget):
+            if error is not None:
+                logger.error(f"Error processing program {program} file year {year}: {error}")
+                n_failed += 1
+                failed_artifacts.add(partition_path(program, year))
+            elif result is not None:
+                if entry and entry.get('artifact') not in (None, result['artifact']) and os.path.exists(entry['artifact']):
+                    os.remove(entry['artifact'])
+                manifest[f"{program}/{f}"] = result
+                save_manifest(manifest, MANIFEST_PATH)
+                n_processed[program] += 1
+                rows_out += result['rows']
+                bytes_written += os.path.getsize(result['artifact'])
+            pbar.update(1)
+            pbar.set_postfix_str(f"Last processed: {year}_{program}")
 
-        # Save the processed data for the program
-        output_file = os.path.join(PROCESSED_DATA_DIR, PROCESSED_FILE_TEMPLATE.format(program=program))
-        program_data.to_csv(output_file, index=False)
-        logger.info(f"Saved processed data for {program} to {output_file}")
+    for program in PROGRAMS_PROCESS:
+        # Forget raw files that were removed since the last run
+        stale = [key for key in manifest if key.startswith(f"{program}/") and key.split('/', 1)[1] not in list_files[program]]
+        for key in stale:
+            manifest.pop(key)
+        live_artifacts = {entry.get('artifact') for entry in manifest.values()}
+        for key in stale:
+            # A raw file replaced by a file with the same stem (e.g. a CSV by a Parquet file) shares its
+            # partition, which is kept when the new file failed this run (it is the only good copy)
+            artifact = previous_artifacts.get(key)
+            if (artifact and artifact not in live_artifacts and artifact not in failed_artifacts
+                    and os.path.exists(artifact)):
+                os.remove(artifact)
+        if stale:
+            save_manifest(manifest, MANIFEST_PATH)
+            n_stale += len(stale)
 
-        # Print statistics for the program dataset
+        # Print statistics for the program dataset (from the manifest and the Parquet metadata)
+        entries = [entry for key, entry in sorted(manifest.items()) if key.startswith(f"{program}/")]
+        parquet_schema = pq.read_schema(entries[0]['artifact']) if entries else None
         logger.info(f"\nStatistics for {program} dataset:")
-        logger.info(f"Number of rows: {program_data.shape[0]}")
-        logger.info(f"Number of columns: {program_data.shape[1]}")
-        logger.info(f"Columns: {list(program_data.columns)}")
-        logger.info(f"Data types:\n{program_data.dtypes}")
-        logger.info(f"Memory usage: {program_data.memory_usage().sum() / 1e6:.2f} MB")
-        logger.info(f"Sample data:\n{program_data.head()}\n")
+        logger.info(f"Partitions processed: {n_processed[program]} of {len(entries)}")
+        logger.info(f"Number of rows: {sum(entry['rows'] for entry in entries)}")
+        if parquet_schema is not None:
+            logger.info(f"Number of columns: {len(parquet_schema.names)}")
+        logger.info(f"Size on disk: {sum(os.path.getsize(entry['artifact']) for entry in entries) / 1e6:.2f} MB")
         logger.info("-" * 50)
 
+    # Rebuild the employer index when partitions changed or were removed (or it was never built)
+    if any(n_processed.values()) or n_stale or not os.path.exists(os.path.join(EMPLOYER_INDEX_DIR, EMPLOYERS_FILE)):
+        logger.info("Building the employer index")
+        build_employer_index(PROCESSED_DATASET_DIR, EMPLOYER_INDEX_DIR)
+
+    if n_failed:
+        logger.warning(f"{n_failed} files failed and will be retried on the next run")
+
+    return {
+        'files': len(tasks),
+        'files_processed': sum(n_processed.values()),
+        'files_unchanged': len(tasks) - sum(n_processed.values()) - n_failed,
+        'files_failed': n_failed,
+        'rows_out': rows_out,
+        'bytes_written': bytes_written,
+    }
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the long datasets from the raw OFLC files.")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Number of worker processes (1 = sequential).")
+    parser.add_argument("--memory-budget-mb", type=int, default=None,
+                        help="Maximum estimated memory of the files processed at the same time (MB).")
+    args = parser.parse_args()
+
+    ensure_directories()
     logger.info("Starting data processing")
-    process_and_save_program_data()
+    memory_budget = args.memory_budget_mb * 1_000_000 if args.memory_budget_mb else None
+    # Metrics of the whole stage; the metrics of every file are written by `process_file`
+    with Metrics('process', scope='stage', reset_peak=False, workers=args.workers) as metrics:
+        metrics.count(**process_and_save_program_data(workers=args.workers, memory_budget=memory_budget))
+        metrics.fields['peak_rss_workers'] = read_children_peak_rss()
     logger.info("Data processing completed")
@@ -11,18 +11,41 @@ Attributes:
     SHARED_DATA_DIR (str): Directory for shared data.
     RAW_DATA_DIR (str): Directory for raw data.
     PROCESSED_DATA_DIR (str): Directory for processed data.
+    PROCESSED_DATASET_DIR (str): Root of the partitioned Parquet dataset with the processed long data.
     INDEX_FILE_PATH (str): Path to the index CSV file.
+    CACHE_DIR (str): Directory for the bookkeeping of the incremental rebuild (manifest).
+    MANIFEST_PATH (str): Path to the manifest of processed raw files (content hash, header fingerprint, version).
+    FETCH_PLAN_PATH (str): Path to the CSV file listing the files that need to be (re)downloaded.
+    EMPLOYER_INDEX_DIR (str): Directory of the employer table and the inverted token index of employer names.
     SCRAPE_URL (str): URL for scraping OFLC performance data.I 
     RAW_FILE_TEMPLATE (str): Template for naming raw data files.
-    PROCESSED_FILE_TEMPLATE (str): Template for naming processed data files.
+    PROCESSED_FILE_TEMPLATE (str): Template for the path of a processed partition (relative to PROCESSED_DATASET_DIR).
+    ROW_GROUP_SIZE (int): Number of rows per row group in the processed Parquet files.
+    INDEX_METADATA_COLUMNS (list): Remote metadata recorded in the index to detect changed files.
     PROGRAMS (list): List of program names to be processed.
+    CONVERT_BATCH_SIZE (int): Number of worksheet rows converted to Parquet at a time.
+    MAX_WORKERS (int): Number of worker processes used to process raw files in parallel.
+    MEMORY_FACTOR (int): Estimated peak memory while processing a raw file, as a multiple of its size on disk.
     CHUNK_SIZE (int): Size of chunks for downloading large files.
     TIMEOUT (int): Timeout for download requests in seconds.
+    MAX_DOWNLOAD_WORKERS (int): Number of files downloaded concurrently.
+    MAX_RETRIES (int): Maximum number of retries for failed or interrupted downloads.
+    BACKOFF_FACTOR (float): Backoff factor between download retries.
     LOG_LEVEL (int): Logging level.
     LOG_FORMAT (str): Format for logging messages.
     LOG_FILE (str): Path to the log file.
+    METRICS_FILE (str): Path to the JSON lines file of the performance metrics (see metrics.py).
+    PROFILE_ENV_VAR (str): Environment variable enabling profiling ('cprofile', 'tracemalloc' or both, comma separated).
+    PROFILE_DIR (str): Directory of the profiles written when profiling is enabled.
     DATE_COLUMNS (list): List of columns containing date values.
-    NUMERIC_COLUMNS (list): List of columns containing numeric values.
+    COLUMN_DTYPES (dict): Schema registry with the dtype of each column of the processed data.
+    PARTITION_COLUMNS (list): Columns encoded in the partition paths of the processed dataset.
+    HOURS_PER_YEAR (int): Hours worked in a year, used to convert annual wages to hourly wages.
+    WAGE_UNIT_FACTORS (dict): Number of pay periods per year for each unit of pay.
+    WAGE_UNIT_ALIASES (dict): Spellings of the units of pay in the raw files mapped to their canonical name.
+    WINSOR_QUANTILES (tuple): Lower and upper quantiles at which wages are winsorized within each unit of pay.
+    WAGE_YR_BOUNDS (tuple): Annual wages outside these bounds are flagged as outliers.
+    EMPLOYER_LEGAL_SUFFIXES (list): Legal forms removed from the end of normalized employer names.
 """
 
 # Base paths
@@ -30,11 +53,20 @@ BASE_DIR = '.'
 SHARED_DATA_DIR = os.path.join(BASE_DIR, 'shared_data', 'oflc_performance_data')
 RAW_DATA_DIR = os.path.join(SHARED_DATA_DIR, 'raw')
 PROCESSED_DATA_DIR = os.path.join(SHARED_DATA_DIR, 'processed')
+PROCESSED_DATASET_DIR = os.path.join(PROCESSED_DATA_DIR, 'long')
 INDEX_FILE_PATH = os.path.join(RAW_DATA_DIR, 'index.csv')
+CACHE_DIR = os.path.join(PROCESSED_DATA_DIR, 'cache')
+MANIFEST_PATH = os.path.join(CACHE_DIR, 'manifest.json')
+FETCH_PLAN_PATH = os.path.join(RAW_DATA_DIR, 'fetch_plan.csv')
+EMPLOYER_INDEX_DIR = os.path.join(PROCESSED_DATA_DIR, 'employers')
 
-# Ensure directories exist
-os.makedirs(RAW_DATA_DIR, exist_ok=True)
-os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
+def ensure_directories():
+    """
+    Creates the data directories. Called by the pipeline scripts when they start (importing the
+    configuration has no side effect).
+    """
+    for directory in (RAW_DATA_DIR, PROCESSED_DATA_DIR, CACHE_DIR):
+        os.makedirs(directory, exist_ok=True)
 
 # URL for scraping
 SCRAPE_URL = 'https://www.dol.gov/agencies/eta/foreign-labor/performance#dis'
@@ -43,8 +75,14 @@ SCRAPE_URL = 'https://www.dol.gov/agencies/eta/foreign-labor/performance#dis'
 DOWNLOAD_URL_BASE = 'https://www.dol.gov/'
 
 # File naming conventions
-RAW_FILE_TEMPLATE = "{program}_{year}.xlsx"
-PROCESSED_FILE_TEMPLATE = "{program}_long.csv"
+RAW_FILE_TEMPLATE = "{year}_{program}.parquet"
+# Processed data is partitioned by program and fiscal year (one Parquet partition per raw file),
+# relative to PROCESSED_DATASET_DIR
+PROCESSED_FILE_TEMPLATE = os.path.join("PROGRAM={program}", "FISCAL_YEAR={year}", "part-0.parquet")
+ROW_GROUP_SIZE = 100_000  # rows per Parquet row group
+
+# Remote metadata (from HEAD requests) used to detect files that changed since the last index
+INDEX_METADATA_COLUMNS = ['content_length', 'etag', 'last_modified']
 
 # Program names (download)
 PROGRAMS = ['LCA', 'PERM', 'H-2A', 'H-2B']
@@ -52,6 +90,9 @@ PROGRAMS = ['LCA', 'PERM', 'H-2A', 'H-2B']
 # Program names (processing)
 PROGRAMS_PROCESS = ['LCA', 'PERM']
 
+# Columns encoded in the partition paths (not stored inside the Parquet files)
+PARTITION_COLUMNS = ['PROGRAM', 'FISCAL_YEAR']
+
 # Column definitions
 COLUMNS_DICT = {
     'case_columns': ['CASE_NUMBER', 'CASE_STATUS', 'DECISION_DATE'],
@@ -62,12 +103,96 @@ COLUMNS_DICT = {
     'worksite_columns': ['WORKSITE_STATE', 'WORKSITE_CITY', 'WORKSITE_POSTAL_CODE', 'WORKSITE_ADDRESS1']
 }
 
-# # Download parameters
-# CHUNK_SIZE = 8192  # for downloading large files
-# TIMEOUT = 60  # timeout for download requests in seconds
+# Schema registry: dtype of each column of the processed data, in output order (see schema.py).
+# SOC_CODE and NAICS_CODE are integer-coded (e.g. '15-1132.00' -> 151132); codes without their 6 digits
+# (broad SOC groups, NAICS sectors) are stored as NA.
+COLUMN_DTYPES = {
+    # Case information
+    'CASE_NUMBER'           : 'string',
+    'CASE_STATUS'           : 'category',
+    'DECISION_DATE'         : 'datetime64[ns]',
+    # Industry and occupation
+    'NAICS_CODE'            : 'Int32',
+    'SOC_CODE'              : 'Int32',
+    'JOB_TITLE'             : 'string',
+    # Wages
+    'WAGE_RATE_FROM'        : 'float32',
+    'WAGE_RATE_TO'          : 'float32',
+    'UNIT_OF_PAY'           : 'category',
+    # Employer
+    'EMPLOYER_NAME'         : 'string',
+    'EMPLOYER_NAME_NORMALIZED': 'string',
+    'EMPLOYER_ID'           : 'Int64',
+    'EMPLOYER_ADDRESS'      : 'string',
+    'EMPLOYER_CITY'         : 'string',
+    'EMPLOYER_STATE'        : 'category',
+    'EMPLOYER_POSTAL_CODE'  : 'string',
+    'TOTAL_WORKERS'         : 'Int32',
+    # Worksite
+    'WORKSITE_ADDRESS1'     : 'string',
+    'WORKSITE_CITY'         : 'string',
+    'WORKSITE_STATE'        : 'category',
+    'WORKSITE_POSTAL_CODE'  : 'string',
+    # Derived wages (see `annualize_wages` in 03_create_long_dataset.py)
+    'WAGE_RATE_FROM_W1'     : 'float32',
+    'WAGE_YR'               : 'float32',
+    'WAGE_HR'               : 'float32',
+    'WAGE_WINSORIZED'       : 'boolean',
+    'WAGE_OUTLIER'          : 'boolean',
+}
+
+# Wage parameters
+HOURS_PER_YEAR = 40 * 52
+# Number of pay periods per year for each unit of pay
+WAGE_UNIT_FACTORS = {
+    'Year': 1,
+    'Month': 12,
+    'Bi-Weekly': 26,
+    'Week': 52,
+    'Hour': HOURS_PER_YEAR,
+}
+# Spellings of the units of pay found in the raw files (lowercase) mapped to their canonical name
+WAGE_UNIT_ALIASES = {
+    'year': 'Year', 'yr': 'Year', 'annual': 'Year',
+    'month': 'Month', 'mth': 'Month', 'monthly': 'Month',
+    'bi-weekly': 'Bi-Weekly', 'biweekly': 'Bi-Weekly', 'bi': 'Bi-Weekly',
+    'week': 'Week', 'wk': 'Week', 'weekly': 'Week',
+    'hour': 'Hour', 'hr': 'Hour', 'hourly': 'Hour',
+}
+WINSOR_QUANTILES = (0.01, 0.99)  # wages are winsorized at these quantiles within each unit of pay
+WAGE_YR_BOUNDS = (5_000, 2_000_000)  # annual wages outside these bounds are flagged as outliers
+
+# Employer names: legal forms stripped (repeatedly) from the end of normalized names, so that
+# 'Microsoft Corporation' and 'MICROSOFT CORP.' share one EMPLOYER_ID (see employers.py). Only legal
+# forms: words that also name employers ('PRIVATE', 'PA') are kept, and multi-word forms are one unit
+EMPLOYER_LEGAL_SUFFIXES = [
+    'INC', 'INCORPORATED', 'CORP', 'CORPORATION', 'CO', 'COMPANY', 'AND CO', 'AND COMPANY', 'LLC', 'L L C',
+    'LLP', 'L L P', 'LP', 'L P', 'LTD', 'LIMITED', 'PLLC', 'PC', 'P C', 'NA', 'N A', 'PLC', 'GMBH', 'AG',
+    'SA', 'BV', 'NV', 'PTE LTD', 'PVT LTD', 'PRIVATE LIMITED',
+]
+
+# Conversion parameters
+CONVERT_BATCH_SIZE = 50_000  # worksheet rows converted to Parquet at a time
+
+# Processing parameters
+MAX_WORKERS = os.cpu_count() or 1  # worker processes used to process raw files in parallel
+MEMORY_FACTOR = 6  # estimated peak memory while processing a raw file, as a multiple of its size on disk
+
+# Download parameters
+CHUNK_SIZE = 8192  # for downloading large files
+TIMEOUT = 60  # timeout for download requests in seconds
+MAX_DOWNLOAD_WORKERS = 4  # number of files downloaded at the same time
+MAX_RETRIES = 5  # retries for failed or interrupted downloads
+BACKOFF_FACTOR = 1.0  # exponential backoff between retries (1s, 2s, 4s, ...)
 
 # Logging configuration
 import logging
 LOG_LEVEL = logging.INFO
 LOG_FORMAT = '%(asctime)s - %(filename)s - %(name)s - %(levelname)s - %(message)s'
-LOG_FILE = os.path.join(BASE_DIR, 'data_pipeline', 'oflc_performance_data', 'pipeline.log')
\ No newline at end of file
+LOG_FILE = os.path.join(BASE_DIR, 'data_pipeline', 'oflc_performance_data', 'pipeline.log')
+
+# Performance metrics (one JSON line per stage run and per input file, next to the log file)
+METRICS_FILE = os.path.join(BASE_DIR, 'data_pipeline', 'oflc_performance_data', 'metrics.jsonl')
+# e.g. OFLC_PROFILE=cprofile,tracemalloc python data_pipeline/oflc_performance_data/03_create_long_dataset.py
+PROFILE_ENV_VAR = 'OFLC_PROFILE'
+PROFILE_DIR = os.path.join(CACHE_DIR, 'profiles')
\ No newline at end of file
@@ -0,0 +1,124 @@
+import os
+import datetime
+import logging
+import openpyxl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from config import CONVERT_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+def cell_to_string(value):
+    """
+    Converts a cell value to the string written in the raw file (None for empty cells).
+
+    Dates are written in ISO format (without the time when it is midnight), whole numbers without decimals.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat() if value.time() == datetime.time() else value.isoformat(sep=' ')
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    value = str(value)
+    return value if value.strip() else None
+
+def unique_header(header):
+    """
+    Returns the header with empty names replaced by `UNNAMED_{i}` and duplicated names suffixed with
+    `.1`, `.2`, ... (the same convention pandas uses when reading a CSV).
+    """
+    names = []
+    seen = {}
+    for i, name in enumerate(header):
+        name = str(name).strip() if name is not None else f"UNNAMED_{i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def iter_xlsx_batches(excel_file, batch_size=CONVERT_BATCH_SIZE, reset_dimensions=False):
+    """
+    Streams the rows of the first worksheet of an Excel file as Arrow record batches of strings.
+
+    The workbook is opened in read-only mode, so only one batch of rows is held in memory at a time.
+
+    Args:
+        excel_file (str): Path to the Excel file.
+        batch_size (int): Number of rows per record batch.
+        reset_dimensions (bool): Ignore the sheet dimensions stored in the file. Some workbooks report
+            wrong dimensions, which makes read-only mode return truncated rows.
+
+    Yields:
+        pa.RecordBatch: Batches of rows, with one string column per header cell.
+    """
+    workbook = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.worksheets[0]
+        if reset_dimensions:
+            worksheet.reset_dimensions()
+        rows = worksheet.iter_rows(values_only=True)
+        header = unique_header(next(rows, ()))
+        schema = pa.schema([(name, pa.string()) for name in header])
+        n_columns = len(header)
+
+        columns = [[] for _ in range(n_columns)]
+        n_rows = 0
+        n_batches = 0
+        for row in rows:
+            values = [cell_to_string(value) for value in row[:n_columns]]
+            if all(value is None for value in values):
+                continue
+            values += [None] * (n_columns - len(values))
+            for column, value in zip(columns, values):
+                column.append(value)
+            n_rows += 1
+            if n_rows == batch_size:
+                yield pa.RecordBatch.from_arrays([pa.array(c, type=pa.string()) for c in columns], schema=schema)
+                columns = [[] for _ in range(n_columns)]
+                n_rows = 0
+                n_batches += 1
+        # The last batch is yielded even when empty so that the schema is always written
+        if n_rows or not n_batches:
+            yield pa.RecordBatch.from_arrays([pa.array(c, type=pa.string()) for c in columns], schema=schema)
+    finally:
+        workbook.close()
+
+def excel_to_parquet(excel_file, parquet_file, batch_size=CONVERT_BATCH_SIZE, reset_dimensions=False):
+    """
+    Converts the first worksheet of an Excel file to a Parquet file (all columns as strings), streaming
+    the rows in batches so memory stays bounded regardless of the size of the workbook.
+
+    The Parquet file is written to a temporary path and only moved into place once complete.
+
+    Args:
+        excel_file (str): Path to the Excel file.
+        parquet_file (str): Path to the Parquet file to write.
+        batch_size (int): Number of rows converted at a time.
+        reset_dimensions (bool): Ignore the sheet dimensions stored in the file (see `iter_xlsx_batches`).
+
+    Returns:
+        int: The number of rows written.
+    """
+    tmp_file = parquet_file + '.tmp'
+    writer = None
+    n_rows = 0
+    try:
+        for batch in iter_xlsx_batches(excel_file, batch_size=batch_size, reset_dimensions=reset_dimensions):
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_file, batch.schema)
+            writer.write_batch(batch)
+            n_rows += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise ValueError(f"No worksheet data found in {excel_file}")
+    os.replace(tmp_file, parquet_file)
+    logger.info(f"Converted {excel_file} to {parquet_file} ({n_rows} rows)")
+    return n_rows
@@ -0,0 +1,144 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import CHUNK_SIZE, TIMEOUT, MAX_DOWNLOAD_WORKERS, MAX_RETRIES, BACKOFF_FACTOR
+
+logger = logging.getLogger(__name__)
+
+# HTTP status codes that are worth retrying (throttling and transient server errors)
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+def create_session(pool_size=MAX_DOWNLOAD_WORKERS, max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR):
+    """
+    Creates a pooled requests session that retries failed connections with exponential backoff.
+
+    Args:
+        pool_size (int): Number of connections kept alive per host, should match the number of workers.
+        max_retries (int): Maximum number of retries for a single request.
+        backoff_factor (float): Backoff factor between retries (sleeps backoff_factor * 2 ** (retry - 1) seconds).
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(['HEAD', 'GET']),
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def _expected_size(response, offset):
+    """
+    Returns the total size of the remote file from the response headers, or None if unknown.
+    """
+    content_range = response.headers.get('Content-Range')
+    if content_range and '/' in content_range:
+        total = content_range.rsplit('/', 1)[-1]
+        return int(total) if total.isdigit() else None
+    content_length = response.headers.get('Content-Length')
+    if content_length and content_length.isdigit():
+        return offset + int(content_length)
+    return None
+
+def download_file(url, filename, session=None, chunk_size=CHUNK_SIZE, timeout=TIMEOUT,
+                  max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR):
+    """
+    Streams a remote file to disk in chunks, resuming partial downloads with HTTP Range requests.
+
+    The file is written to `{filename}.part` and only moved to `filename` once it is complete, so an
+    interrupted run leaves a partial file that the next attempt (or the next run) continues from.
+
+    Args:
+        url (str): The URL of the file to download.
+        filename (str): The destination path.
+        session (requests.Session): Session used for the requests. Defaults to a new pooled session.
+        chunk_size (int): Size of the chunks written to disk.
+        timeout (int): Timeout for the requests in seconds.
+        max_retries (int): Maximum number of attempts to resume a download interrupted mid-stream.
+        backoff_factor (float): Backoff factor between attempts.
+
+    Returns:
+        str: The path to the downloaded file.
+
+    Raises:
+        requests.RequestException: If the download still fails after all retries.
+    """
+    session = session or create_session()
+    part_filename = filename + '.part'
+
+    for attempt in range(max_retries + 1):
+        offset = os.path.getsize(part_filename) if os.path.exists(part_filename) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 416:
+                    # The partial file already holds every byte of the remote file
+                    logger.info(f"{filename} was already fully downloaded")
+                    break
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    # The server ignored the Range header, start over
+                    logger.warning(f"Server does not support resuming {url}, restarting download")
+                    offset = 0
+                elif offset:
+                    logger.info(f"Resuming {filename} from byte {offset}")
+
+                expected_size = _expected_size(response, offset)
+                with open(part_filename, 'ab' if offset else 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+
+            size = os.path.getsize(part_filename)
+            if expected_size is not None and size != expected_size:
+                raise requests.exceptions.ChunkedEncodingError(
+                    f"Incomplete download of {url}: got {size} of {expected_size} bytes")
+            break
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            if attempt == max_retries:
+                raise
+            sleep = backoff_factor * 2 ** attempt
+            logger.warning(f"Download of {url} interrupted ({e}), retrying in {sleep:.1f}s")
+            time.sleep(sleep)
+
+    os.replace(part_filename, filename)
+    return filename
+
+def download_many(tasks, worker, max_workers=MAX_DOWNLOAD_WORKERS, on_done=None):
+    """
+    Runs `worker` over the given tasks on a bounded thread pool.
+
+    A failure in one task is logged and reported back, it never stops the rest of the run.
+
+    Args:
+        tasks (list): List of tasks, each one is passed to `worker` as its only argument.
+        worker (callable): Function executed for each task (typically a download followed by a conversion).
+        max_workers (int): Maximum number of tasks running at the same time.
+        on_done (callable): Optional callback called as `on_done(task, result, error)` as each task finishes.
+
+    Returns:
+        list: A list of (task, result, error) tuples in the order of `tasks`.
+    """
+    results = [None] * len(tasks)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(worker, task): i for i, task in enumerate(tasks)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                result, error = future.result(), None
+            except Exception as e:
+                logger.error(f"Task {tasks[i]} failed: {e}")
+                result, error = None, e
+            results[i] = (tasks[i], result, error)
+            if on_done:
+                on_done(tasks[i], result, error)
+    return results
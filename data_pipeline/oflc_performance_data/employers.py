@@ -0,0 +1,216 @@
+import os
+import re
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from config import PROCESSED_DATASET_DIR, EMPLOYER_INDEX_DIR, EMPLOYER_LEGAL_SUFFIXES
+from loader import PARTITIONING
+
+logger = logging.getLogger(__name__)
+
+"""
+Employer name normalization, canonical employer ids and the inverted token index of employer names.
+
+Each processed row gets EMPLOYER_NAME_NORMALIZED (upper case, no punctuation, no legal-form suffix, see
+EMPLOYER_LEGAL_SUFFIXES) and EMPLOYER_ID, a stable 64-bit hash of the normalized name. The hash does not
+depend on the rest of the data, so partitions processed independently (and in different runs) agree on
+the ids. Names are normalized once per distinct name, not per row.
+
+After processing, `build_employer_index` writes to EMPLOYER_INDEX_DIR:
+    employers.parquet        one row per EMPLOYER_ID: normalized name, most frequent raw name, N_CASES
+    employer_counts.parquet  cases per EMPLOYER_ID, PROGRAM and FISCAL_YEAR
+    employer_tokens.parquet  (TOKEN, EMPLOYER_ID) pairs sorted by token, the inverted token index
+
+Example:
+    from employers import EmployerIndex
+    from loader import load_long
+
+    employers = EmployerIndex.load()
+    microsoft = employers.search("Microsoft")           # every employer whose name has the token MICROSOFT
+    employers.counts(microsoft.EMPLOYER_ID)             # cases per program and fiscal year, from the index
+    load_long("LCA", where=("EMPLOYER_ID", "in", microsoft.EMPLOYER_ID.tolist()))
+"""
+
+EMPLOYERS_FILE = 'employers.parquet'
+COUNTS_FILE = 'employer_counts.parquet'
+TOKENS_FILE = 'employer_tokens.parquet'
+
+_SUFFIX_PATTERN = re.compile(r'(?:\s+(?:' + '|'.join(sorted(map(re.escape, EMPLOYER_LEGAL_SUFFIXES), key=len, reverse=True)) + r'))+$')
+
+def normalize_employer_names(names):
+    """
+    Normalizes employer names: upper case, '&' spelled AND, punctuation removed, 'D/B/A ...' trade names
+    and legal-form suffixes (EMPLOYER_LEGAL_SUFFIXES, '& Co' included) dropped, a dangling trailing AND
+    and a leading THE dropped and whitespace collapsed ('Microsoft Corporation' and 'MICROSOFT CORP.' ->
+    'MICROSOFT', 'Merck & Co., Inc.' -> 'MERCK').
+    The normalization runs on the distinct names and is mapped back to the rows through their codes.
+
+    Parameters:
+    names (pd.Series): The raw employer names.
+
+    Returns:
+    pd.Series: The normalized names (NA for missing or empty names).
+    """
+    codes, uniques = pd.factorize(names)
+    cleaned = (pd.Series(uniques, dtype='string').str.upper()
+               .str.replace('&', ' AND ', regex=False)
+               .str.replace(r'\s+D\s*/?\s*B\s*/?\s*A\b.*$', '', regex=True)
+               .str.replace(r"[.']", '', regex=True)
+               .str.replace(r'[^A-Z0-9]+', ' ', regex=True)
+               .str.strip()
+               .str.replace(r'^THE\s+', '', regex=True))
+    stripped = cleaned.str.replace(_SUFFIX_PATTERN, '', regex=True).str.replace(r'\s+AND$', '', regex=True).str.strip()
+    # Names made only of suffix words keep them
+    normalized = stripped.where(stripped.str.len() > 0, cleaned)
+    normalized = normalized.where(normalized.str.len() > 0)
+    values = normalized.to_numpy(dtype=object, na_value=None)
+    return pd.Series(np.where(codes >= 0, values[codes] if len(values) else None, None), index=names.index, dtype='string')
+
+def employer_ids(normalized):
+    """
+    Canonical employer ids: the first 8 bytes of the BLAKE2b hash of the normalized name, as a signed
+    64-bit integer (computed once per distinct name).
+
+    Parameters:
+    normalized (pd.Series): The normalized employer names.
+
+    Returns:
+    pd.Series: The employer ids (Int64, NA for missing names).
+    """
+    codes, uniques = pd.factorize(normalized)
+    ids = np.array([int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), 'little', signed=True)
+                    for name in uniques], dtype=np.int64)
+    ids = np.append(ids, 0)  # code -1 (missing name) reads the extra last id and is masked
+    return pd.Series(ids[codes], index=normalized.index, dtype='Int64').mask(codes < 0)
+
+def add_employer_ids(df):
+    """
+    Adds EMPLOYER_NAME_NORMALIZED and EMPLOYER_ID to the processed data (the stage after `process_data`).
+
+    Parameters:
+    df (pd.DataFrame): The processed data, with an EMPLOYER_NAME column.
+
+    Returns:
+    pd.DataFrame: The data with the two employer columns.
+    """
+    names = df['EMPLOYER_NAME'] if 'EMPLOYER_NAME' in df.columns else pd.Series(pd.NA, index=df.index, dtype='string')
+    df = df.copy()
+    df['EMPLOYER_NAME_NORMALIZED'] = normalize_employer_names(names)
+    df['EMPLOYER_ID'] = employer_ids(df['EMPLOYER_NAME_NORMALIZED'])
+    return df
+
+def tokenize(names):
+    """
+    Splits normalized names into (position, token) pairs.
+
+    Parameters:
+    names (pd.Series): Normalized names.
+
+    Returns:
+    pd.Series: The tokens, indexed by the position of their name in `names`.
+    """
+    tokens = pd.Series(names.to_numpy(), dtype='string').str.split(' ').explode()
+    return tokens[tokens.notna() & (tokens != '')]
+
+def build_employer_index(dataset_dir=PROCESSED_DATASET_DIR, index_dir=EMPLOYER_INDEX_DIR):
+    """
+    Builds the employer table, the employer counts and the inverted token index from the processed dataset.
+    Only the employer and partition columns are read.
+
+    Parameters:
+    dataset_dir (str): Root directory of the processed dataset.
+    index_dir (str): Directory where the index files are written.
+
+    Returns:
+    pd.DataFrame: The employer table.
+    """
+    dataset = ds.dataset(dataset_dir, format='parquet', partitioning=PARTITIONING)
+    table = dataset.to_table(columns=['EMPLOYER_ID', 'EMPLOYER_NAME_NORMALIZED', 'EMPLOYER_NAME', 'PROGRAM', 'FISCAL_YEAR'],
+                             filter=ds.field('EMPLOYER_ID').is_valid())
+
+    counts = table.group_by(['EMPLOYER_ID', 'PROGRAM', 'FISCAL_YEAR']).aggregate([([], 'count_all')])
+    counts = counts.to_pandas().rename(columns={'count_all': 'N_CASES'})
+    counts = counts.sort_values(['EMPLOYER_ID', 'PROGRAM', 'FISCAL_YEAR'], ignore_index=True)
+
+    # Most frequent raw spelling of each employer
+    variants = table.group_by(['EMPLOYER_ID', 'EMPLOYER_NAME_NORMALIZED', 'EMPLOYER_NAME']).aggregate([([], 'count_all')]).to_pandas()
+    variants = variants.sort_values(['EMPLOYER_ID', 'count_all'], ascending=[True, False])
+    employers = variants.drop_duplicates('EMPLOYER_ID').drop(columns='count_all').set_index('EMPLOYER_ID')
+    employers['N_NAME_VARIANTS'] = variants.groupby('EMPLOYER_ID').size()
+    employers['N_CASES'] = counts.groupby('EMPLOYER_ID')['N_CASES'].sum()
+    employers = employers.reset_index().sort_values('N_CASES', ascending=False, ignore_index=True)
+
+    tokens = tokenize(employers['EMPLOYER_NAME_NORMALIZED'])
+    postings = pd.DataFrame({'TOKEN': tokens.to_numpy(), 'EMPLOYER_ID': employers['EMPLOYER_ID'].to_numpy()[tokens.index]})
+    postings = postings.drop_duplicates().sort_values(['TOKEN', 'EMPLOYER_ID'], ignore_index=True)
+
+    os.makedirs(index_dir, exist_ok=True)
+    for df, name in ((employers, EMPLOYERS_FILE), (counts, COUNTS_FILE), (postings, TOKENS_FILE)):
+        path = os.path.join(index_dir, name)
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path + '.tmp')
+        os.replace(path + '.tmp', path)
+    logger.info(f"Employer index: {len(employers)} employers, {postings['TOKEN'].nunique()} tokens")
+    return employers
+
+class EmployerIndex:
+    """
+    In-memory employer table and inverted token index (loaded from EMPLOYER_INDEX_DIR).
+
+    Token lookups are binary searches in the sorted token array, so searches take milliseconds whatever
+    the size of the archive; the returned EMPLOYER_IDs select the matching rows of the processed data.
+    """
+
+    def __init__(self, employers, counts, postings):
+        self.employers = employers.set_index('EMPLOYER_ID', drop=False)
+        self.counts_table = counts
+        self.tokens = postings['TOKEN'].to_numpy(dtype=str)
+        self.token_employers = postings['EMPLOYER_ID'].to_numpy(dtype=np.int64)
+
+    @classmethod
+    def load(cls, index_dir=EMPLOYER_INDEX_DIR):
+        """
+        Loads the index files written by `build_employer_index`.
+        """
+        read = lambda name: pq.read_table(os.path.join(index_dir, name)).to_pandas()
+        return cls(read(EMPLOYERS_FILE), read(COUNTS_FILE), read(TOKENS_FILE))
+
+    def token_ids(self, token, prefix=False):
+        """
+        Ids of the employers whose normalized name has `token` (or a token starting with it).
+        """
+        start = np.searchsorted(self.tokens, token, side='left')
+        end = np.searchsorted(self.tokens, token + '\uffff' if prefix else token, side='right')
+        return np.unique(self.token_employers[start:end])
+
+    def ids(self, query, prefix=False):
+        """
+        Ids of the employers whose normalized name has every token of `query` (normalized like the names).
+        With `prefix`, the last token of the query matches any token it starts with.
+        """
+        normalized = normalize_employer_names(pd.Series([query])).iloc[0]
+        tokens = [] if pd.isna(normalized) else normalized.split()
+        if not tokens:
+            return np.empty(0, dtype=np.int64)
+        ids = self.token_ids(tokens[-1], prefix)
+        for token in tokens[:-1]:
+            ids = np.intersect1d(ids, self.token_ids(token), assume_unique=True)
+        return ids
+
+    def search(self, query, prefix=False):
+        """
+        Employers matching a query (see `ids`), most cases first.
+
+        Returns:
+        pd.DataFrame: The matching rows of the employer table.
+        """
+        return self.employers.loc[self.ids(query, prefix)].sort_values('N_CASES', ascending=False).reset_index(drop=True)
+
+    def counts(self, ids):
+        """
+        Cases per employer, program and fiscal year for the given employer ids.
+        """
+        return self.counts_table[self.counts_table['EMPLOYER_ID'].isin(np.asarray(ids))].reset_index(drop=True)
@@ -0,0 +1,156 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from config import PROCESSED_DATASET_DIR
+import schema
+
+"""
+Loader for the processed OFLC long data (the partitioned Parquet dataset written by 03_create_long_dataset.py).
+
+Queries are lazy: nothing is read until `to_pandas`, `to_table` or `count_rows` is called. Partitions are
+pruned by program and fiscal year from their paths, predicates are pushed down to the Parquet row groups
+(skipped using their min/max statistics), and only the requested columns are read.
+
+Example:
+    from loader import load_long, scan_long
+
+    # Certified 2023 LCA filings in Texas, five columns
+    df = load_long(
+        "LCA",
+        columns=["CASE_STATUS", "SOC_CODE", "WAGE_RATE_FROM", "UNIT_OF_PAY", "WORKSITE_STATE"],
+        years=[2023],
+        where=[("CASE_STATUS", "==", "Certified"), ("WORKSITE_STATE", "==", "TX")],
+    )
+
+    # Lazy query, refined before reading anything
+    query = scan_long("LCA", years=range(2019, 2025)).where(("SOC_CODE", "==", "15-1252"))
+    query.count_rows()
+"""
+
+PARTITIONING = ds.partitioning(pa.schema([('PROGRAM', pa.string()), ('FISCAL_YEAR', pa.int32())]), flavor='hive')
+
+def _encode_filter(filter):
+    """
+    Encodes the value of a (column, op, value) filter on an integer-coded column (e.g. SOC codes given as
+    '15-1252' are compared as 151252), and converts date strings to timestamps for datetime columns.
+    """
+    column, op, value = filter
+    values = list(value) if op in ('in', 'not in') else [value]
+    if column in schema.ENCODERS and any(isinstance(v, str) for v in values):
+        values = schema.ENCODERS[column](pd.Series(values, dtype='string')).tolist()
+    elif schema.COLUMN_DTYPES.get(column, '').startswith('datetime'):
+        values = [pd.Timestamp(v).to_pydatetime() for v in values]
+    return column, op, values if op in ('in', 'not in') else values[0]
+
+def _to_expression(where):
+    """
+    Converts filters given as a (column, op, value) tuple, a list of tuples (combined with AND), or a
+    pyarrow expression, to a pyarrow expression.
+    """
+    if where is None or isinstance(where, ds.Expression):
+        return where
+    if isinstance(where, tuple):
+        where = [where]
+    return pq.filters_to_expression([_encode_filter(f) for f in where])
+
+class LongQuery:
+    """
+    A lazy query over the processed long data. Each method returns a new query; data is only read by
+    `to_table`, `to_pandas` and `count_rows`.
+
+    Args:
+        dataset_dir (str): Root directory of the processed dataset. Defaults to PROCESSED_DATASET_DIR.
+        columns (list): Columns to return. Defaults to all columns.
+        filter (ds.Expression): Filter applied to the rows (partition and row predicates).
+    """
+
+    def __init__(self, dataset_dir=PROCESSED_DATASET_DIR, columns=None, filter=None):
+        self.dataset_dir = dataset_dir
+        self.columns = list(columns) if columns is not None else None
+        self.filter = filter
+
+    def _dataset(self):
+        return ds.dataset(self.dataset_dir, format='parquet', partitioning=PARTITIONING)
+
+    def where(self, *filters):
+        """
+        Adds row filters, as (column, op, value) tuples or pyarrow expressions, combined with AND.
+        Supported ops: ==, !=, <, <=, >, >=, in, not in.
+        """
+        expression = self.filter
+        for f in filters:
+            f = _to_expression(f)
+            expression = f if expression is None else expression & f
+        return LongQuery(self.dataset_dir, self.columns, expression)
+
+    def select(self, columns):
+        """
+        Restricts the query to the given columns.
+        """
+        return LongQuery(self.dataset_dir, columns, self.filter)
+
+    def fragments(self):
+        """
+        Returns the paths of the partitions that survive partition pruning (nothing else is opened).
+        """
+        return [fragment.path for fragment in self._dataset().get_fragments(filter=self.filter)]
+
+    def count_rows(self):
+        """
+        Counts the rows matching the query (reads only the columns used in the filter).
+        """
+        return self._dataset().count_rows(filter=self.filter)
+
+    def to_table(self):
+        """
+        Executes the query and returns a pyarrow Table.
+        """
+        return self._dataset().to_table(columns=self.columns, filter=self.filter)
+
+    def to_pandas(self):
+        """
+        Executes the query and returns a DataFrame with the dtypes of the schema registry
+        (PROGRAM is returned as a categorical, FISCAL_YEAR as an integer).
+        """
+        df = self.to_table().to_pandas()
+        if 'PROGRAM' in df.columns:
+            df['PROGRAM'] = df['PROGRAM'].astype('category')
+        return df
+
+def scan_long(program=None, columns=None, years=None, where=None, dataset_dir=PROCESSED_DATASET_DIR):
+    """
+    Builds a lazy query over the processed long data.
+
+    Args:
+        program (str or list): Program(s) to read (e.g. "LCA"). Defaults to all programs.
+        columns (list): Columns to return. Defaults to all columns.
+        years (int or list): Fiscal year(s) to read. Defaults to all years.
+        where: Row filters, as a (column, op, value) tuple, a list of tuples (combined with AND),
+            or a pyarrow expression.
+        dataset_dir (str): Root directory of the processed dataset. Defaults to PROCESSED_DATASET_DIR.
+
+    Returns:
+        LongQuery: The lazy query.
+    """
+    filters = []
+    if program is not None:
+        filters.append(('PROGRAM', 'in', [program] if isinstance(program, str) else list(program)))
+    if years is not None:
+        filters.append(('FISCAL_YEAR', 'in', [int(years)] if isinstance(years, int) else [int(y) for y in years]))
+    query = LongQuery(dataset_dir, columns)
+    if filters:
+        query = query.where(filters)
+    if where is not None:
+        query = query.where(where)
+    return query
+
+def load_long(program=None, columns=None, years=None, where=None, dataset_dir=PROCESSED_DATASET_DIR):
+    """
+    Loads the processed long data into a DataFrame, reading only the partitions, row groups and columns
+    needed (see `scan_long` for the arguments).
+
+    Returns:
+        pd.DataFrame: The matching rows.
+    """
+    return scan_long(program, columns, years, where, dataset_dir).to_pandas()
@@ -0,0 +1,102 @@
+import os
+import json
+import hashlib
+import logging
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+def file_digest(path, previous=None, chunk_size=1 << 20):
+    """
+    Computes the SHA-256 content hash of a file.
+
+    If `previous` (a manifest entry for the same file) has the same size and modification time,
+    its hash is reused instead of reading the whole file again.
+
+    Args:
+        path (str): Path to the file.
+        previous (dict): Manifest entry from the previous run, if any.
+        chunk_size (int): Size of the chunks read from disk.
+
+    Returns:
+        tuple: A tuple (content_hash, size, mtime_ns).
+    """
+    stat = os.stat(path)
+    if previous and previous.get('size') == stat.st_size and previous.get('mtime_ns') == stat.st_mtime_ns:
+        return previous['content_hash'], stat.st_size, stat.st_mtime_ns
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest(), stat.st_size, stat.st_mtime_ns
+
+def header_fingerprint(path):
+    """
+    Computes a fingerprint of the header of a raw file: the column names of a Parquet file, or the
+    first line of a CSV file.
+
+    Args:
+        path (str): Path to the raw file.
+
+    Returns:
+        str: The SHA-256 hash of the header.
+    """
+    if path.endswith('.parquet'):
+        header = "\n".join(pq.read_schema(path).names).encode()
+    else:
+        with open(path, 'rb') as f:
+            header = f.readline().strip()
+    return hashlib.sha256(header).hexdigest()
+
+def load_manifest(path):
+    """
+    Loads the manifest saved by a previous run, returning an empty manifest if there is none.
+
+    Args:
+        path (str): Path to the manifest JSON file.
+
+    Returns:
+        dict: The manifest, mapping raw file names to their entries.
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Could not read manifest {path}, rebuilding everything: {e}")
+        return {}
+
+def save_manifest(manifest, path):
+    """
+    Saves the manifest atomically (a crash while writing never leaves a truncated manifest).
+
+    Args:
+        manifest (dict): The manifest to save.
+        path (str): Path to the manifest JSON file.
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def is_up_to_date(entry, content_hash, header, version):
+    """
+    Checks whether the processed artifact recorded in a manifest entry can be reused.
+
+    Args:
+        entry (dict): The manifest entry of the raw file, or None.
+        content_hash (str): The current content hash of the raw file.
+        header (str): The current header fingerprint of the raw file.
+        version (str): The current version of the processing logic.
+
+    Returns:
+        bool: True if the raw file, its header and the processing logic are unchanged and the artifact exists.
+    """
+    return (
+        entry is not None
+        and entry.get('content_hash') == content_hash
+        and entry.get('header_fingerprint') == header
+        and entry.get('processing_version') == version
+        and os.path.exists(entry.get('artifact', ''))
+    )
@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import time
+import pstats
+import logging
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+from config import METRICS_FILE, PROFILE_ENV_VAR, PROFILE_DIR
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+"""
+Performance metrics of the pipeline stages, written as JSON lines to METRICS_FILE (next to pipeline.log).
+
+Each stage run and each input file of a stage gets one record with its wall time, the time of its steps
+(e.g. download, convert, parse, process, write), rows in and out, bytes read and written, rows per second
+and the peak resident memory (RSS). Records are appended by the process that did the work (worker
+processes included), so a regression shows up as the record of a given year file or step, without
+rerunning anything.
+
+Setting the OFLC_PROFILE environment variable (see PROFILE_ENV_VAR) to 'cprofile', 'tracemalloc' or
+both (comma separated) also writes a cProfile dump (.prof, for pstats or snakeviz) and/or the top
+allocation sites (.tracemalloc.txt) of every profiled unit to PROFILE_DIR.
+
+Example:
+    with Metrics('process', scope='file', program='LCA', year=2020) as metrics:
+        with metrics.step('parse'):
+            df = read_raw_file(...)
+        metrics.count(rows_in=len(df), bytes_read=os.path.getsize(raw_file))
+
+    pd.read_json(METRICS_FILE, lines=True)   # one row per record
+"""
+
+# Largest peak RSS of this process before the last reset
+_peak_before_reset = 0
+
+def read_peak_rss():
+    """
+    Returns the peak resident set size of this process in bytes (since the last `reset_peak_rss`), or None
+    if unknown.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+def read_children_peak_rss():
+    """
+    Returns the largest peak resident set size of the terminated child processes (e.g. the workers of a
+    process pool) in bytes, or None if unknown.
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+def read_lifetime_peak_rss():
+    """
+    Returns the peak resident set size of this process in bytes over its whole life (resets included), or
+    None if unknown.
+    """
+    peak = read_peak_rss()
+    return max(peak, _peak_before_reset) if peak is not None else None
+
+def reset_peak_rss():
+    """
+    Resets the peak resident set size of this process to its current size (Linux only), so that the peak of
+    each file processed by a long-lived worker process is its own.
+
+    Returns:
+        bool: True if the peak was reset.
+    """
+    global _peak_before_reset
+    _peak_before_reset = read_lifetime_peak_rss() or 0
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def write_record(record, path=METRICS_FILE):
+    """
+    Appends a record to the metrics file as one JSON line. Lines are written with a single append, so
+    records of concurrent processes do not interleave.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a') as f:
+        f.write(json.dumps(record, default=str) + '\n')
+
+class Metrics:
+    """
+    Metrics of a unit of work (a stage run or one of its input files), written as one record when the unit
+    ends. Used as a context manager: the record is written on exit, with status 'failed' and the error if
+    an exception was raised (the exception is not suppressed).
+
+    Args:
+        stage (str): The stage (e.g. 'download', 'process').
+        reset_peak (bool): Reset the peak RSS of the process, so the record holds the peak of this unit (the
+            peak over the life of the process otherwise).
+        path (str): The metrics file.
+        **fields: Fields identifying the unit (e.g. program, year, file).
+    """
+
+    def __init__(self, stage, reset_peak=True, path=METRICS_FILE, **fields):
+        self.fields = {'stage': stage, **fields}
+        self.status = 'ok'
+        self.counters = {}
+        self.steps = {}
+        self.path = path
+        self.reset_peak = reset_peak
+        if reset_peak:
+            reset_peak_rss()
+        self.start = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.status = 'failed'
+            self.fields['error'] = f"{exc_type.__name__}: {exc}"
+        self.write()
+        return False
+
+    @contextmanager
+    def step(self, name):
+        """Times a step of the unit (steps with the same name add up)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps[name] = self.steps.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, **counters):
+        """Adds to counters of the unit (rows_in, rows_out, bytes_read, bytes_written, ...)."""
+        for name, value in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + int(value or 0)
+
+    def record(self):
+        """
+        Returns the record of the unit: its fields, status, wall time, counters, rows_per_sec (rows in, or
+        rows out when nothing was counted in, per second of wall time), step times and peak RSS.
+        """
+        wall_time = time.perf_counter() - self.start
+        rows = self.counters.get('rows_in', self.counters.get('rows_out'))
+        return {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            **self.fields,
+            'status': self.status,
+            'wall_time': round(wall_time, 4),
+            **self.counters,
+            'rows_per_sec': round(rows / wall_time, 1) if rows and wall_time > 0 else None,
+            'steps': {name: round(seconds, 4) for name, seconds in self.steps.items()},
+            'peak_rss': read_peak_rss() if self.reset_peak else read_lifetime_peak_rss(),
+            'pid': os.getpid(),
+        }
+
+    def write(self):
+        """Writes the record to the metrics file and returns it."""
+        record = self.record()
+        write_record(record, self.path)
+        return record
+
+def profiling_modes():
+    """Returns the profilers enabled by the PROFILE_ENV_VAR environment variable ('cprofile', 'tracemalloc')."""
+    value = os.environ.get(PROFILE_ENV_VAR, '')
+    return {mode.strip().lower() for mode in value.split(',') if mode.strip()}
+
+@contextmanager
+def profiled(name, profile_dir=PROFILE_DIR, top=30):
+    """
+    Profiles the enclosed code when enabled by the PROFILE_ENV_VAR environment variable (does nothing
+    otherwise), writing {name}.prof (cProfile) and {name}.tracemalloc.txt (the `top` allocation sites by
+    size, and the peak of the traced memory) to `profile_dir`.
+
+    cProfile only sees the calling thread and tracemalloc traces the whole process, so profiled units
+    should not run concurrently in threads of the same process.
+    """
+    modes = profiling_modes()
+    profiler = cProfile.Profile() if 'cprofile' in modes else None
+    trace = 'tracemalloc' in modes and not tracemalloc.is_tracing()
+    if trace:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None or trace:
+            os.makedirs(profile_dir, exist_ok=True)
+        if profiler is not None:
+            profiler.disable()
+            path = os.path.join(profile_dir, f"{name}.prof")
+            pstats.Stats(profiler).dump_stats(path)
+            logger.info(f"cProfile of {name} saved to {path}")
+        if trace:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            path = os.path.join(profile_dir, f"{name}.tracemalloc.txt")
+            with open(path, 'w') as f:
+                f.write(f"Traced memory: {current / 1e6:.1f} MB at the end, {peak / 1e6:.1f} MB peak\n")
+                for stat in snapshot.statistics('lineno')[:top]:
+                    f.write(f"{stat}\n")
+            logger.info(f"tracemalloc of {name} saved to {path}")
@@ -0,0 +1,144 @@
+import os
+import json
+import logging
+import pandas as pd
+from config import COLUMN_DTYPES, PARTITION_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_FILE_NAME = '_schema.json'
+
+def to_number(series):
+    """
+    Converts a column of raw strings to numbers, removing dollar signs and thousands separators.
+    Values that cannot be converted become NaN.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    return pd.to_numeric(series.astype('string').str.replace(r'[$,\s]', '', regex=True), errors='coerce')
+
+def to_nullable_int(series, dtype='Int32'):
+    """
+    Converts a column to a nullable integer type. Values that are not whole numbers become NA.
+    Integer columns are cast directly (going through float64 would round 64-bit ids).
+    """
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return series.astype(dtype)
+    values = to_number(series).astype('float64')
+    values = values.where(values.round() == values)
+    return values.astype(dtype)
+
+def encode_digits(series, n_digits, suffix_digits=0):
+    """
+    Integer-codes a classification code (SOC, NAICS) from its digits, ignoring the separators
+    ('15-1132.00' -> 151132). Only complete codes are encoded: codes with exactly `n_digits` digits, or
+    `n_digits + suffix_digits` digits (the suffix is dropped). Partial codes (e.g. the broad group '15-11')
+    would decode to a different code, so they become NA, with a warning; codes with no digits become NA.
+    """
+    digits = series.astype('string').str.replace(r'\D', '', regex=True)
+    length = digits.str.len()
+    complete = (length == n_digits) | ((length == n_digits + suffix_digits) if suffix_digits else False)
+    partial = (length > 0) & ~complete
+    if partial.any():
+        logger.warning(f"{int(partial.sum())} {series.name or 'code'} values without {n_digits} digits set to NA "
+                       f"(e.g. {series[partial.fillna(False)].iloc[0]!r})")
+    digits = digits.str[:n_digits].where(complete.fillna(False))
+    return pd.to_numeric(digits, errors='coerce').astype('Int32')
+
+def encode_soc_code(series):
+    """
+    Integer-codes SOC codes as their 6 SOC digits ('15-1132.00' -> 151132). The O*NET detail suffix is
+    dropped; partial codes ('15-11') become NA.
+    """
+    return encode_digits(series, 6, suffix_digits=2)
+
+def decode_soc_code(series):
+    """
+    Decodes integer SOC codes back to the 'XX-XXXX' format (151132 -> '15-1132'). Values that are not
+    6-digit codes become NA.
+    """
+    codes = series.astype('Int32')
+    codes = codes.where(codes.between(100000, 999999))
+    decoded = (codes // 10000).astype('string').str.zfill(2) + '-' + (codes % 10000).astype('string').str.zfill(4)
+    return decoded.where(codes.notna())
+
+def encode_naics_code(series):
+    """
+    Integer-codes 6-digit NAICS codes ('541511' -> 541511). Shorter codes (sectors, industry groups)
+    become NA. Codes read as decimal numbers ('541511.0') keep their integer part.
+    """
+    return encode_digits(series.astype('string').str.replace(r'\.0+$', '', regex=True).rename(series.name), 6)
+
+# Columns whose stored values are an integer encoding of the raw codes
+ENCODERS = {
+    'SOC_CODE': encode_soc_code,
+    'NAICS_CODE': encode_naics_code,
+}
+
+def cast_column(series, dtype):
+    """
+    Casts a column of the processed data to its dtype in the schema registry.
+    """
+    if series.name in ENCODERS:
+        return ENCODERS[series.name](series)
+    if dtype.startswith('datetime'):
+        return pd.to_datetime(series, errors='coerce', format='mixed').astype(dtype)
+    if dtype.startswith('float'):
+        return to_number(series).astype(dtype)
+    if dtype.startswith('Int'):
+        return to_nullable_int(series, dtype)
+    if dtype == 'category':
+        return series.astype('string').str.strip().astype('category')
+    return series.astype(dtype)
+
+def enforce_schema(df, column_dtypes=COLUMN_DTYPES):
+    """
+    Casts the processed data to the schema registry: every column in `column_dtypes` is present (missing
+    ones are filled with nulls), has its registered dtype, and the columns follow the registry order.
+    Columns that are not in the registry are dropped (with a warning), as are the partition columns.
+
+    Args:
+        df (pd.DataFrame): The processed data.
+        column_dtypes (dict): The schema registry, mapping each output column to its dtype.
+
+    Returns:
+        pd.DataFrame: The data with the registry schema.
+    """
+    unknown = [c for c in df.columns if c not in column_dtypes and c not in PARTITION_COLUMNS]
+    if unknown:
+        logger.warning(f"Dropping columns not in the schema registry: {unknown}")
+    columns = {}
+    for column, dtype in column_dtypes.items():
+        series = df[column] if column in df.columns else pd.Series(pd.NA, index=df.index, name=column)
+        columns[column] = cast_column(series, dtype)
+    return pd.DataFrame(columns, index=df.index)
+
+def save_schema(dataset_dir, column_dtypes=COLUMN_DTYPES):
+    """
+    Saves the schema registry next to the processed dataset, so readers know the dtypes and encodings.
+
+    Args:
+        dataset_dir (str): Root directory of the processed dataset.
+        column_dtypes (dict): The schema registry.
+    """
+    schema = {
+        'columns': column_dtypes,
+        'partition_columns': PARTITION_COLUMNS,
+        'encoded_columns': {column: encoder.__name__ for column, encoder in ENCODERS.items()},
+    }
+    os.makedirs(dataset_dir, exist_ok=True)
+    with open(os.path.join(dataset_dir, SCHEMA_FILE_NAME), 'w') as f:
+        json.dump(schema, f, indent=2)
+
+def load_schema(dataset_dir):
+    """
+    Loads the schema saved with the processed dataset.
+
+    Args:
+        dataset_dir (str): Root directory of the processed dataset.
+
+    Returns:
+        dict: The saved schema (see `save_schema`).
+    """
+    with open(os.path.join(dataset_dir, SCHEMA_FILE_NAME)) as f:
+        return json.load(f)
@@ -0,0 +1,49 @@
+import importlib.util
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+"""
+Tests of the wage annualization of 03_create_long_dataset.py (loaded from its path, the module name
+starts with a digit).
+"""
+
+spec = importlib.util.spec_from_file_location(
+    'create_long_dataset', os.path.join(os.path.dirname(__file__), '03_create_long_dataset.py'))
+create_long_dataset = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(create_long_dataset)
+annualize_wages = create_long_dataset.annualize_wages
+
+def wages(units, values):
+    return pd.DataFrame({'UNIT_OF_PAY': pd.Series(units, dtype='category'),
+                         'WAGE_RATE_FROM': pd.Series(values, dtype='float32')})
+
+def test_converts_every_unit_of_pay():
+    df = annualize_wages(wages(['Year', 'Month', 'Bi-Weekly', 'Week', 'Hour'], [104000, 8000, 4000, 2000, 50]),
+                         quantiles=(0, 1))
+    assert df['WAGE_YR'].tolist() == [104000, 96000, 104000, 104000, 104000]
+    assert df['WAGE_HR'].tolist() == pytest.approx([50, 96000 / 2080, 50, 50, 50])
+    assert not df['WAGE_WINSORIZED'].any()
+
+def test_normalizes_the_units_of_pay():
+    df = annualize_wages(wages(['yr', ' Hourly ', 'BiWeekly', 'wk'], [100000, 50, 4000, 2000]), quantiles=(0, 1))
+    assert df['UNIT_OF_PAY'].tolist() == ['Year', 'Hour', 'Bi-Weekly', 'Week']
+    assert df['WAGE_YR'].tolist() == [100000, 104000, 104000, 104000]
+
+def test_winsorizes_within_each_unit_of_pay():
+    # The hourly wages would all be clipped by quantiles of the pooled wages
+    df = annualize_wages(wages(['Year'] * 5 + ['Hour'] * 5,
+                               [50000, 60000, 70000, 80000, 900000, 20, 30, 40, 50, 60]), quantiles=(0, 0.75))
+    assert df['WAGE_RATE_FROM_W1'].tolist() == [50000, 60000, 70000, 80000, 80000, 20, 30, 40, 50, 50]
+    assert df['WAGE_WINSORIZED'].tolist() == [False] * 4 + [True] + [False] * 4 + [True]
+
+def test_unknown_and_missing_values():
+    df = annualize_wages(wages(['Fortnight', None, 'Year', 'Year'], [3000, 50000, np.nan, 1000]), quantiles=(0, 1))
+    # Unknown or missing units of pay keep the wage but get no annual wage
+    assert df['WAGE_RATE_FROM_W1'].iloc[:2].tolist() == [3000, 50000]
+    assert df['WAGE_YR'].iloc[:3].isna().all()
+    assert df['WAGE_OUTLIER'].iloc[:3].isna().all()
+    assert df['WAGE_WINSORIZED'].iloc[2] is pd.NA
+    # Annual wages below WAGE_YR_BOUNDS are flagged
+    assert df['WAGE_OUTLIER'].iloc[3]
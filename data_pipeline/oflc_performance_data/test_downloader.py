@@ -0,0 +1,91 @@
+import os
+from http.server import BaseHTTPRequestHandler
+import pytest
+import requests
+from downloader import create_session, download_file
+
+"""
+Tests of the resumable downloader against a local HTTP server supporting Range requests.
+"""
+
+CONTENT = bytes(range(256)) * 400
+
+class MockFileHandler(BaseHTTPRequestHandler):
+    """Serves CONTENT, honouring 'Range: bytes=N-'; drops the connection mid-body while `server.drops` > 0."""
+
+    def do_GET(self):
+        self.server.ranges.append(self.headers.get('Range'))
+        offset = 0
+        if self.headers.get('Range'):
+            offset = int(self.headers['Range'].split('=')[1].rstrip('-'))
+            if offset >= len(CONTENT):
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{len(CONTENT)}")
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {offset}-{len(CONTENT) - 1}/{len(CONTENT)}")
+        else:
+            self.send_response(200)
+        body = CONTENT[offset:]
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.server.drops > 0:
+            self.server.drops -= 1
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+@pytest.fixture
+def server(http_server):
+    return http_server(MockFileHandler, ranges=[], drops=0)
+
+@pytest.fixture
+def url(server):
+    return f"{server.url}LCA_Disclosure_Data_FY2020.xlsx"
+
+def download(url, filename, **kwargs):
+    return download_file(url, str(filename), session=create_session(pool_size=1, backoff_factor=0),
+                         chunk_size=4096, timeout=5, backoff_factor=0, **kwargs)
+
+def test_full_download(server, url, tmp_path):
+    filename = tmp_path / 'file.xlsx'
+    assert download(url, filename) == str(filename)
+    assert filename.read_bytes() == CONTENT
+    assert not os.path.exists(f"{filename}.part")
+    assert server.ranges == [None]
+
+def test_resumes_from_the_partial_file(server, url, tmp_path):
+    filename = tmp_path / 'file.xlsx'
+    (tmp_path / 'file.xlsx.part').write_bytes(CONTENT[:1000])
+    download(url, filename)
+    assert filename.read_bytes() == CONTENT
+    assert server.ranges == ['bytes=1000-']
+
+def test_already_complete_partial_file(server, url, tmp_path):
+    filename = tmp_path / 'file.xlsx'
+    (tmp_path / 'file.xlsx.part').write_bytes(CONTENT)
+    download(url, filename)
+    assert filename.read_bytes() == CONTENT
+    assert server.ranges == [f"bytes={len(CONTENT)}-"]
+
+def test_retries_after_a_dropped_connection(server, url, tmp_path):
+    server.drops = 1
+    filename = tmp_path / 'file.xlsx'
+    download(url, filename)
+    assert filename.read_bytes() == CONTENT
+    # The second attempt continues from the chunks written before the connection dropped
+    assert len(server.ranges) == 2 and server.ranges[0] is None
+    offset = int(server.ranges[1].split('=')[1].rstrip('-'))
+    assert 0 < offset <= len(CONTENT) // 2
+
+def test_gives_up_after_max_retries(server, url, tmp_path):
+    server.drops = 3
+    filename = tmp_path / 'file.xlsx'
+    with pytest.raises(requests.RequestException):
+        download(url, filename, max_retries=2)
+    assert not filename.exists()
+    assert len(server.ranges) == 3
@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+from employers import employer_ids, normalize_employer_names, tokenize
+
+"""
+Tests of the employer name normalization and of the canonical employer ids.
+"""
+
+@pytest.mark.parametrize('name, expected', [
+    ('Microsoft Corporation', 'MICROSOFT'),
+    ('MICROSOFT CORP.', 'MICROSOFT'),
+    ('Microsoft Corp, Inc.', 'MICROSOFT'),
+    ('Merck & Co., Inc.', 'MERCK'),
+    ('Merck and Company', 'MERCK'),
+    ('Merck', 'MERCK'),
+    ('Johnson & Johnson', 'JOHNSON AND JOHNSON'),
+    ('Ernst & Young U.S. LLP', 'ERNST AND YOUNG US'),
+    ('Infosys Private Limited', 'INFOSYS'),
+    ('Infosys Pvt. Ltd.', 'INFOSYS'),
+    ('Tata Consultancy Services Ltd', 'TATA CONSULTANCY SERVICES'),
+    ("The Children's Hospital of Philadelphia", 'CHILDRENS HOSPITAL OF PHILADELPHIA'),
+    ('Bank of America, N.A.', 'BANK OF AMERICA'),
+    ('Siemens AG', 'SIEMENS'),
+    ('Smith P.A.', 'SMITH PA'),
+    ('Private Equity Partners', 'PRIVATE EQUITY PARTNERS'),
+    ('Acme Private', 'ACME PRIVATE'),
+    ('Acme Inc d/b/a Acme Widgets', 'ACME'),
+    ('  acme   widgets, l.l.c. ', 'ACME WIDGETS'),
+    ('Company', 'COMPANY'),
+    ('The Company, Inc.', 'COMPANY'),
+])
+def test_normalize_employer_names(name, expected):
+    assert normalize_employer_names(pd.Series([name])).iloc[0] == expected
+
+def test_missing_and_empty_names():
+    normalized = normalize_employer_names(pd.Series(['Acme Inc', None, '  ', '...', 'ACME, INC.']))
+    assert normalized.iloc[0] == normalized.iloc[4] == 'ACME'
+    assert normalized.iloc[1:4].isna().all()
+
+def test_employer_ids_are_stable():
+    ids = employer_ids(pd.Series(['MERCK', None, 'MICROSOFT', 'MERCK'], dtype='string'))
+    assert ids.iloc[0] == ids.iloc[3] != ids.iloc[2]
+    assert pd.isna(ids.iloc[1])
+    # The id only depends on the name, not on the rest of the data
+    assert employer_ids(pd.Series(['MERCK'], dtype='string')).iloc[0] == ids.iloc[0]
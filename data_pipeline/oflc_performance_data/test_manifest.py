@@ -0,0 +1,77 @@
+import os
+import pandas as pd
+import pytest
+from manifest import file_digest, header_fingerprint, is_up_to_date, load_manifest, save_manifest
+
+"""
+Tests of the manifest deciding which raw files are processed again.
+"""
+
+@pytest.fixture
+def raw_file(tmp_path):
+    path = tmp_path / '2020_H1B.csv'
+    path.write_text("CASE_NUMBER,WAGE\nI-1,100\n")
+    return str(path)
+
+@pytest.fixture
+def entry(raw_file, tmp_path):
+    """Manifest entry of the raw file, as recorded by the previous run."""
+    artifact = tmp_path / 'part-0.parquet'
+    artifact.write_bytes(b'')
+    content_hash, size, mtime_ns = file_digest(raw_file)
+    return {'content_hash': content_hash, 'size': size, 'mtime_ns': mtime_ns,
+            'header_fingerprint': header_fingerprint(raw_file), 'processing_version': 'v1', 'artifact': str(artifact)}
+
+def current(path, entry, version='v1'):
+    content_hash, _, _ = file_digest(path, previous=entry)
+    return is_up_to_date(entry, content_hash, header_fingerprint(path), version)
+
+def test_unchanged_file_is_up_to_date(raw_file, entry):
+    assert current(raw_file, entry)
+
+def test_no_entry(raw_file):
+    assert not is_up_to_date(None, file_digest(raw_file)[0], header_fingerprint(raw_file), 'v1')
+
+def test_content_change_invalidates(raw_file, entry):
+    # Same size, new modification time
+    with open(raw_file, 'w') as f:
+        f.write("CASE_NUMBER,WAGE\nI-1,200\n")
+    os.utime(raw_file, ns=(entry['mtime_ns'] + 10**9, entry['mtime_ns'] + 10**9))
+    assert not current(raw_file, entry)
+
+def test_hash_is_reused_when_size_and_mtime_match(raw_file, entry):
+    assert file_digest(raw_file, previous={**entry, 'content_hash': 'cached'})[0] == 'cached'
+    assert file_digest(raw_file, previous={**entry, 'size': entry['size'] + 1, 'content_hash': 'cached'})[0] != 'cached'
+
+def test_header_change_invalidates(raw_file, entry):
+    with open(raw_file, 'w') as f:
+        f.write("CASE_NUMBER,WAGES\nI-1,10\n")
+    assert header_fingerprint(raw_file) != entry['header_fingerprint']
+    assert not current(raw_file, entry)
+
+def test_parquet_header_is_the_column_names(tmp_path):
+    first, second = str(tmp_path / 'a.parquet'), str(tmp_path / 'b.parquet')
+    pd.DataFrame({'CASE_NUMBER': ['I-1'], 'WAGE': [1.0]}).to_parquet(first)
+    pd.DataFrame({'CASE_NUMBER': ['I-2', 'I-3'], 'WAGE': [2.0, 3.0]}).to_parquet(second)
+    assert header_fingerprint(first) == header_fingerprint(second)
+    pd.DataFrame({'CASE_NUMBER': ['I-1'], 'WAGE_FROM': [1.0]}).to_parquet(second)
+    assert header_fingerprint(first) != header_fingerprint(second)
+
+def test_version_change_invalidates(raw_file, entry):
+    assert not current(raw_file, entry, version='v2')
+
+def test_missing_artifact_invalidates(raw_file, entry):
+    os.remove(entry['artifact'])
+    assert not current(raw_file, entry)
+
+def test_save_and_load(tmp_path, raw_file, entry):
+    path = str(tmp_path / 'manifest.json')
+    assert load_manifest(path) == {}
+    save_manifest({'H1B/2020_H1B.csv': entry}, path)
+    assert load_manifest(path) == {'H1B/2020_H1B.csv': entry}
+    assert not os.path.exists(path + '.tmp')
+
+def test_corrupt_manifest_rebuilds_everything(tmp_path):
+    path = tmp_path / 'manifest.json'
+    path.write_text('{"H1B/2020_H1B.csv": {')
+    assert load_manifest(str(path)) == {}
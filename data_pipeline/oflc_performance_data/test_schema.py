@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+from schema import decode_soc_code, encode_naics_code, encode_soc_code, enforce_schema, to_nullable_int, to_number
+
+"""
+Tests of the integer encodings of the classification codes and of the schema registry casts.
+"""
+
+@pytest.mark.parametrize('code, expected', [
+    ('15-1132', 151132),
+    ('15-1132.00', 151132),
+    ('151132', 151132),
+    (' 15-1132 ', 151132),
+    ('15-11', pd.NA),
+    ('15-1132.0', pd.NA),
+    ('ABC', pd.NA),
+    (None, pd.NA),
+])
+def test_encode_soc_code(code, expected):
+    encoded = encode_soc_code(pd.Series([code], name='SOC_CODE'))
+    assert encoded.dtype == 'Int32'
+    assert encoded.iloc[0] is pd.NA if expected is pd.NA else encoded.iloc[0] == expected
+
+@pytest.mark.parametrize('code, expected', [
+    ('541511', 541511),
+    ('541511.0', 541511),
+    (541511.0, 541511),
+    ('5415', pd.NA),
+    ('54', pd.NA),
+    (None, pd.NA),
+])
+def test_encode_naics_code(code, expected):
+    encoded = encode_naics_code(pd.Series([code], name='NAICS_CODE'))
+    assert encoded.dtype == 'Int32'
+    assert encoded.iloc[0] is pd.NA if expected is pd.NA else encoded.iloc[0] == expected
+
+def test_partial_codes_are_logged(caplog):
+    encode_soc_code(pd.Series(['15-1132', '15-11'], name='SOC_CODE'))
+    assert "1 SOC_CODE values without 6 digits" in caplog.text
+
+def test_soc_codes_round_trip():
+    codes = pd.Series(['15-1132', '11-1011', '53-7062'])
+    assert decode_soc_code(encode_soc_code(codes)).tolist() == codes.tolist()
+
+def test_decode_soc_code_rejects_other_numbers():
+    decoded = decode_soc_code(pd.Series([151132, 1511, pd.NA], dtype='Int32'))
+    assert decoded.iloc[0] == '15-1132'
+    assert decoded.iloc[1:].isna().all()
+
+def test_to_number_strips_currency_formatting():
+    values = to_number(pd.Series(['$1,234.50', ' 20 ', 'n/a', None]))
+    assert values.iloc[:2].tolist() == [1234.5, 20.0]
+    assert values.iloc[2:].isna().all()
+
+def test_to_nullable_int():
+    assert to_nullable_int(pd.Series(['3', '2.5', '4.0'])).tolist() == [3, pd.NA, 4]
+    # Integer columns are not rounded through float64
+    large = pd.Series([2**53 + 1], dtype='int64')
+    assert to_nullable_int(large, 'Int64').iloc[0] == 2**53 + 1
+
+def test_enforce_schema():
+    df = pd.DataFrame({'SOC_CODE': ['15-1132.00'], 'WAGE_RATE_FROM': ['$100,000'], 'EXTRA': [1], 'PROGRAM': ['H1B']})
+    column_dtypes = {'CASE_NUMBER': 'string', 'SOC_CODE': 'Int32', 'WAGE_RATE_FROM': 'float32'}
+    result = enforce_schema(df, column_dtypes)
+    assert list(result.columns) == list(column_dtypes)
+    assert result.dtypes.astype(str).tolist() == ['string', 'Int32', 'float32']
+    assert result['CASE_NUMBER'].isna().all()
+    assert result['SOC_CODE'].iloc[0] == 151132
+    assert np.isclose(result['WAGE_RATE_FROM'].iloc[0], 100000)
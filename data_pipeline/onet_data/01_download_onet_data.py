@@ -3,23 +3,20 @@ import pandas as pd
 import numpy as np
 import logging
 import argparse
-from typing import Dict, List
+from typing import Dict, List, Optional
+from onet_cache import read_table, DEFAULT_RELEASE
+from onet_store import standardize_columns, write_table
+from onet_measures import measurements_wide
+from onet_impute import impute_related
+from onet_hierarchy import ContentModelIndex
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # Constants
 
-# Base URL for O*NET data
-BASE_URL = 'https://www.onetcenter.org/dl_files/database/db_29_1_text/'
-
-# Base paths
-BASE_DIR = '.'
-SHARED_DATA_DIR = os.path.join(BASE_DIR, 'shared_data', 'onet_data')
-PROCESSED_DATA_DIR = os.path.join(SHARED_DATA_DIR, 'processed')
-
-# Ensure directories exist
-os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
+# O*NET release (read from the local release cache, see onet_cache.py)
+RELEASE = DEFAULT_RELEASE
 
 # Which data sets to download
 DATA_SETS = {
@@ -42,6 +39,8 @@ DATA_SETS = {
     # Reference data (e.g., Content Model Reference, Crosswalks, Occupation Data (definitions))
     "0_reference": [
         "Occupation Data",
+        "Alternate Titles",
+        "Sample of Reported Titles",
         "Scales Reference",
         "Content Model Reference",
         "Education, Training, and Experience Categories",
@@ -65,76 +64,53 @@ print(DATA_SETS.keys())
 DATA_SETS = dict(sorted(DATA_SETS.items()))
 print(DATA_SETS.keys())
 
-def save_data(df: pd.DataFrame, file_name: str, data_set_type: str):
+def save_data(df: pd.DataFrame, file_name: str, data_set_type: str, release: str = RELEASE):
+    """Save a processed table to the columnar O*NET store (see onet_store.py)."""
+    write_table(df, file_name, release=release, kind=data_set_type[2:])
 
-    # Rename the file
-    file_name = file_name.replace(' ', '_').replace(',', '').upper() + '.csv'
-
-    folder_save = os.path.join( PROCESSED_DATA_DIR, data_set_type[2:] )
-    # Create the directory if it doesn't exist
-    os.makedirs(folder_save, exist_ok=True)
-    file_path = os.path.join( folder_save, file_name )
-    
-    df.to_csv(file_path, index=False)
-    logging.info(f"Data saved to {file_path}")
 
-
-COLUMNS_KEEP_MEASUREMENTS = [
-    "ONET_SOC_CODE", "ELEMENT_ID", "SCALE_ID", "JOB_ZONE",
-    "TASK_TYPE", "TASK_ID", "CATEGORY", "DATA_VALUE", 
-    "RECOMMEND_SUPPRESS", "NOT_RELEVANT", "COMMODITY_CODE",
-    "HOT_TECHNOLOGY", "IN_DEMAND"
-]
-
-def get_data(data_set_name: str) -> pd.DataFrame:
-    """Retrieve data from the O*NET database."""
+def get_data(data_set_name: str, release: str = RELEASE, offline: Optional[bool] = None) -> pd.DataFrame:
+    """Retrieve data from the O*NET database (read from the cached release zip)."""
     try:
-        data_set_name = data_set_name.replace(' ', '%20').replace(',', '%2C')
-        data_url = f"{BASE_URL}{data_set_name}.txt"
-        logging.info(f"Fetching data from {data_url}")
-        return pd.read_csv(data_url, sep='\t')
+        logging.info(f"Reading {data_set_name} from O*NET release {release}")
+        return read_table(data_set_name, release=release, offline=offline)
     except Exception as e:
         logging.error(f"Failed to fetch data: {e}")
         raise
 
 def prepare_data(df: pd.DataFrame) -> pd.DataFrame:
     """Prepare the data by renaming columns and removing special characters."""
-    return df.rename(columns=lambda col: col.upper().replace(' ', '_').replace('-', '_').replace('*', ''))
-
-def process_measurements(df: pd.DataFrame) -> pd.DataFrame:
-    """Process measurement data and convert to wide format."""
-    df = df[list(set(COLUMNS_KEEP_MEASUREMENTS) & set(df.columns))]
-    df_wide = df.pivot(
-        index=['ONET_SOC_CODE', 'ELEMENT_ID', 'RECOMMEND_SUPPRESS'],
-        columns='SCALE_ID',
-        values='DATA_VALUE'
-    ).reset_index()
+    return standardize_columns(df)
 
-    if ('NOT_RELEVANT' not in df_wide.columns) and ('NOT_RELEVANT' in df.columns):
-        mapping = df[df['SCALE_ID'] == 'LV'].set_index(['ONET_SOC_CODE', 'ELEMENT_ID'])['NOT_RELEVANT'].to_dict()
-        df_wide['NOT_RELEVANT'] = df_wide.apply(lambda x: mapping.get((x['ONET_SOC_CODE'], x['ELEMENT_ID']), None), axis=1)
-
-    return df_wide
-
-def create_parent_levels(df: pd.DataFrame) -> pd.DataFrame:
+def process_measurements(df: pd.DataFrame, related: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Process measurement data and convert to wide format (see onet_measures.py).
+    If the Related Occupations table is given, the missing occupations are first imputed from their
+    related occupations (see onet_impute.py) and flagged with IMPUTED.
+    """
+    if not {'ONET_SOC_CODE', 'ELEMENT_ID', 'SCALE_ID', 'DATA_VALUE'} <= set(df.columns) or 'CATEGORY' in df.columns:
+        # Tables without scales (Job Zones, Task Statements, Technology Skills, ...) or with one value per
+        # category (Education, Training, and Experience) are kept in long format
+        return df
+    if related is not None:
+        imputed = impute_related(df, related)
+        df = pd.concat([df.assign(IMPUTED=False), imputed.assign(IMPUTED=True)], ignore_index=True)
+    return measurements_wide(df, index=['ONET_SOC_CODE', 'ELEMENT_ID', 'RECOMMEND_SUPPRESS', 'IMPUTED'])
+
+def create_parent_levels(df: pd.DataFrame, model: Optional[ContentModelIndex] = None) -> pd.DataFrame:
     """Create a DataFrame with repeated parent levels.
         This function should only be used to create a reference DataFrame for Model Reference Elements.
     """
-    all_levels = [element_id.split('.') for element_id in df['ELEMENT_ID']]
-    max_depth = max(len(x) for x in all_levels)
-    column_names = [f'LEVEL_{i+1}' for i in range(max_depth)]
-    
-    level_df = pd.DataFrame([
-        ['.'.join(parts[:i+1]) for i in range(len(parts))] + [np.nan] * (max_depth - len(parts))
-        for parts in all_levels
-    ], columns=column_names)
-    
-    return level_df
+    model = model or ContentModelIndex(df['ELEMENT_ID'])
+    return model.ancestor_table(df['ELEMENT_ID'])
 
 
 
-def main():
+def main(release: str = RELEASE, offline: Optional[bool] = None):
     
+    # Related Occupations table, used to impute the occupations missing from the measurement data
+    related = None
+
     for data_set_type, list_of_data_sets in DATA_SETS.items():
         if data_set_type == "measure":
             continue
@@ -142,28 +118,32 @@ def main():
         for data_set_name in list_of_data_sets:
             try:
     
-                df = get_data(data_set_name)
+                df = get_data(data_set_name, release=release, offline=offline)
                 df = prepare_data(df)
                 
                 # Special cases:
                 # Content Model Reference
                 if data_set_name == "Content Model Reference":
+                    # Build the hierarchy index (preorder node ids, parents, depths and subtree ranges)
+                    model = ContentModelIndex(df['ELEMENT_ID'], df['ELEMENT_NAME'])
+                    save_data(model.to_frame(), f"{data_set_name} Index", data_set_type, release)
                     # Add Levels
-                    df['LEVEL'] = df["ELEMENT_ID"].str.split('.').apply(lambda x: len(x))	
+                    df['LEVEL'] = model.depth_of(df['ELEMENT_ID'])
                     # Create parent levels
-                    df_parent_levels = create_parent_levels(df)
+                    df_parent_levels = create_parent_levels(df, model)
                     # Save parent levels
-                    save_data(df_parent_levels, f"{data_set_name}_PARENT_LEVELS.csv")
+                    save_data(df_parent_levels, f"{data_set_name} Parent Levels", data_set_type, release)
 
                 # Related Occupations
                 if data_set_name == "Related Occupations":
                     # Simplify RELATEDNESS_TIER 
                     df["RELATEDNESS_TIER"] = df["RELATEDNESS_TIER"].apply(lambda x: "".join([word[0] for word in x.split("-")]))
+                    related = df
                 
-                if data_set_type == "measure":
-                    df = process_measurements(df) 
+                if data_set_type == "1_measure":
+                    df = process_measurements(df, related)
 
-                save_data(df, data_set_name, data_set_type)
+                save_data(df, data_set_name, data_set_type, release)
                 
                 logging.info(f"Successfully processed {data_set_name}")
 
@@ -174,4 +154,9 @@ def main():
         
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Download and prepare the O*NET data sets.")
+    parser.add_argument('--release', default=RELEASE, help="O*NET release to use (e.g. db_29_1)")
+    parser.add_argument('--offline', action='store_true', default=None,
+                        help="Only use releases already in the local cache")
+    args = parser.parse_args()
+    main(release=args.release, offline=args.offline)
@@ -0,0 +1,159 @@
+import os
+import hashlib
+import logging
+import zipfile
+from typing import List, Optional
+import pandas as pd
+import requests
+
+"""
+Local cache of O*NET database releases.
+
+Each release (db_25_0, db_28_0, db_29_1, ...) is downloaded once as its text zip
+(`{release}_text.zip`), verified, and kept under `shared_data/onet_data/releases`. Data sets are
+read straight from the zip members, nothing is extracted to disk.
+
+Offline mode (the `offline` argument, or the ONET_OFFLINE environment variable set to 1) never
+touches the network: releases must already be in the cache, otherwise a FileNotFoundError is raised.
+
+Example:
+    from onet_cache import read_table
+
+    skills = read_table("Skills", release="db_29_1")
+"""
+
+# Base paths (anchored to the repository so every project shares the same cache)
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+CACHE_DIR = os.environ.get('ONET_CACHE_DIR', os.path.join(BASE_DIR, 'shared_data', 'onet_data', 'releases'))
+
+# Release downloaded by default
+DEFAULT_RELEASE = 'db_29_1'
+RELEASE_URL_TEMPLATE = 'https://www.onetcenter.org/dl_files/database/{release}_text.zip'
+
+CHUNK_SIZE = 1 << 20  # for downloading and hashing the release zips
+TIMEOUT = 60  # timeout for download requests in seconds
+
+def is_offline() -> bool:
+    """Whether offline mode is enabled through the ONET_OFFLINE environment variable."""
+    return os.environ.get('ONET_OFFLINE', '').strip().lower() in ('1', 'true', 'yes')
+
+def normalize_release(release: str) -> str:
+    """Normalize a release name ('db_29_1_text' or 'db_29_1') to its short form ('db_29_1')."""
+    return release[:-len('_text')] if release.endswith('_text') else release
+
+def release_path(release: str = DEFAULT_RELEASE, cache_dir: str = CACHE_DIR) -> str:
+    """Path of the cached zip of a release."""
+    return os.path.join(cache_dir, f"{normalize_release(release)}_text.zip")
+
+def _sha256(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def verify_release(path: str) -> str:
+    """
+    Verify that a release zip is a complete zip archive (every member passes its CRC check).
+
+    Returns the SHA-256 of the file, raises a ValueError if the file is not a valid zip.
+    """
+    if not zipfile.is_zipfile(path):
+        raise ValueError(f"{path} is not a zip file")
+    with zipfile.ZipFile(path) as zf:
+        bad_member = zf.testzip()
+    if bad_member is not None:
+        raise ValueError(f"{path} is corrupted (bad member {bad_member})")
+    return _sha256(path)
+
+def download_release(release: str, path: str, session: Optional[requests.Session] = None) -> str:
+    """Download a release zip to `path` (through a temporary file) and verify it."""
+    url = RELEASE_URL_TEMPLATE.format(release=normalize_release(release))
+    part_path = path + '.part'
+    logging.info(f"Downloading O*NET release {release} from {url}")
+    session = session or requests.Session()
+    with session.get(url, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+        with open(part_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+    try:
+        digest = verify_release(part_path)
+    except ValueError:
+        os.remove(part_path)
+        raise
+    os.replace(part_path, path)
+    with open(path + '.sha256', 'w') as f:
+        f.write(digest)
+    logging.info(f"Cached O*NET release {release} at {path} (sha256 {digest[:12]})")
+    return path
+
+def fetch_release(release: str = DEFAULT_RELEASE, cache_dir: str = CACHE_DIR,
+                  offline: Optional[bool] = None, verify: bool = False) -> str:
+    """
+    Return the path of a cached release zip, downloading it first if it is not in the cache.
+
+    Args:
+        release: The release name (e.g. 'db_29_1').
+        cache_dir: Directory of the release cache.
+        offline: Never download (defaults to the ONET_OFFLINE environment variable).
+        verify: Re-check the cached zip against the checksum recorded when it was downloaded.
+
+    Returns:
+        The path to the release zip.
+    """
+    offline = is_offline() if offline is None else offline
+    path = release_path(release, cache_dir)
+    checksum_path = path + '.sha256'
+
+    if os.path.exists(path):
+        if not os.path.exists(checksum_path):
+            # Zip placed in the cache by hand, verify it once
+            with open(checksum_path, 'w') as f:
+                f.write(verify_release(path))
+        elif verify:
+            with open(checksum_path) as f:
+                expected = f.read().strip()
+            if _sha256(path) != expected:
+                raise ValueError(f"Cached release {path} does not match its checksum, delete it to download it again")
+        return path
+
+    if offline:
+        raise FileNotFoundError(f"O*NET release {release} is not cached at {path} and offline mode is enabled")
+    os.makedirs(cache_dir, exist_ok=True)
+    return download_release(release, path)
+
+def _member_name(zf: zipfile.ZipFile, data_set_name: str) -> str:
+    """Find the zip member of a data set (e.g. 'Skills' -> 'db_29_1_text/Skills.txt')."""
+    file_name = data_set_name if data_set_name.endswith('.txt') else f"{data_set_name}.txt"
+    for name in zf.namelist():
+        if os.path.basename(name) == file_name:
+            return name
+    raise KeyError(f"{file_name} not found in {zf.filename}")
+
+def list_data_sets(release: str = DEFAULT_RELEASE, **kwargs) -> List[str]:
+    """List the data sets (text files) of a release."""
+    with zipfile.ZipFile(fetch_release(release, **kwargs)) as zf:
+        return [os.path.basename(name)[:-len('.txt')] for name in zf.namelist() if name.endswith('.txt')]
+
+def read_table(data_set_name: str, release: str = DEFAULT_RELEASE, cache_dir: str = CACHE_DIR,
+               offline: Optional[bool] = None, **read_csv_kwargs) -> pd.DataFrame:
+    """
+    Read a data set of a release (e.g. 'Skills', 'Content Model Reference') straight from the cached zip.
+
+    Extra keyword arguments are passed to `pd.read_csv`. Files that are not valid UTF-8 (older
+    releases) are read as latin-1 unless an encoding is given.
+    """
+    path = fetch_release(release, cache_dir=cache_dir, offline=offline)
+    read_csv_kwargs.setdefault('sep', '\t')
+    with zipfile.ZipFile(path) as zf:
+        member = _member_name(zf, data_set_name)
+        if 'encoding' in read_csv_kwargs:
+            with zf.open(member) as f:
+                return pd.read_csv(f, **read_csv_kwargs)
+        try:
+            with zf.open(member) as f:
+                return pd.read_csv(f, encoding='utf-8', **read_csv_kwargs)
+        except UnicodeDecodeError:
+            with zf.open(member) as f:
+                return pd.read_csv(f, encoding='latin-1', **read_csv_kwargs)
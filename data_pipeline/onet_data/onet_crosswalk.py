@@ -0,0 +1,207 @@
+import os
+import hashlib
+import logging
+from typing import Optional, Tuple
+import numpy as np
+import pandas as pd
+from onet_cache import BASE_DIR
+
+"""
+Crosswalks between occupation classifications (O*NET-SOC, SOC 2010/2018, Census OCC 2010/2018).
+
+A crosswalk integer-encodes the codes of both classifications (sorted codebooks) and stores the
+mapping in CSR form: the targets of source code `i` are `targets[indptr[i]:indptr[i + 1]]`, with their
+weights (the share of the source code that goes to each target, summing to 1). Mapping a column
+factorizes it, looks its distinct codes up in the source codebook, and gathers the results back to the
+rows, so the per-row cost is an array gather whatever the size of the data.
+
+Crosswalks are built from CSV files with one column per classification (e.g. SOC2018, OCC2018) and an
+optional WEIGHT column, and cached on disk as .npz files per vintage pair, CSV file and weight column.
+
+Example:
+    from onet_crosswalk import load_crosswalk, onet_to_soc
+
+    soc_to_occ = load_crosswalk("SOC2018", "OCC2018")
+    df["SOC"] = onet_to_soc(df["ONET_SOC_CODE"])
+    df["OCC"] = soc_to_occ.map(df["SOC"])              # most weighted OCC code of each SOC code
+    expanded = soc_to_occ.join(df, "SOC", expand=True)  # one row per (row, OCC code), with WEIGHT
+"""
+
+CROSSWALK_DIR = os.path.join(BASE_DIR, 'shared_data', 'crosswalks')
+CACHE_DIR = os.path.join(CROSSWALK_DIR, 'cache')
+
+def crosswalk_csv_path(source: str, target: str, crosswalk_dir: str = CROSSWALK_DIR) -> str:
+    """Default path of the CSV file of a crosswalk (e.g. occ2018_soc2018_crosswalk.csv for SOC2018 -> OCC2018)."""
+    names = sorted([source.lower(), target.lower()])
+    return os.path.join(crosswalk_dir, f"{names[0]}_{names[1]}_crosswalk.csv")
+
+def normalize_codes(values: pd.Series) -> pd.Series:
+    """
+    Normalize occupation codes to strings: surrounding spaces are removed, and SOC codes integer-coded
+    as in the processed OFLC data (151132) are written back as '15-1132'.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        codes = values.astype('Int64')
+        formatted = (codes // 10000).astype('string').str.zfill(2) + '-' + (codes % 10000).astype('string').str.zfill(4)
+        return formatted.where(codes.notna())
+    return values.astype('string').str.strip()
+
+def _map_distinct(values: pd.Series, function) -> pd.Series:
+    """Apply a vectorized function to the distinct values of a column and gather the results back to the rows."""
+    codes, uniques = pd.factorize(values)
+    mapped = np.asarray(function(pd.Series(uniques)), dtype=object)
+    result = np.where(codes >= 0, mapped[codes] if len(mapped) else None, None)
+    return pd.Series(result, index=values.index, name=values.name)
+
+def onet_to_soc(values: pd.Series) -> pd.Series:
+    """O*NET-SOC codes to SOC codes ('15-1252.00' -> '15-1252')."""
+    return _map_distinct(values, lambda uniques: uniques.astype('string').str.split('.').str[0])
+
+class Crosswalk:
+    """
+    Mapping from the codes of one classification (`source`) to the codes of another (`target`).
+
+    Attributes:
+        source, target (str): Names of the classifications (e.g. 'SOC2018', 'OCC2018').
+        source_codes, target_codes (np.ndarray): Sorted codebooks of both classifications.
+        indptr (np.ndarray): CSR offsets, the targets of source code i are at indptr[i]:indptr[i + 1].
+        targets (np.ndarray): Target code ids.
+        weights (np.ndarray): Weight of each (source, target) pair, summing to 1 for each source code.
+        primary (np.ndarray): Target code id with the largest weight for each source code.
+        signature (str): Signature of the CSV file and weight column the crosswalk was built from (see
+            `load_crosswalk`), '' if unknown.
+    """
+
+    def __init__(self, source: str, target: str, source_codes: np.ndarray, target_codes: np.ndarray,
+                 indptr: np.ndarray, targets: np.ndarray, weights: np.ndarray):
+        self.source, self.target = source, target
+        self.source_codes, self.target_codes = source_codes, target_codes
+        self.indptr, self.targets, self.weights = indptr, targets, weights
+        self.signature = ''
+        self._source_index = pd.Index(source_codes)
+        # Largest weight of each source code (the first target in case of ties)
+        order = np.lexsort((-weights, np.repeat(np.arange(len(source_codes)), np.diff(indptr))))
+        self.primary = targets[order][indptr[:-1]] if len(targets) else np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def from_pairs(cls, pairs: pd.DataFrame, source: str, target: str, weight: Optional[str] = None) -> 'Crosswalk':
+        """
+        Build a crosswalk from a table of (source code, target code[, weight]) pairs.
+        Without weights, each source code is split equally between its targets.
+        """
+        pairs = pd.DataFrame({
+            'source': normalize_codes(pairs[source]),
+            'target': normalize_codes(pairs[target]),
+            'weight': pairs[weight].astype('float64') if weight else 1.0,
+        }).dropna(subset=['source', 'target'])
+        pairs = pairs.groupby(['source', 'target'], as_index=False, sort=False)['weight'].sum()
+
+        source_id, source_codes = pd.factorize(pairs['source'], sort=True)
+        target_id, target_codes = pd.factorize(pairs['target'], sort=True)
+        order = np.argsort(source_id, kind='stable')
+        source_id, target_id = source_id[order], target_id[order]
+        weights = pairs['weight'].to_numpy()[order]
+        totals = np.bincount(source_id, weights=weights, minlength=len(source_codes))
+        weights = weights / totals[source_id]
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(source_id, minlength=len(source_codes)))])
+        return cls(source, target, np.asarray(source_codes, dtype=str), np.asarray(target_codes, dtype=str),
+                   indptr, target_id.astype(np.int64), weights)
+
+    def save(self, path: str):
+        """Save the crosswalk arrays to an .npz file (through a temporary file)."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, source=self.source, target=self.target, source_codes=self.source_codes,
+                     target_codes=self.target_codes, indptr=self.indptr, targets=self.targets, weights=self.weights,
+                     signature=self.signature)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path: str) -> 'Crosswalk':
+        """Load a crosswalk saved with `save`."""
+        with np.load(path) as data:
+            crosswalk = cls(str(data['source']), str(data['target']), data['source_codes'], data['target_codes'],
+                            data['indptr'], data['targets'], data['weights'])
+            crosswalk.signature = str(data['signature']) if 'signature' in data.files else ''
+        return crosswalk
+
+    def encode(self, values: pd.Series) -> np.ndarray:
+        """Source code id of each value (-1 for the codes not in the crosswalk)."""
+        codes, uniques = pd.factorize(values)
+        ids = self._source_index.get_indexer(normalize_codes(pd.Series(uniques)).fillna(''))
+        return np.where(codes >= 0, ids[codes] if len(ids) else -1, -1)
+
+    def map(self, values: pd.Series) -> pd.Series:
+        """The target code with the largest weight for each value (missing for unknown codes)."""
+        ids = self.encode(values)
+        found = ids >= 0
+        result = np.full(len(ids), None, dtype=object)
+        result[found] = self.target_codes[self.primary[ids[found]]]
+        return pd.Series(result, index=values.index, name=self.target)
+
+    def expand(self, values: pd.Series) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        All the targets of each value (many-to-many).
+
+        Returns:
+            A tuple (rows, target codes, weights): the position of the row in `values`, one of its target
+            codes and the weight of that target, for every (row, target) pair.
+        """
+        ids = self.encode(values)
+        rows = np.flatnonzero(ids >= 0)
+        starts, counts = self.indptr[ids[rows]], np.diff(self.indptr)[ids[rows]]
+        pair_rows = np.repeat(rows, counts)
+        # Position of every pair in the CSR arrays: the start of its row plus its rank within the row
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = np.repeat(starts, counts) + offsets
+        return pair_rows, self.target_codes[self.targets[positions]], self.weights[positions]
+
+    def join(self, df: pd.DataFrame, column: str, name: Optional[str] = None, expand: bool = False) -> pd.DataFrame:
+        """
+        Add the target codes of `column` to a DataFrame, in a column named `name` (defaults to the target).
+
+        With `expand`, every row is repeated once per target, with the target's share in a WEIGHT column
+        (rows whose code is not in the crosswalk are dropped).
+        """
+        name = name or self.target
+        if not expand:
+            return df.assign(**{name: self.map(df[column]).to_numpy()})
+        rows, codes, weights = self.expand(df[column])
+        return df.iloc[rows].assign(**{name: codes, 'WEIGHT': weights})
+
+def load_crosswalk(source: str, target: str, csv_path: Optional[str] = None, weight: Optional[str] = None,
+                   cache_dir: str = CACHE_DIR) -> Crosswalk:
+    """
+    Load the crosswalk of a vintage pair from the on-disk cache, building it from its CSV file when
+    the cache is missing or the CSV changed since it was built.
+
+    The cache file is specific to the CSV path and the weight column, and records the size and modification
+    time of the CSV it was built from, so loads from another CSV or with other weights never share it.
+
+    Args:
+        source: Source classification, also the name of its column in the CSV (e.g. 'SOC2018').
+        target: Target classification, also the name of its column in the CSV (e.g. 'OCC2018').
+        csv_path: Path to the CSV file. Defaults to `crosswalk_csv_path(source, target)`.
+        weight: Name of the weight column of the CSV, if any.
+        cache_dir: Directory of the cached crosswalks.
+
+    Returns:
+        The crosswalk.
+    """
+    csv_path = os.path.abspath(csv_path or crosswalk_csv_path(source, target))
+    key = hashlib.sha1(f"{csv_path}|{weight or ''}".encode()).hexdigest()[:12]
+    cache_path = os.path.join(cache_dir, f"{source.lower()}_to_{target.lower()}_{key}.npz")
+    signature = None
+    if os.path.exists(csv_path):
+        stat = os.stat(csv_path)
+        signature = f"{csv_path}|{weight or ''}|{stat.st_size}|{stat.st_mtime_ns}"
+    if os.path.exists(cache_path):
+        crosswalk = Crosswalk.load(cache_path)
+        # Without the CSV, the cached crosswalk is all there is
+        if signature is None or crosswalk.signature == signature:
+            return crosswalk
+    logging.info(f"Building the {source} -> {target} crosswalk from {csv_path}")
+    crosswalk = Crosswalk.from_pairs(pd.read_csv(csv_path, dtype=str), source, target, weight)
+    crosswalk.signature = signature
+    crosswalk.save(cache_path)
+    return crosswalk
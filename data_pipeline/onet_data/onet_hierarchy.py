@@ -0,0 +1,158 @@
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+import numpy as np
+import pandas as pd
+from onet_cache import DEFAULT_RELEASE
+from onet_store import load_table
+
+"""
+Index of the O*NET Content Model hierarchy (element IDs such as '2.C.4.a').
+
+Elements are numbered in preorder, so the subtree of an element is a contiguous range of node ids
+(nested sets): `start[i]` is the node itself and `end[i]` is one past its last descendant. With the
+parent pointers and depths this makes subtree, ancestor, descendant and depth-level selections range
+lookups on arrays instead of string scans over the element IDs.
+
+Example:
+    from onet_hierarchy import content_model
+
+    model = content_model("db_29_1")
+    model.subtree("2.A", depth=4)                  # the basic and cross-functional skills
+    model.subtree(["2.C.3", "2.C.4"], depth=4)     # knowledge in engineering/technology and mathematics/science
+    model.ancestors("2.C.4.a")                     # ['2', '2.C', '2.C.4']
+"""
+
+def _sort_key(element_id: str) -> Tuple:
+    """Sort key of an element ID: numeric parts compare as numbers ('2.A.1.10' after '2.A.1.9')."""
+    return tuple((0, int(part), '') if part.isdigit() else (1, 0, part) for part in element_id.split('.'))
+
+class ContentModelIndex:
+    """
+    Preorder index of the Content Model elements.
+
+    Attributes:
+        element_ids (np.ndarray): Element IDs in preorder (the node id is the position in this array).
+        names (np.ndarray): Element names, aligned with `element_ids`.
+        parent (np.ndarray): Node id of the parent of each node (-1 for the top-level domains).
+        depth (np.ndarray): Depth of each node (1 for the domains, '1', '2', ...).
+        end (np.ndarray): One past the last node of the subtree of each node.
+    """
+
+    def __init__(self, element_ids: Iterable[str], names: Optional[Iterable[str]] = None):
+        element_ids = list(element_ids)
+        names = list(names) if names is not None else [None] * len(element_ids)
+        order = sorted(range(len(element_ids)), key=lambda i: _sort_key(element_ids[i]))
+        self.element_ids = np.array([element_ids[i] for i in order], dtype=object)
+        self.names = np.array([names[i] for i in order], dtype=object)
+        self.position = {element_id: i for i, element_id in enumerate(self.element_ids)}
+
+        n = len(self.element_ids)
+        self.depth = np.array([element_id.count('.') + 1 for element_id in self.element_ids], dtype=np.int64)
+        self.parent = np.full(n, -1, dtype=np.int64)
+        self.end = np.full(n, n, dtype=np.int64)
+        # One pass over the preorder with the stack of open ancestors: a node closes the subtrees of the
+        # stacked nodes that are not its ancestors
+        stack = []
+        for i, element_id in enumerate(self.element_ids):
+            while stack and not element_id.startswith(self.element_ids[stack[-1]] + '.'):
+                self.end[stack.pop()] = i
+            self.parent[i] = stack[-1] if stack else -1
+            stack.append(i)
+
+        # Node ids of each depth, in preorder, for depth selections within a subtree
+        self.max_depth = int(self.depth.max()) if n else 0
+        self.by_depth = {d: np.flatnonzero(self.depth == d) for d in range(1, self.max_depth + 1)}
+
+    def node(self, element_id: str) -> int:
+        """Node id of an element."""
+        try:
+            return self.position[element_id]
+        except KeyError:
+            raise KeyError(f"Element {element_id} is not in the Content Model") from None
+
+    def nodes(self, element_ids: Iterable[str]) -> np.ndarray:
+        """Node ids of several elements (-1 for the elements not in the Content Model)."""
+        return np.array([self.position.get(element_id, -1) for element_id in element_ids], dtype=np.int64)
+
+    def _known_nodes(self, element_ids: Iterable[str]) -> np.ndarray:
+        """Node ids of several elements, raising KeyError for the elements not in the Content Model."""
+        element_ids = list(element_ids)
+        nodes = self.nodes(element_ids)
+        unknown = [element_ids[i] for i in np.flatnonzero(nodes < 0)]
+        if unknown:
+            raise KeyError(f"{len(unknown)} elements are not in the Content Model (e.g. {unknown[:5]})")
+        return nodes
+
+    def _subtree_nodes(self, element_id: str, depth: Optional[int], include_self: bool) -> np.ndarray:
+        start = self.node(element_id)
+        end = self.end[start]
+        if depth is not None:
+            nodes = self.by_depth.get(depth, np.empty(0, dtype=np.int64))
+            return nodes[np.searchsorted(nodes, start):np.searchsorted(nodes, end)]
+        return np.arange(start if include_self else start + 1, end)
+
+    def subtree(self, element_id, depth: Optional[int] = None, include_self: bool = True) -> np.ndarray:
+        """
+        Element IDs in the subtree of an element (or of each element of a list), in preorder.
+
+        Args:
+            element_id: An element ID, or a list of element IDs.
+            depth: Only return the elements at this depth (e.g. 4 for '2.C.4.a').
+            include_self: Include the element itself (ignored when `depth` is given).
+        """
+        roots = [element_id] if isinstance(element_id, str) else list(element_id)
+        nodes = np.concatenate([self._subtree_nodes(root, depth, include_self) for root in roots])
+        return self.element_ids[nodes]
+
+    def level(self, depth: int) -> np.ndarray:
+        """Element IDs at a depth, in preorder."""
+        return self.element_ids[self.by_depth.get(depth, np.empty(0, dtype=np.int64))]
+
+    def ancestors(self, element_id: str) -> np.ndarray:
+        """Element IDs of the ancestors of an element, from the top-level domain down."""
+        chain = []
+        node = self.parent[self.node(element_id)]
+        while node >= 0:
+            chain.append(node)
+            node = self.parent[node]
+        return self.element_ids[chain[::-1]]
+
+    def is_descendant(self, element_ids: Iterable[str], ancestor: str) -> np.ndarray:
+        """Whether each element is in the subtree of `ancestor` (itself included); False for unknown elements."""
+        nodes = self.nodes(element_ids)
+        start = self.node(ancestor)
+        return (nodes >= 0) & (nodes >= start) & (nodes < self.end[start])
+
+    def depth_of(self, element_ids: Iterable[str]) -> np.ndarray:
+        """Depth of each element (KeyError if an element is not in the Content Model)."""
+        return self.depth[self._known_nodes(element_ids)]
+
+    def ancestor_table(self, element_ids: Iterable[str]) -> pd.DataFrame:
+        """
+        Table with the ancestors of each element (itself included) at each depth, in columns
+        LEVEL_1, ..., LEVEL_{max depth} (NaN below the depth of the element).
+        """
+        current = self.nodes(element_ids)
+        columns = {}
+        for depth in range(self.max_depth, 0, -1):
+            at_depth = (current >= 0) & (self.depth[current] == depth)
+            columns[f'LEVEL_{depth}'] = np.where(at_depth, self.element_ids[current], np.nan)
+            current = np.where(at_depth, self.parent[current], current)
+        return pd.DataFrame({f'LEVEL_{d}': columns[f'LEVEL_{d}'] for d in range(1, self.max_depth + 1)})
+
+    def to_frame(self) -> pd.DataFrame:
+        """The index as a table: one row per node with its element ID, name, parent, depth and subtree range."""
+        return pd.DataFrame({
+            'NODE': np.arange(len(self.element_ids)),
+            'ELEMENT_ID': self.element_ids,
+            'ELEMENT_NAME': self.names,
+            'PARENT': self.parent,
+            'DEPTH': self.depth,
+            'END': self.end,
+        })
+
+@lru_cache(maxsize=None)
+def content_model(release: str = DEFAULT_RELEASE) -> ContentModelIndex:
+    """The Content Model index of a release (built once per release and process)."""
+    reference = load_table("Content Model Reference", release=release, categorical=False)
+    return ContentModelIndex(reference['ELEMENT_ID'], reference['ELEMENT_NAME'])
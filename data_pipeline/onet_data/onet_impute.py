@@ -0,0 +1,112 @@
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+"""
+Imputation of the occupations missing from an O*NET measurement table from their related occupations.
+
+The `Related Occupations` table is turned into a sparse (missing occupation x observed occupation) weight
+matrix, and the measurements of every missing occupation are the weighted means of the measurements of
+its related occupations, computed for all missing occupations, elements and scales with one sparse x dense
+product. Related occupations without a measurement for an element and scale are left out of its mean.
+
+Example:
+    from onet_store import load_table
+    from onet_impute import impute_related
+
+    related = load_table("Related Occupations", release="db_28_0", categorical=False)
+    knowledge = load_table("Knowledge", release="db_28_0", categorical=False)
+    knowledge = pd.concat([knowledge, impute_related(knowledge, related)], ignore_index=True)
+"""
+
+# Weight of each relatedness tier (full names and the abbreviations written by 01_download_onet_data.py)
+TIER_WEIGHTS = {
+    'Primary-Short': 1.0, 'PS': 1.0,
+    'Primary-Long': 0.5, 'PL': 0.5,
+    'Supplemental': 0.25, 'S': 0.25,
+}
+
+def related_weights(related: pd.DataFrame, weighting: str = 'equal',
+                    tier_weights: Dict[str, float] = TIER_WEIGHTS) -> pd.Series:
+    """
+    Weight of each (occupation, related occupation) pair of the Related Occupations table.
+
+    Args:
+        related: The Related Occupations table (standardized column names).
+        weighting: 'equal' (every related occupation counts the same), 'tier' (by RELATEDNESS_TIER,
+            see `tier_weights`) or 'index' (1 / INDEX, the rank of the related occupation).
+        tier_weights: Weight of each relatedness tier.
+
+    Returns:
+        The weights, aligned with the rows of `related`.
+    """
+    if weighting == 'equal':
+        return pd.Series(1.0, index=related.index)
+    if weighting == 'tier':
+        return related['RELATEDNESS_TIER'].map(tier_weights).astype('float64').fillna(0.0)
+    if weighting == 'index':
+        return 1.0 / related['INDEX'].astype('float64')
+    raise ValueError(f"Unknown weighting {weighting!r}, expected 'equal', 'tier' or 'index'")
+
+def impute_related(df: pd.DataFrame, related: pd.DataFrame,
+                   occupation_column: str = 'ONET_SOC_CODE',
+                   key_columns: Sequence[str] = ('ELEMENT_ID', 'SCALE_ID'),
+                   value_columns: Sequence[str] = ('DATA_VALUE',),
+                   occupations: Optional[List[str]] = None,
+                   weighting: str = 'equal') -> pd.DataFrame:
+    """
+    Impute the measurements of the occupations missing from a measurement table.
+
+    Args:
+        df: The measurement table, with one row per occupation and key (e.g. element and scale).
+        related: The Related Occupations table (standardized column names: ONET_SOC_CODE,
+            RELATED_ONET_SOC_CODE, RELATEDNESS_TIER, INDEX).
+        occupation_column: Column of `df` with the occupation codes.
+        key_columns: Columns of `df` identifying a measurement of an occupation.
+        value_columns: Measurement columns to impute.
+        occupations: Occupations that should be in the table. Defaults to every occupation of `related`.
+        weighting: How related occupations are weighted (see `related_weights`).
+
+    Returns:
+        The imputed rows, with the columns `occupation_column`, `key_columns` and `value_columns`.
+    """
+    key_columns, value_columns = list(key_columns), list(value_columns)
+    occupation, observed = pd.factorize(df[occupation_column])
+    key, keys = pd.MultiIndex.from_frame(df[key_columns]).factorize()
+    n_keys, n_values = len(keys), len(value_columns)
+
+    if occupations is None:
+        occupations = related['ONET_SOC_CODE'].unique()
+    missing = pd.Index(occupations).difference(observed)
+    columns = [occupation_column] + key_columns + value_columns
+    if missing.empty:
+        return pd.DataFrame(columns=columns)
+
+    # Observed measurements as a dense (occupation x key*value) matrix, NaN where not measured
+    values = np.full((len(observed), n_keys, n_values), np.nan)
+    values[occupation, key] = df[value_columns].to_numpy(dtype='float64', na_value=np.nan)
+    values = values.reshape(len(observed), n_keys * n_values)
+    measured = ~np.isnan(values)
+
+    # Sparse weights from each missing occupation to its observed related occupations
+    related = related.drop_duplicates(['ONET_SOC_CODE', 'RELATED_ONET_SOC_CODE'])
+    row = missing.get_indexer(related['ONET_SOC_CODE'])
+    col = observed.get_indexer(related['RELATED_ONET_SOC_CODE'])
+    weight = related_weights(related, weighting).to_numpy()
+    keep = (row >= 0) & (col >= 0) & (weight > 0)
+    weights = sp.csr_matrix((weight[keep], (row[keep], col[keep])), shape=(len(missing), len(observed)))
+
+    # Weighted sums and total weights of the measured related values, in one product
+    products = weights @ np.hstack([np.where(measured, values, 0.0), measured.astype('float64')])
+    sums, totals = products[:, :n_keys * n_values], products[:, n_keys * n_values:]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        imputed = np.where(totals > 0, sums / totals, np.nan).reshape(len(missing), n_keys, n_values)
+
+    # One row per missing occupation and key with at least one imputed value
+    i, j = np.nonzero(~np.isnan(imputed).all(axis=2))
+    result = pd.DataFrame({occupation_column: missing.take(i)})
+    for level, column in enumerate(key_columns):
+        result[column] = keys.get_level_values(level).take(j)
+    result[value_columns] = imputed[i, j]
+    return result
@@ -0,0 +1,106 @@
+import logging
+from typing import Dict, List, Sequence
+import numpy as np
+import pandas as pd
+
+"""
+Normalized importance x level (IM x LV) indices of O*NET element sets (knowledge, skills, abilities, ...).
+
+For an element set and an aggregation level (O*NET-SOC code, SOC code, Census OCC code, ...) the index of
+an occupation is computed as follows:
+    1. IM and LV are averaged over the rows of each (occupation, element) of the set,
+    2. IM and LV are min-max normalized over all the (occupation, element) pairs that have both,
+    3. the index is the mean of IM x LV over the elements of the occupation,
+    4. the index is min-max normalized over the occupations.
+A min-max normalization over values that are all equal (e.g. a level with a single code) is undefined:
+the index of the set at that level is NaN, with a warning.
+
+Every level is integer-coded once and the per-group sums are segment sums (`np.bincount`) over the codes,
+shared by all the element sets, so many sets, levels and releases can be built in one batch.
+
+Example:
+    from onet_index import element_indices
+
+    indices = element_indices(knowledge, {"KNOWLEDGE": knowledge_ids, "SKILLS": skill_ids},
+                              levels=["ONET_SOC_CODE", "SOC", "OCC"])
+"""
+
+def _min_max(values: np.ndarray, mask, what: str) -> np.ndarray:
+    """Min-max normalization of `values` over the entries of `mask` (NaN, with a warning, when they are all equal)."""
+    low, high = values[mask].min(), values[mask].max()
+    if high == low:
+        logging.warning(f"Cannot normalize {what}: all the values are {low}, the index is NaN")
+        return np.full(values.shape, np.nan)
+    return (values - low) / (high - low)
+
+def element_indices(df: pd.DataFrame, element_sets: Dict[str, Sequence[str]], levels: List[str],
+                    element_column: str = 'ELEMENT_ID', scale_column: str = 'SCALE_ID',
+                    value_column: str = 'DATA_VALUE') -> pd.DataFrame:
+    """
+    Compute the normalized IM x LV index of every element set at every aggregation level.
+
+    Args:
+        df: Long measurement table with one row per occupation, element and scale.
+        element_sets: Element sets, mapping the name of each index to its element IDs.
+        levels: Columns of `df` holding the occupation code at each aggregation level.
+        element_column: Column with the element IDs.
+        scale_column: Column with the scale IDs (only the IM and LV rows are used).
+        value_column: Column with the measurements.
+
+    Returns:
+        Tidy DataFrame with columns LEVEL (the level column), CODE (the occupation code at that level),
+        INDEX (the element set name), N_ELEMENTS (elements of the set rated for the occupation) and VALUE.
+    """
+    elements = sorted(set().union(*map(set, element_sets.values())))
+    df = df[df[element_column].isin(elements) & df[scale_column].isin(['IM', 'LV'])]
+    df = df[df[value_column].notna()]
+
+    element = pd.Categorical(df[element_column], categories=elements).codes
+    scale = (df[scale_column] == 'LV').to_numpy(dtype=np.int64)
+    values = df[value_column].to_numpy(dtype='float64')
+    in_set = {name: np.isin(elements, list(ids)) for name, ids in element_sets.items()}
+    n_elements = len(elements)
+
+    frames = []
+    for level in levels:
+        code, codes = pd.factorize(df[level], sort=True)
+        valid = code >= 0
+        n_codes = len(codes)
+
+        # Mean IM and LV of every (occupation, element) pair: segment sums over the (code, element, scale) key
+        key = (code[valid] * n_elements + element[valid]) * 2 + scale[valid]
+        size = n_codes * n_elements * 2
+        sums = np.bincount(key, weights=values[valid], minlength=size).reshape(n_codes, n_elements, 2)
+        counts = np.bincount(key, minlength=size).reshape(n_codes, n_elements, 2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+        rated = (counts > 0).all(axis=2)
+
+        for name, mask in in_set.items():
+            pairs = rated & mask[None, :]
+            if not pairs.any():
+                continue
+            importance, level_value = means[..., 0], means[..., 1]
+            normalized = [_min_max(x, pairs, f"{scale} of {name} at {level}")
+                          for scale, x in (('IM', importance), ('LV', level_value))]
+            product = np.where(pairs, normalized[0] * normalized[1], 0.0)
+            n_rated = pairs.sum(axis=1)
+            has_index = n_rated > 0
+            index = product.sum(axis=1)[has_index] / n_rated[has_index]
+            index = _min_max(index, slice(None), f"the {name} index at {level}")
+            frames.append(pd.DataFrame({
+                'LEVEL': level,
+                'CODE': np.asarray(codes)[has_index],
+                'INDEX': name,
+                'N_ELEMENTS': n_rated[has_index],
+                'VALUE': index,
+            }))
+
+    columns = ['LEVEL', 'CODE', 'INDEX', 'N_ELEMENTS', 'VALUE']
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+def index_table(indices: pd.DataFrame, level: str) -> pd.DataFrame:
+    """The indices of one aggregation level as a table with one column per element set."""
+    table = indices[indices['LEVEL'] == level].pivot(index='CODE', columns='INDEX', values='VALUE')
+    table.columns.name = None
+    return table.rename_axis(level).reset_index()
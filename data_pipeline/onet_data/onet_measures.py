@@ -0,0 +1,124 @@
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+import numpy as np
+import pandas as pd
+
+"""
+Vectorized reshaping of the O*NET measurement tables (Knowledge, Skills, Abilities, Work Activities, ...).
+
+Occupations, elements and scales are integer-coded once (`pd.factorize`, which reuses the codes of
+categorical columns such as the ones loaded from the O*NET store). Every reshape is then a scatter into
+a NumPy array at the coded positions, and auxiliary fields (NOT_RELEVANT, RECOMMEND_SUPPRESS) are joined
+by indexing arrays with the same codes, with no per-row Python code.
+
+Example:
+    from onet_store import load_table
+    from onet_measures import measurement_tensor, measurements_wide
+
+    skills = load_table("Skills", release="db_29_1")
+    tensor = measurement_tensor(skills)      # occupation x element x scale
+    importance = tensor.matrix("IM")         # occupation x element DataFrame
+    skills_wide = measurements_wide(skills)  # one row per occupation and element, one column per scale
+"""
+
+def encode(series: pd.Series) -> Tuple[np.ndarray, pd.Index]:
+    """Integer-code a column (codes follow the sorted unique values, missing values get the last code)."""
+    codes, uniques = pd.factorize(series, sort=True, use_na_sentinel=False)
+    return codes, pd.Index(uniques, name=series.name)
+
+class MeasurementTensor(NamedTuple):
+    """
+    Dense occupation x element x scale array of a measurement table, with the index maps of each axis.
+
+    Missing measurements are NaN. `flags` holds, for each auxiliary Y/N field, a boolean array of the
+    same shape that is True where the field is 'Y'.
+    """
+    values: np.ndarray
+    occupations: pd.Index
+    elements: pd.Index
+    scales: pd.Index
+    flags: Dict[str, np.ndarray]
+
+    def matrix(self, scale: str) -> pd.DataFrame:
+        """The occupation x element matrix of one scale (e.g. 'IM' or 'LV')."""
+        return pd.DataFrame(self.values[:, :, self.scales.get_loc(scale)], index=self.occupations, columns=self.elements)
+
+def measurement_tensor(df: pd.DataFrame, values: str = 'DATA_VALUE',
+                       flags: Sequence[str] = ('RECOMMEND_SUPPRESS', 'NOT_RELEVANT')) -> MeasurementTensor:
+    """
+    Build the occupation x element x scale tensor of a long measurement table in one pass.
+
+    Args:
+        df: The measurement table, with ONET_SOC_CODE, ELEMENT_ID, SCALE_ID and `values` columns.
+        values: The measurement column.
+        flags: Auxiliary Y/N columns returned as boolean arrays (the ones missing from `df` are skipped).
+
+    Returns:
+        The tensor and its index maps.
+    """
+    occupation, occupations = encode(df['ONET_SOC_CODE'])
+    element, elements = encode(df['ELEMENT_ID'])
+    scale, scales = encode(df['SCALE_ID'])
+    shape = (len(occupations), len(elements), len(scales))
+
+    tensor = np.full(shape, np.nan)
+    tensor[occupation, element, scale] = df[values].to_numpy(dtype='float64', na_value=np.nan)
+
+    flag_arrays = {}
+    for field in flags:
+        if field in df.columns:
+            flag = np.zeros(shape, dtype=bool)
+            flag[occupation, element, scale] = (df[field] == 'Y').to_numpy(dtype=bool, na_value=False)
+            flag_arrays[field] = flag
+    return MeasurementTensor(tensor, occupations, elements, scales, flag_arrays)
+
+def measurements_wide(df: pd.DataFrame,
+                      index: List[str] = ['ONET_SOC_CODE', 'ELEMENT_ID', 'RECOMMEND_SUPPRESS'],
+                      columns: str = 'SCALE_ID', values: str = 'DATA_VALUE',
+                      lookups: Dict[str, str] = {'NOT_RELEVANT': 'LV'}) -> pd.DataFrame:
+    """
+    Convert a long measurement table to wide format: one row per `index` combination, one column per scale.
+
+    Equivalent to `df.pivot(index=index, columns=columns, values=values).reset_index()`, with the auxiliary
+    fields in `lookups` joined from the rows of one scale (e.g. NOT_RELEVANT is only reported with the
+    LV scale) by occupation and element.
+
+    Args:
+        df: The long measurement table.
+        index: Columns identifying a row of the wide table (the first two are the occupation and element).
+        columns: Column whose values become the columns of the wide table.
+        values: The measurement column.
+        lookups: Auxiliary fields to join, mapped to the scale whose rows hold them.
+
+    Returns:
+        The wide table.
+    """
+    index = [c for c in index if c in df.columns]
+    encoded = [encode(df[c]) for c in index]
+    codes = [c for c, _ in encoded]
+    dims = tuple(len(u) for _, u in encoded)
+
+    # Row of the wide table of every long row
+    keys, row = np.unique(np.ravel_multi_index(codes, dims), return_inverse=True)
+    column, column_values = encode(df[columns])
+    if len(np.unique(row * len(column_values) + column)) < len(row):
+        raise ValueError("Index contains duplicate entries, cannot reshape")
+    wide = np.full((len(keys), len(column_values)), np.nan)
+    wide[row, column] = df[values].to_numpy(dtype='float64', na_value=np.nan)
+
+    row_codes = np.unravel_index(keys, dims)
+    df_wide = pd.DataFrame({c: u.take(rc).to_numpy() for c, (_, u), rc in zip(index, encoded, row_codes)})
+    df_wide = pd.concat([df_wide, pd.DataFrame(wide, columns=column_values.astype(str))], axis=1)
+    df_wide.columns.name = columns
+
+    # Auxiliary fields: scatter the rows of the lookup scale into an occupation x element array, then
+    # read it back at the (occupation, element) of every wide row
+    n_pairs = dims[0] * dims[1]
+    pair = codes[0] * dims[1] + codes[1]
+    row_pair = row_codes[0] * dims[1] + row_codes[1]
+    for field, scale in lookups.items():
+        if field in df.columns and field not in df_wide.columns:
+            lookup = np.full(n_pairs, None, dtype=object)
+            mask = (df[columns] == scale).to_numpy(dtype=bool, na_value=False)
+            lookup[pair[mask]] = df[field].to_numpy(dtype=object)[mask]
+            df_wide[field] = lookup[row_pair]
+    return df_wide
@@ -0,0 +1,118 @@
+import os
+import logging
+from typing import List, Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from onet_cache import read_table, normalize_release, BASE_DIR, DEFAULT_RELEASE
+
+"""
+Columnar store of O*NET tables, one Arrow IPC (Feather v2) file per table and release.
+
+Tables are stored uncompressed so they can be memory-mapped: `open_table` returns a pyarrow Table
+whose buffers point into the file, nothing is parsed or copied. The identifier columns
+(ONET_SOC_CODE, ELEMENT_ID, SCALE_ID) are dictionary-encoded, so they map to categoricals in pandas.
+
+Layout:
+    shared_data/onet_data/store/{release}/{kind}/{TABLE_NAME}.arrow
+
+`kind` is 'raw' for the tables as published in the release (with standardized column names, built
+from the release cache on first use), or the kind of processed table written by 01_download_onet_data.py
+('reference', 'measure').
+
+Example:
+    from onet_store import open_table, load_table
+
+    knowledge_25 = open_table("Knowledge", release="db_25_0")   # pyarrow Table, memory-mapped
+    knowledge_28 = load_table("Knowledge", release="db_28_0")   # pandas DataFrame
+"""
+
+STORE_DIR = os.path.join(BASE_DIR, 'shared_data', 'onet_data', 'store')
+
+# Identifier columns stored dictionary-encoded
+DICTIONARY_COLUMNS = ['ONET_SOC_CODE', 'ELEMENT_ID', 'SCALE_ID']
+
+def standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Rename the columns to upper case without spaces, dashes or '*' ('O*NET-SOC Code' -> 'ONET_SOC_CODE')."""
+    return df.rename(columns=lambda col: col.upper().replace(' ', '_').replace('-', '_').replace('*', ''))
+
+def table_file_name(data_set_name: str) -> str:
+    """File name of a table in the store ('Education, Training, and Experience' -> 'EDUCATION_TRAINING_AND_EXPERIENCE.arrow')."""
+    return data_set_name.replace(' ', '_').replace(',', '').upper() + '.arrow'
+
+def table_path(data_set_name: str, release: str = DEFAULT_RELEASE, kind: str = 'raw', store_dir: str = STORE_DIR) -> str:
+    """Path of a table in the store."""
+    return os.path.join(store_dir, normalize_release(release), kind, table_file_name(data_set_name))
+
+def to_arrow(df: pd.DataFrame, dictionary_columns: List[str] = DICTIONARY_COLUMNS) -> pa.Table:
+    """Convert a DataFrame to an Arrow table with the identifier columns dictionary-encoded."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for column in dictionary_columns:
+        if column in table.column_names:
+            i = table.schema.get_field_index(column)
+            encoded = table.column(i)
+            if not pa.types.is_dictionary(encoded.type):
+                encoded = pc.dictionary_encode(encoded)
+            table = table.set_column(i, column, encoded)
+    # A single chunk (and dictionary) per column, as required by the IPC file format
+    return table.unify_dictionaries().combine_chunks()
+
+def write_table(df: pd.DataFrame, data_set_name: str, release: str = DEFAULT_RELEASE, kind: str = 'raw',
+                store_dir: str = STORE_DIR) -> str:
+    """Write a table to the store (through a temporary file, so readers never see a partial table)."""
+    path = table_path(data_set_name, release, kind, store_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = to_arrow(df)
+    with pa.OSFile(path + '.tmp', 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(path + '.tmp', path)
+    logging.info(f"Data saved to {path}")
+    return path
+
+def build_table(data_set_name: str, release: str = DEFAULT_RELEASE, store_dir: str = STORE_DIR,
+                offline: Optional[bool] = None) -> str:
+    """Read a table from the release cache and write it to the store."""
+    df = standardize_columns(read_table(data_set_name, release=release, offline=offline))
+    return write_table(df, data_set_name, release, 'raw', store_dir)
+
+def open_table(data_set_name: str, release: str = DEFAULT_RELEASE, kind: str = 'raw',
+               columns: Optional[List[str]] = None, store_dir: str = STORE_DIR,
+               offline: Optional[bool] = None) -> pa.Table:
+    """
+    Open a table of a release, memory-mapped (zero-copy).
+
+    Raw tables missing from the store are built from the release cache first.
+
+    Args:
+        data_set_name: The O*NET table (e.g. 'Knowledge') or the name it was written with.
+        release: The release name (e.g. 'db_28_0').
+        kind: 'raw', or the kind of processed table ('reference', 'measure').
+        columns: Columns to return. Defaults to all columns.
+        store_dir: Root directory of the store.
+        offline: Never download a missing release (defaults to the ONET_OFFLINE environment variable).
+
+    Returns:
+        The table, backed by the memory-mapped file.
+    """
+    path = table_path(data_set_name, release, kind, store_dir)
+    if not os.path.exists(path):
+        if kind != 'raw':
+            raise FileNotFoundError(f"{path} not found, run 01_download_onet_data.py for release {release}")
+        build_table(data_set_name, release, store_dir, offline)
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    return table.select(columns) if columns is not None else table
+
+def load_table(data_set_name: str, release: str = DEFAULT_RELEASE, kind: str = 'raw',
+               columns: Optional[List[str]] = None, categorical: bool = True, **kwargs) -> pd.DataFrame:
+    """
+    Load a table of a release as a DataFrame (see `open_table`).
+
+    The dictionary-encoded columns become categoricals, or plain strings with `categorical=False`.
+    """
+    table = open_table(data_set_name, release, kind, columns, **kwargs)
+    if not categorical:
+        for i, field in enumerate(table.schema):
+            if pa.types.is_dictionary(field.type):
+                table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+    return table.to_pandas()
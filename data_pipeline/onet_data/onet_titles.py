@@ -0,0 +1,222 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Optional, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sklearn.feature_extraction.text import TfidfVectorizer
+from onet_cache import DEFAULT_RELEASE, normalize_release
+from onet_store import STORE_DIR, load_table
+
+"""
+Matching of free-text job titles (e.g. the JOB_TITLE of LCA filings) to O*NET-SOC occupations.
+
+The title corpus of a release is the occupation titles (Occupation Data) plus the Alternate Titles and
+Sample of Reported Titles tables. Titles are represented by character n-gram TF-IDF vectors (robust to
+abbreviations, typos and word order), and a batch of job titles is scored against the whole corpus with
+one sparse matrix product, followed by a top-k selection per title. Job titles are normalized and
+deduplicated before scoring, and the matches of every distinct title are cached per release and n-gram
+range with the k they were scored with, so a title is only scored again when more matches are asked for.
+
+Example:
+    from onet_titles import match_titles, best_matches
+
+    matches = match_titles(["Sr. Software Engineer", "Data Scientist II"], release="db_29_1", k=3)
+    lca[["TITLE_ONET_SOC_CODE", "TITLE_MATCH_SCORE"]] = best_matches(lca["JOB_TITLE"], release="db_29_1")
+"""
+
+TITLE_SOURCES = {
+    'Occupation Data': 'TITLE',
+    'Alternate Titles': 'ALTERNATE_TITLE',
+    'Sample of Reported Titles': 'REPORTED_JOB_TITLE',
+}
+NGRAM_RANGE = (3, 3)
+BATCH_SIZE = 256
+N_JOBS = os.cpu_count()
+MATCH_COLUMNS = ['TITLE_NORMALIZED', 'RANK', 'ONET_SOC_CODE', 'MATCHED_TITLE', 'SOURCE', 'SCORE']
+CACHE_COLUMNS = MATCH_COLUMNS + ['K']
+
+def normalize_titles(titles: pd.Series) -> pd.Series:
+    """Lower case, '&' spelled 'and', punctuation replaced by spaces and whitespace collapsed."""
+    return (titles.astype('string').str.lower()
+            .str.replace('&', ' and ', regex=False)
+            .str.replace(r'[^a-z0-9+#]+', ' ', regex=True)
+            .str.strip())
+
+def title_corpus(release: str = DEFAULT_RELEASE, store_dir: str = STORE_DIR) -> pd.DataFrame:
+    """
+    The titles of a release with their occupation: one row per distinct (normalized title, occupation),
+    with the source table of the title.
+    """
+    frames = []
+    for data_set_name, column in TITLE_SOURCES.items():
+        df = load_table(data_set_name, release=release, columns=['ONET_SOC_CODE', column], categorical=False,
+                        store_dir=store_dir)
+        frames.append(pd.DataFrame({'ONET_SOC_CODE': df['ONET_SOC_CODE'], 'TITLE': df[column], 'SOURCE': data_set_name}))
+    corpus = pd.concat(frames, ignore_index=True)
+    corpus['TITLE_NORMALIZED'] = normalize_titles(corpus['TITLE'])
+    corpus = corpus[corpus['TITLE_NORMALIZED'].str.len() > 0]
+    return corpus.drop_duplicates(['TITLE_NORMALIZED', 'ONET_SOC_CODE'], ignore_index=True)
+
+class TitleMatcher:
+    """
+    Character n-gram TF-IDF index of a title corpus.
+
+    Args:
+        corpus: Titles with columns TITLE_NORMALIZED, TITLE, ONET_SOC_CODE and SOURCE (see `title_corpus`).
+        ngram_range: Lengths of the character n-grams (within word boundaries).
+    """
+
+    def __init__(self, corpus: pd.DataFrame, ngram_range: Tuple[int, int] = NGRAM_RANGE):
+        self.corpus = corpus.reset_index(drop=True)
+        self.vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=ngram_range, sublinear_tf=True, dtype=np.float32)
+        # Transposed corpus matrix (n-gram x title), the right-hand side of every product
+        self.index = self.vectorizer.fit_transform(self.corpus['TITLE_NORMALIZED'].astype(str)).T.tocsr()
+
+    def top_k(self, titles: Iterable[str], k: int = 5, batch_size: int = BATCH_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The k corpus titles most similar (cosine) to each title.
+
+        Returns:
+            (positions, scores): arrays of shape (len(titles), k), corpus positions sorted by decreasing score
+            (ties by position), padded with score 0 when a title shares n-grams with fewer than k titles.
+        """
+        titles = list(titles)
+        positions = np.zeros((len(titles), k), dtype=np.int64)
+        scores = np.zeros((len(titles), k), dtype=np.float32)
+        for start in range(0, len(titles), batch_size):
+            similarity = self.vectorizer.transform(titles[start:start + batch_size]) @ self.index
+            # The negated nonzero similarities of each row (a fraction of the corpus), left-aligned in a block
+            # padded with 0 to the longest row, and one partition of all the rows
+            counts = np.diff(similarity.indptr)
+            width = max(int(counts.max(initial=0)), k)
+            offsets = np.arange(len(counts)) * width - similarity.indptr[:-1]
+            values = np.zeros(len(counts) * width, dtype=np.float32)
+            values[np.arange(similarity.nnz) + np.repeat(offsets, counts)] = -similarity.data
+            values = values.reshape(len(counts), width)
+            best = np.argpartition(values, k - 1, axis=1)[:, :k] if width > k else np.arange(k)[None, :]
+            values = -np.take_along_axis(values, best, axis=1)
+            # Corpus positions of the selected slots (0 for the padding, whose score is 0)
+            found = best < counts[:, None]
+            columns = np.where(found, similarity.indices[np.where(found, similarity.indptr[:-1, None] + best, 0)], 0)
+            order = np.lexsort((columns, -values), axis=1)
+            positions[start:start + len(counts)] = np.take_along_axis(columns, order, axis=1)
+            scores[start:start + len(counts)] = np.take_along_axis(values, order, axis=1)
+        return positions, scores
+
+    def match(self, titles: Iterable[str], k: int = 5, batch_size: int = BATCH_SIZE, overfetch: int = 4) -> pd.DataFrame:
+        """
+        The k best occupations of each (normalized) title: the best-scoring corpus titles, keeping the best
+        title of each occupation.
+
+        Returns:
+            A DataFrame with columns TITLE_NORMALIZED, RANK (1 = best), ONET_SOC_CODE, MATCHED_TITLE, SOURCE
+            and SCORE (cosine similarity), without the matches of score 0.
+        """
+        titles = list(titles)
+        positions, scores = self.top_k(titles, k * overfetch, batch_size)
+        n = positions.shape[1]
+        matches = pd.DataFrame({
+            'TITLE_NORMALIZED': np.repeat(np.asarray(titles, dtype=object), n),
+            'ONET_SOC_CODE': self.corpus['ONET_SOC_CODE'].to_numpy()[positions.ravel()],
+            'MATCHED_TITLE': self.corpus['TITLE'].to_numpy()[positions.ravel()],
+            'SOURCE': self.corpus['SOURCE'].to_numpy()[positions.ravel()],
+            'SCORE': scores.ravel(),
+        })
+        # Rows are already sorted by title and decreasing score
+        matches = matches[matches['SCORE'] > 0].drop_duplicates(['TITLE_NORMALIZED', 'ONET_SOC_CODE'])
+        matches['RANK'] = matches.groupby('TITLE_NORMALIZED', sort=False).cumcount() + 1
+        return matches.loc[matches['RANK'] <= k, MATCH_COLUMNS].reset_index(drop=True)
+
+_worker_matcher: Optional[TitleMatcher] = None
+
+def _init_worker(matcher: TitleMatcher):
+    global _worker_matcher
+    _worker_matcher = matcher
+
+def _match_chunk(args) -> pd.DataFrame:
+    titles, k, batch_size = args
+    return _worker_matcher.match(titles, k, batch_size)
+
+def cache_path(release: str = DEFAULT_RELEASE, ngram_range: Tuple[int, int] = NGRAM_RANGE,
+               store_dir: str = STORE_DIR) -> str:
+    """Path of the cached title matches of a release and n-gram range (the matches of other ranges differ)."""
+    low, high = ngram_range
+    return os.path.join(store_dir, normalize_release(release), 'titles', f"TITLE_MATCHES_char_wb_{low}_{high}.parquet")
+
+def match_titles(titles: Iterable[str], release: str = DEFAULT_RELEASE, k: int = 5, n_jobs: Optional[int] = N_JOBS,
+                 chunk_size: int = 20_000, batch_size: int = BATCH_SIZE, ngram_range: Tuple[int, int] = NGRAM_RANGE,
+                 store_dir: str = STORE_DIR) -> pd.DataFrame:
+    """
+    Match job titles to O*NET-SOC occupations, reusing (and extending) the cached matches of the release.
+
+    Args:
+        titles: Job titles (raw; they are normalized and deduplicated here).
+        release: O*NET release of the title corpus.
+        k: Number of occupations per title. The cache keeps the k each title was scored with (column K), and
+            the titles cached with a smaller k are scored again.
+        n_jobs: Number of worker processes scoring chunks of titles in parallel (1 scores in this process).
+        chunk_size: Titles per worker task.
+        batch_size: Titles per sparse product (bounds the memory of the similarity block).
+        ngram_range: Lengths of the character n-grams of the matcher (see `TitleMatcher`).
+        store_dir: Root directory of the O*NET store (the cache is kept with the release).
+
+    Returns:
+        The matches of the distinct normalized titles (see `TitleMatcher.match`).
+    """
+    raw = pd.unique(pd.Series(list(titles), dtype='string').dropna())
+    distinct = normalize_titles(pd.Series(raw, dtype='string')).unique()
+    distinct = pd.Index(distinct[pd.Series(distinct).str.len().to_numpy() > 0])
+
+    path = cache_path(release, ngram_range, store_dir)
+    cached = pq.read_table(path).to_pandas() if os.path.exists(path) else pd.DataFrame(columns=CACHE_COLUMNS)
+    # Titles never scored, or scored with fewer than k matches
+    complete = cached.loc[cached['K'] >= k, 'TITLE_NORMALIZED'].unique()
+    missing = distinct.difference(pd.Index(complete)).tolist()
+    if missing:
+        logging.info(f"Scoring {len(missing)} titles ({len(distinct) - len(missing)} cached) against O*NET {release}")
+        cached = cached[~cached['TITLE_NORMALIZED'].isin(missing)]
+        matcher = TitleMatcher(title_corpus(release, store_dir), ngram_range)
+        chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+        if n_jobs and n_jobs > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(matcher,)) as executor:
+                scored = list(executor.map(_match_chunk, [(chunk, k, batch_size) for chunk in chunks]))
+        else:
+            scored = [matcher.match(chunk, k, batch_size) for chunk in chunks]
+        # Titles without any match are cached too (with no occupation), so they are not scored again
+        unmatched = pd.Index(missing).difference(pd.Index(pd.concat(scored)['TITLE_NORMALIZED'].unique()))
+        scored.append(pd.DataFrame({'TITLE_NORMALIZED': unmatched, 'RANK': 0, 'SCORE': 0.0}))
+        scored = [df.assign(K=k) for df in scored]
+        frames = [df for df in [cached] + scored if len(df)]
+        cached = pd.concat(frames, ignore_index=True).reindex(columns=CACHE_COLUMNS)
+        cached = cached.astype({'RANK': 'int64', 'SCORE': 'float32', 'K': 'int64'})
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(pa.Table.from_pandas(cached, preserve_index=False), path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    matches = cached[cached['TITLE_NORMALIZED'].isin(distinct) & cached['RANK'].between(1, k)]
+    return matches[MATCH_COLUMNS].reset_index(drop=True)
+
+def best_matches(titles: pd.Series, release: str = DEFAULT_RELEASE, min_score: float = 0.0, **kwargs) -> pd.DataFrame:
+    """
+    The best occupation of every row of a job title column (see `match_titles` for the other arguments).
+
+    Returns:
+        A DataFrame aligned with `titles`, with columns TITLE_ONET_SOC_CODE and TITLE_MATCH_SCORE (missing
+        when no title scores above `min_score`).
+    """
+    best = match_titles(titles, release, k=1, **kwargs).set_index('TITLE_NORMALIZED')
+    best = best[best['SCORE'] > min_score]
+    # Normalize the distinct titles only, then gather the matches back to the rows
+    codes, uniques = pd.factorize(titles)
+    normalized = normalize_titles(pd.Series(uniques, dtype='string'))
+    position = best.index.get_indexer(normalized.fillna(''))
+    position = np.append(position, -1)[codes]
+    found = position >= 0
+    result = pd.DataFrame({'TITLE_ONET_SOC_CODE': pd.Series(pd.NA, index=titles.index, dtype='string'),
+                           'TITLE_MATCH_SCORE': np.nan}, index=titles.index)
+    result.loc[found, 'TITLE_ONET_SOC_CODE'] = best['ONET_SOC_CODE'].to_numpy()[position[found]]
+    result.loc[found, 'TITLE_MATCH_SCORE'] = best['SCORE'].to_numpy()[position[found]]
+    return result
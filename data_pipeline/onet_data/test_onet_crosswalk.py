@@ -0,0 +1,81 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from onet_crosswalk import Crosswalk, load_crosswalk, onet_to_soc
+
+"""
+Tests of the occupation crosswalks: weights, one-to-one and many-to-many mapping, and the on-disk cache.
+"""
+
+PAIRS = pd.DataFrame({
+    'SOC2018': ['15-1252', '15-1252', '11-1011', '29-1141', '29-1141', '29-1141'],
+    'OCC2018': ['1021', '1022', '0010', '3255', '3256', '3255'],
+    'WEIGHT': ['3', '1', '1', '1', '2', '1'],
+})
+
+@pytest.fixture
+def crosswalk():
+    return Crosswalk.from_pairs(PAIRS, 'SOC2018', 'OCC2018', weight='WEIGHT')
+
+def test_weights_sum_to_one(crosswalk):
+    assert crosswalk.source_codes.tolist() == ['11-1011', '15-1252', '29-1141']
+    totals = np.add.reduceat(crosswalk.weights, crosswalk.indptr[:-1])
+    assert totals == pytest.approx([1.0, 1.0, 1.0])
+    # Duplicate pairs are merged: 3255 gets 1 + 1 of the 4 units of 29-1141
+    expanded = dict(zip(*crosswalk.expand(pd.Series(['29-1141']))[1:]))
+    assert expanded == pytest.approx({'3255': 0.5, '3256': 0.5})
+
+def test_equal_weights_without_a_weight_column():
+    crosswalk = Crosswalk.from_pairs(PAIRS, 'SOC2018', 'OCC2018')
+    _, codes, weights = crosswalk.expand(pd.Series(['15-1252']))
+    assert dict(zip(codes, weights)) == pytest.approx({'1021': 0.5, '1022': 0.5})
+
+def test_map(crosswalk):
+    values = pd.Series(['15-1252', ' 11-1011 ', '99-9999', None, '15-1252'], index=[5, 6, 7, 8, 9])
+    mapped = crosswalk.map(values)
+    assert mapped.index.tolist() == [5, 6, 7, 8, 9]
+    assert mapped.tolist() == ['1021', '0010', None, None, '1021']
+
+def test_map_integer_coded_soc(crosswalk):
+    assert crosswalk.map(pd.Series([151132, 111011], dtype='Int32')).tolist() == [None, '0010']
+
+def test_expand(crosswalk):
+    values = pd.Series(['29-1141', '99-9999', '15-1252', None, '11-1011'])
+    rows, codes, weights = crosswalk.expand(values)
+    pairs = sorted(zip(rows.tolist(), codes.tolist(), weights.tolist()))
+    assert [(row, code) for row, code, _ in pairs] == [
+        (0, '3255'), (0, '3256'), (2, '1021'), (2, '1022'), (4, '0010')]
+    assert [weight for _, _, weight in pairs] == pytest.approx([0.5, 0.5, 0.75, 0.25, 1.0])
+
+def test_expand_without_matches(crosswalk):
+    rows, codes, weights = crosswalk.expand(pd.Series(['99-9999', None]))
+    assert len(rows) == len(codes) == len(weights) == 0
+
+def test_join(crosswalk):
+    df = pd.DataFrame({'SOC': ['15-1252', '99-9999'], 'EMP': [100.0, 50.0]})
+    assert crosswalk.join(df, 'SOC')['OCC2018'].tolist() == ['1021', None]
+    expanded = crosswalk.join(df, 'SOC', name='OCC', expand=True)
+    assert expanded['OCC'].tolist() == ['1021', '1022']
+    assert (expanded['EMP'] * expanded['WEIGHT']).sum() == pytest.approx(100.0)
+
+def test_onet_to_soc():
+    assert onet_to_soc(pd.Series(['15-1252.00', '15-1252.01', None])).tolist() == ['15-1252', '15-1252', None]
+
+def test_load_crosswalk_cache(tmp_path):
+    csv_path, cache_dir = str(tmp_path / 'soc2018_occ2018.csv'), str(tmp_path / 'cache')
+    PAIRS.to_csv(csv_path, index=False)
+    built = load_crosswalk('SOC2018', 'OCC2018', csv_path=csv_path, weight='WEIGHT', cache_dir=cache_dir)
+    cached = load_crosswalk('SOC2018', 'OCC2018', csv_path=csv_path, weight='WEIGHT', cache_dir=cache_dir)
+    assert cached.weights == pytest.approx(built.weights)
+    # Other weights get their own cache file
+    unweighted = load_crosswalk('SOC2018', 'OCC2018', csv_path=csv_path, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 2
+    assert unweighted.map(pd.Series(['15-1252'])).tolist() == ['1021']
+
+    # A changed CSV rebuilds the crosswalk
+    PAIRS.assign(WEIGHT=['1', '3', '1', '1', '2', '1']).to_csv(csv_path, index=False)
+    stat = os.stat(csv_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    rebuilt = load_crosswalk('SOC2018', 'OCC2018', csv_path=csv_path, weight='WEIGHT', cache_dir=cache_dir)
+    assert rebuilt.map(pd.Series(['15-1252'])).tolist() == ['1022']
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from onet_hierarchy import ContentModelIndex
+
+"""
+Tests of the preorder index of the Content Model.
+"""
+
+ELEMENT_IDS = ['2.A.1.a', '1', '2', '2.A', '1.A', '2.A.1', '2.A.10', '2.A.9', '2.B']
+
+@pytest.fixture
+def model():
+    return ContentModelIndex(ELEMENT_IDS)
+
+def test_preorder_with_numeric_parts(model):
+    assert model.element_ids.tolist() == ['1', '1.A', '2', '2.A', '2.A.1', '2.A.1.a', '2.A.9', '2.A.10', '2.B']
+    assert model.parent.tolist() == [-1, 0, -1, 2, 3, 4, 3, 3, 2]
+    assert model.end.tolist() == [2, 2, 9, 8, 6, 6, 7, 8, 9]
+
+def test_subtree_and_levels(model):
+    assert model.subtree('2.A').tolist() == ['2.A', '2.A.1', '2.A.1.a', '2.A.9', '2.A.10']
+    assert model.subtree('2.A', include_self=False).tolist() == ['2.A.1', '2.A.1.a', '2.A.9', '2.A.10']
+    assert model.subtree(['1', '2.A'], depth=3).tolist() == ['2.A.1', '2.A.9', '2.A.10']
+    assert model.level(2).tolist() == ['1.A', '2.A', '2.B']
+    assert model.ancestors('2.A.1.a').tolist() == ['2', '2.A', '2.A.1']
+
+def test_depth_of(model):
+    assert model.depth_of(['1', '2.A.1.a', '2.B']).tolist() == [1, 4, 2]
+
+def test_depth_of_unknown_element_raises(model):
+    with pytest.raises(KeyError, match='9.Z'):
+        model.depth_of(['2.A', '9.Z'])
+
+def test_is_descendant(model):
+    result = model.is_descendant(['2.A.10', '2.A', '2.B', '1.A', '9.Z'], '2.A')
+    assert result.tolist() == [True, True, False, False, False]
+    # An unknown element is not in the subtree of the last node either
+    assert not model.is_descendant(['9.Z'], '2.B')[0]
+    with pytest.raises(KeyError):
+        model.is_descendant(['2.A'], '9.Z')
+
+def test_ancestor_table_masks_unknown_elements(model):
+    table = model.ancestor_table(['2.A.1.a', '1', '9.Z'])
+    assert table.columns.tolist() == ['LEVEL_1', 'LEVEL_2', 'LEVEL_3', 'LEVEL_4']
+    assert table.iloc[0].tolist() == ['2', '2.A', '2.A.1', '2.A.1.a']
+    assert table.iloc[1, 0] == '1' and table.iloc[1, 1:].isna().all()
+    assert table.iloc[2].isna().all()
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+from onet_impute import impute_related
+
+"""
+Tests of the imputation of missing occupations from their related occupations.
+"""
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        'ONET_SOC_CODE': ['A', 'A', 'B', 'B', 'C'],
+        'ELEMENT_ID': ['1', '2', '1', '2', '1'],
+        'SCALE_ID': ['IM'] * 5,
+        'DATA_VALUE': [1.0, 2.0, 3.0, np.nan, 5.0],
+    })
+
+@pytest.fixture
+def related():
+    return pd.DataFrame({
+        'ONET_SOC_CODE': ['X', 'X', 'X', 'Y', 'Y', 'Z', 'A'],
+        'RELATED_ONET_SOC_CODE': ['A', 'B', 'C', 'A', 'Z', 'Y', 'B'],
+        'RELATEDNESS_TIER': ['Primary-Short', 'Primary-Long', 'Supplemental', 'PS', 'PS', 'PS', 'PS'],
+        'INDEX': [1, 2, 3, 1, 2, 1, 1],
+    })
+
+def imputed(result):
+    return result.set_index(['ONET_SOC_CODE', 'ELEMENT_ID'])['DATA_VALUE'].to_dict()
+
+def test_equal_weights(df, related):
+    result = impute_related(df, related)
+    assert list(result.columns) == ['ONET_SOC_CODE', 'ELEMENT_ID', 'SCALE_ID', 'DATA_VALUE']
+    # Related occupations without a value for an element are left out of its mean; Y's only observed
+    # related occupation is A (Z is missing too), and Z has no observed related occupation
+    assert imputed(result) == pytest.approx({('X', '1'): 3.0, ('X', '2'): 2.0, ('Y', '1'): 1.0, ('Y', '2'): 2.0})
+    assert (result['SCALE_ID'] == 'IM').all()
+
+def test_tier_weights(df, related):
+    result = impute_related(df, related, weighting='tier')
+    assert imputed(result)[('X', '1')] == pytest.approx((1.0 * 1 + 0.5 * 3 + 0.25 * 5) / 1.75)
+
+def test_index_weights(df, related):
+    result = impute_related(df, related, weighting='index')
+    assert imputed(result)[('X', '1')] == pytest.approx((1 / 1 + 3 / 2 + 5 / 3) / (1 + 1 / 2 + 1 / 3))
+
+def test_duplicate_pairs_count_once(df, related):
+    result = impute_related(df, pd.concat([related, related.iloc[[1]]], ignore_index=True))
+    assert imputed(result)[('X', '1')] == pytest.approx(3.0)
+
+def test_occupations(df, related):
+    result = impute_related(df, related, occupations=['A', 'X'])
+    assert set(result['ONET_SOC_CODE']) == {'X'}
+    assert impute_related(df, related, occupations=['A', 'B']).empty
+
+def test_unknown_weighting(df, related):
+    with pytest.raises(ValueError):
+        impute_related(df, related, weighting='rank')
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+from onet_index import element_indices, index_table
+
+"""
+Tests of the normalized IM x LV indices of element sets.
+"""
+
+def measurements(rows):
+    """Long table from (occupation, SOC, element, IM, LV) tuples."""
+    records = []
+    for occupation, soc, element, im, lv in rows:
+        records.append({'ONET_SOC_CODE': occupation, 'SOC': soc, 'ELEMENT_ID': element, 'SCALE_ID': 'IM', 'DATA_VALUE': im})
+        records.append({'ONET_SOC_CODE': occupation, 'SOC': soc, 'ELEMENT_ID': element, 'SCALE_ID': 'LV', 'DATA_VALUE': lv})
+    return pd.DataFrame(records)
+
+@pytest.fixture
+def df():
+    return measurements([
+        ('11-1011.00', '11-1011', '2.A.1.a', 5.0, 7.0),
+        ('11-1011.00', '11-1011', '2.A.1.b', 3.0, 4.0),
+        ('11-1011.03', '11-1011', '2.A.1.a', 4.0, 6.0),
+        ('15-1252.00', '15-1252', '2.A.1.a', 1.0, 0.0),
+        ('15-1252.00', '15-1252', '2.A.1.b', 2.0, 3.0),
+        ('15-1252.00', '15-1252', '2.C.1.a', 9.0, 9.0),  # not in the set
+    ])
+
+def test_index_values(df):
+    indices = element_indices(df, {'SKILLS': ['2.A.1.a', '2.A.1.b']}, levels=['ONET_SOC_CODE'])
+    table = index_table(indices, 'ONET_SOC_CODE').set_index('ONET_SOC_CODE')
+    # IM over the pairs: 1..5, LV: 0..7
+    im = {'a0': 1.0, 'b0': 0.5, 'a3': 0.75, 'a5': 0.0, 'b5': 0.25}
+    lv = {'a0': 1.0, 'b0': 4 / 7, 'a3': 6 / 7, 'a5': 0.0, 'b5': 3 / 7}
+    raw = {'11-1011.00': (im['a0'] * lv['a0'] + im['b0'] * lv['b0']) / 2,
+           '11-1011.03': im['a3'] * lv['a3'],
+           '15-1252.00': (im['a5'] * lv['a5'] + im['b5'] * lv['b5']) / 2}
+    low, high = min(raw.values()), max(raw.values())
+    for code, value in raw.items():
+        assert table.loc[code, 'SKILLS'] == pytest.approx((value - low) / (high - low))
+    counts = indices.set_index('CODE')['N_ELEMENTS']
+    assert counts.to_dict() == {'11-1011.00': 2, '11-1011.03': 1, '15-1252.00': 2}
+
+def test_aggregation_level_averages_the_ratings(df):
+    indices = element_indices(df, {'SKILLS': ['2.A.1.a', '2.A.1.b']}, levels=['SOC'])
+    assert indices['CODE'].tolist() == ['11-1011', '15-1252']
+    assert indices['VALUE'].tolist() == pytest.approx([1.0, 0.0])
+
+def test_single_code_level_is_nan(df, caplog):
+    single = df[df['SOC'] == '11-1011']
+    indices = element_indices(single, {'SKILLS': ['2.A.1.a', '2.A.1.b']}, levels=['SOC'])
+    assert len(indices) == 1 and np.isnan(indices['VALUE'].iloc[0])
+    assert 'Cannot normalize' in caplog.text
+
+def test_equal_ratings_are_nan(caplog):
+    df = measurements([('A', 'A', 'E1', 3.0, 4.0), ('B', 'B', 'E1', 3.0, 5.0)])
+    indices = element_indices(df, {'SET': ['E1']}, levels=['ONET_SOC_CODE'])
+    assert indices['VALUE'].isna().all()
+    assert not np.isinf(indices['VALUE']).any()
+    assert 'IM of SET at ONET_SOC_CODE' in caplog.text
@@ -0,0 +1,238 @@
+import os
+import sys
+import glob
+import time
+import logging
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+"""
+Single entry point of the data pipelines: the OFLC scripts and the O*NET refresh, declared as a DAG of
+stages with their inputs and outputs.
+
+- Every stage runs as a subprocess from the repository root (the directory the scripts expect), so the
+  scripts keep working on their own.
+- A stage is skipped when it is up to date: all its outputs exist and its last successful run (a stamp
+  file in STAMP_DIR) is newer than all its inputs, its own script and code included. Stages reading a
+  remote source (`remote=True`) always run, and rely on the script to only rewrite files that changed.
+- Stages whose upstream stages are done run concurrently (e.g. the O*NET refresh alongside the OFLC
+  downloads); a failed stage stops the stages downstream of it only.
+
+Usage (from anywhere):
+    python data_pipeline/run_pipeline.py                      # everything that is out of date
+    python data_pipeline/run_pipeline.py --dry-run            # what would run, and why
+    python data_pipeline/run_pipeline.py --only onet          # only these stages
+    python data_pipeline/run_pipeline.py --from oflc_long     # a stage and everything downstream of it
+"""
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAMP_DIR = os.path.join(REPO_DIR, 'shared_data', 'pipeline')
+MAX_PARALLEL_STAGES = 4  # stages are subprocesses, each managing its own worker pool
+
+OFLC_DIR = os.path.join('data_pipeline', 'oflc_performance_data')
+OFLC_RAW_DIR = os.path.join('shared_data', 'oflc_performance_data', 'raw')
+OFLC_PROCESSED_DIR = os.path.join('shared_data', 'oflc_performance_data', 'processed')
+ONET_DIR = os.path.join('data_pipeline', 'onet_data')
+ONET_STORE_DIR = os.path.join('shared_data', 'onet_data', 'store')
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class Stage:
+    """
+    A step of the pipeline.
+
+    Args:
+        name: Name of the stage (used by --only and --from).
+        script: Script run by the stage, relative to the repository root.
+        inputs: Glob patterns (relative to the repository root) of the files the stage reads. The script
+            is always an input.
+        outputs: Glob patterns of the files the stage writes; each must match at least one file.
+        after: Names of the stages that must be done before this one.
+        args: Command line arguments of the script.
+        remote: The stage reads a remote source, so it is never up to date.
+    """
+
+    def __init__(self, name: str, script: str, inputs: Sequence[str] = (), outputs: Sequence[str] = (),
+                 after: Sequence[str] = (), args: Sequence[str] = (), remote: bool = False):
+        self.name, self.script = name, script
+        self.inputs = [script] + list(inputs)
+        self.outputs, self.after, self.args = list(outputs), list(after), list(args)
+        self.remote = remote
+
+    def __repr__(self):
+        return f"Stage({self.name!r})"
+
+STAGES = [
+    Stage('oflc_index', os.path.join(OFLC_DIR, '01_create_index.py'), remote=True,
+          outputs=[os.path.join(OFLC_RAW_DIR, 'index.csv'), os.path.join(OFLC_RAW_DIR, 'fetch_plan.csv')]),
+    Stage('oflc_download', os.path.join(OFLC_DIR, '02_download_raw_data.py'), after=['oflc_index'],
+          inputs=[os.path.join(OFLC_RAW_DIR, 'index.csv'), os.path.join(OFLC_RAW_DIR, 'fetch_plan.csv'),
+                  os.path.join(OFLC_DIR, 'downloader.py'), os.path.join(OFLC_DIR, 'convert.py')],
+          outputs=[os.path.join(OFLC_RAW_DIR, '*', '*.parquet')]),
+    Stage('oflc_long', os.path.join(OFLC_DIR, '03_create_long_dataset.py'), after=['oflc_download'],
+          inputs=[os.path.join(OFLC_RAW_DIR, '*', '*.parquet'), os.path.join(OFLC_RAW_DIR, '*', '*.csv'),
+                  os.path.join(OFLC_DIR, '*.py')],
+          outputs=[os.path.join(OFLC_PROCESSED_DIR, 'long', 'PROGRAM=*', 'FISCAL_YEAR=*', '*.parquet'),
+                   os.path.join(OFLC_PROCESSED_DIR, 'employers', 'employers.parquet')]),
+    Stage('onet', os.path.join(ONET_DIR, '01_download_onet_data.py'),
+          inputs=[os.path.join(ONET_DIR, '*.py')],
+          outputs=[os.path.join(ONET_STORE_DIR, '*', 'reference', '*.arrow'),
+                   os.path.join(ONET_STORE_DIR, '*', 'measure', '*.arrow')]),
+]
+
+def expand(patterns: Iterable[str], root: str = REPO_DIR) -> List[str]:
+    """Files matching glob patterns relative to `root`."""
+    return sorted({path for pattern in patterns for path in glob.glob(os.path.join(root, pattern), recursive=True)
+                   if os.path.isfile(path)})
+
+def stamp_path(stage: Stage, stamp_dir: str = STAMP_DIR) -> str:
+    """Stamp file of a stage, touched when the stage succeeds."""
+    return os.path.join(stamp_dir, f"{stage.name}.done")
+
+def check_stage(stage: Stage, root: str = REPO_DIR, stamp_dir: str = STAMP_DIR) -> Tuple[bool, str]:
+    """
+    Whether a stage needs to run.
+
+    Returns:
+        (run, reason): True if the stage is out of date, and why.
+    """
+    if stage.remote:
+        return True, "remote source"
+    for pattern in stage.outputs:
+        if not expand([pattern], root):
+            return True, f"missing output {pattern}"
+    stamp = stamp_path(stage, stamp_dir)
+    if not os.path.exists(stamp):
+        return True, "never run"
+    inputs = expand(stage.inputs, root)
+    newest = max(inputs, key=os.path.getmtime, default=None)
+    if newest is not None and os.path.getmtime(newest) > os.path.getmtime(stamp):
+        return True, f"{os.path.relpath(newest, root)} changed"
+    return False, "up to date"
+
+def select_stages(stages: Sequence[Stage], only: Optional[Sequence[str]] = None,
+                  start: Optional[str] = None) -> List[Stage]:
+    """
+    Stages selected by --only (these stages, their upstream stages being taken as done) or --from (a
+    stage and every stage downstream of it), in declaration order.
+    """
+    names = {stage.name for stage in stages}
+    unknown = set(only or []) - names | ({start} - names if start else set())
+    if unknown:
+        raise ValueError(f"Unknown stages: {sorted(unknown)} (stages: {sorted(names)})")
+    if only:
+        return [stage for stage in stages if stage.name in only]
+    if start:
+        selected = {start}
+        for stage in stages:  # declaration order is a topological order
+            if selected & set(stage.after):
+                selected.add(stage.name)
+        return [stage for stage in stages if stage.name in selected]
+    return list(stages)
+
+def run_stage(stage: Stage, root: str = REPO_DIR, stamp_dir: str = STAMP_DIR) -> int:
+    """Runs the script of a stage and touches its stamp on success. Returns the exit status."""
+    status = subprocess.run([sys.executable, stage.script] + stage.args, cwd=root).returncode
+    if status == 0:
+        os.makedirs(stamp_dir, exist_ok=True)
+        with open(stamp_path(stage, stamp_dir), 'w') as f:
+            f.write(time.strftime('%Y-%m-%d %H:%M:%S\n'))
+    return status
+
+def run_pipeline(stages: Sequence[Stage], force: bool = False, dry_run: bool = False,
+                 max_parallel: int = MAX_PARALLEL_STAGES, root: str = REPO_DIR,
+                 stamp_dir: str = STAMP_DIR) -> Dict[str, str]:
+    """
+    Runs the stages in dependency order, concurrently when they do not depend on each other.
+
+    A stage is checked (see `check_stage`) once its upstream stages are done, so the check sees the
+    files they wrote. Upstream stages that are not in `stages` are taken as done.
+
+    Args:
+        stages: Stages to run (see `select_stages`).
+        force: Run the stages even when they are up to date.
+        dry_run: Only report what would run. Stages downstream of a stage that would run are reported
+            as depending on it (whether they run depends on the files it writes).
+        max_parallel: Maximum number of stages running at the same time.
+
+    Returns:
+        The outcome of each stage: 'ran', 'skipped', 'failed', 'blocked' (an upstream stage failed), or in
+        a dry run 'would run', 'skipped' and 'depends'.
+    """
+    names = {stage.name for stage in stages}
+    outcomes: Dict[str, str] = {}
+    pending = list(stages)
+    running = {}
+    started = {}
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        while pending or running:
+            for stage in list(pending):
+                upstream = [name for name in stage.after if name in names]
+                if any(outcomes.get(name) in ('failed', 'blocked') for name in upstream):
+                    outcomes[stage.name] = 'blocked'
+                    logger.error(f"[{stage.name}] not run, an upstream stage failed")
+                elif dry_run and any(outcomes.get(name) in ('would run', 'depends') for name in upstream):
+                    outcomes[stage.name] = 'depends'
+                    logger.info(f"[{stage.name}] depends on the outputs of {', '.join(upstream)}")
+                elif all(name in outcomes for name in upstream):
+                    run, reason = (True, "forced") if force else check_stage(stage, root, stamp_dir)
+                    if not run:
+                        outcomes[stage.name] = 'skipped'
+                        logger.info(f"[{stage.name}] skipped, {reason}")
+                    elif dry_run:
+                        outcomes[stage.name] = 'would run'
+                        logger.info(f"[{stage.name}] would run, {reason}")
+                    else:
+                        logger.info(f"[{stage.name}] running {stage.script}, {reason}")
+                        started[stage.name] = time.monotonic()
+                        running[executor.submit(run_stage, stage, root, stamp_dir)] = stage
+                else:
+                    continue
+                pending.remove(stage)
+
+            if not running:
+                if pending:  # only possible with a cycle in `after`
+                    raise ValueError(f"Circular dependencies between {[stage.name for stage in pending]}")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                elapsed = time.monotonic() - started[stage.name]
+                try:
+                    status = future.result()
+                except Exception as e:
+                    logger.error(f"[{stage.name}] could not be started: {e}")
+                    status = -1
+                outcomes[stage.name] = 'ran' if status == 0 else 'failed'
+                if status == 0:
+                    logger.info(f"[{stage.name}] done in {elapsed:.1f}s")
+                else:
+                    logger.error(f"[{stage.name}] failed (exit status {status}) after {elapsed:.1f}s")
+    return outcomes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the out-of-date stages of the data pipelines.")
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument('--only', nargs='+', metavar='STAGE', help="Run only these stages.")
+    selection.add_argument('--from', dest='start', metavar='STAGE',
+                           help="Run this stage and every stage downstream of it.")
+    parser.add_argument('--force', action='store_true', help="Run the selected stages even when they are up to date.")
+    parser.add_argument('--dry-run', action='store_true', help="Only report which stages would run, and why.")
+    parser.add_argument('--jobs', type=int, default=MAX_PARALLEL_STAGES, help="Maximum number of stages running at the same time.")
+    parser.add_argument('--list', action='store_true', help="List the stages and exit.")
+    args = parser.parse_args()
+
+    if args.list:
+        for stage in STAGES:
+            print(f"{stage.name:15} {stage.script}" + (f"  (after {', '.join(stage.after)})" if stage.after else ""))
+        sys.exit(0)
+    try:
+        selected = select_stages(STAGES, args.only, args.start)
+    except ValueError as e:
+        parser.error(str(e))
+    outcomes = run_pipeline(selected, force=args.force, dry_run=args.dry_run, max_parallel=args.jobs)
+    logger.info("Summary: " + ", ".join(f"{name} {outcome}" for name, outcome in outcomes.items()))
+    sys.exit(1 if any(outcome in ('failed', 'blocked') for outcome in outcomes.values()) else 0)
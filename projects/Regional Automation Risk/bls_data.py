@@ -1,18 +1,246 @@
 # %%
-import requests
+import os
 import json
+import time
+import hashlib
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+"""
+Client for the BLS Public Data API (v2) time series endpoint (OEWS, CES, ... series).
+
+Series are packed into requests of the API's maximum size (series per request and years per request),
+long year ranges are split, and requests run concurrently under a sliding-window rate limit. Every
+(series, year) answer is kept in an on-disk JSON cache, so reruns only request what is not cached yet
+(the current year is never cached, as its data are still being published). Answers to requests with
+options (e.g. annualaverage, calculations) are cached separately, under a hash of the options.
+
+The registration key is read from the BLS_API_KEY environment variable, and the endpoint can be pointed
+at another server (e.g. a local mock) with BLS_API_URL or the `base_url` argument.
+
+Example:
+    from bls_data import BLSClient
+
+    client = BLSClient()
+    df = client.get_series(["OEUM001018000000000000001"], start_year=2021, end_year=2023)
+"""
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+API_URL = os.environ.get('BLS_API_URL', 'https://api.bls.gov/publicAPI/v2/timeseries/data/')
+CACHE_DIR = os.path.join(PROJECT_DIR, 'data', 'bls_api')
+
+# API limits with and without a registration key: series per request, years per request, and
+# requests per rate-limit window (https://www.bls.gov/developers/api_faqs.htm)
+LIMITS = {
+    True: {'max_series': 50, 'max_years': 20},
+    False: {'max_series': 25, 'max_years': 10},
+}
+RATE_LIMIT = (50, 10.0)  # requests, seconds
+MAX_WORKERS = 4
+TIMEOUT = 60
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 1.0
+
+class BLSAPIError(Exception):
+    """The API did not process a request (e.g. daily threshold reached or invalid key)."""
+
+class RateLimiter:
+    """Thread-safe sliding-window rate limiter: at most `calls` acquisitions per `period` seconds."""
+
+    def __init__(self, calls: int, period: float):
+        self.calls, self.period = calls, period
+        self._times = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._times and now - self._times[0] >= self.period:
+                    self._times.popleft()
+                if len(self._times) < self.calls:
+                    self._times.append(now)
+                    return
+                wait = self.period - (now - self._times[0])
+            time.sleep(wait)
+
+def _create_session(pool_size: int, max_retries: int, backoff_factor: float) -> requests.Session:
+    """Pooled session retrying throttled and failed requests (POST included) with exponential backoff."""
+    retry = Retry(total=max_retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(['POST']))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def options_key(options: Optional[Dict] = None) -> str:
+    """Suffix of the cache files of a request with options: a hash of the sorted options ('' without options)."""
+    if not options:
+        return ''
+    canonical = json.dumps(options, sort_keys=True, default=str)
+    return '_' + hashlib.sha1(canonical.encode()).hexdigest()[:12]
+
+def _chunks(items: List, size: int) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+class BLSClient:
+    """
+    Batched, rate-limited and cached client of the BLS time series API.
+
+    Args:
+        api_key: Registration key. Defaults to the BLS_API_KEY environment variable (requests without a key
+            have lower limits).
+        base_url: API endpoint. Defaults to BLS_API_URL or the public endpoint.
+        cache_dir: Directory of the response cache (None disables the cache).
+        max_workers: Maximum number of concurrent requests.
+        rate_limit: (requests, seconds) allowed per sliding window.
+        max_series, max_years: Series and years per request (default to the API limits).
+        session: Session used for the requests (defaults to a pooled session with retries).
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: str = API_URL, cache_dir: Optional[str] = CACHE_DIR,
+                 max_workers: int = MAX_WORKERS, rate_limit: Tuple[int, float] = RATE_LIMIT,
+                 max_series: Optional[int] = None, max_years: Optional[int] = None,
+                 session: Optional[requests.Session] = None, timeout: int = TIMEOUT):
+        self.api_key = api_key if api_key is not None else os.environ.get('BLS_API_KEY')
+        limits = LIMITS[bool(self.api_key)]
+        self.base_url, self.cache_dir, self.timeout = base_url, cache_dir, timeout
+        self.max_workers = max_workers
+        self.max_series = max_series or limits['max_series']
+        self.max_years = max_years or limits['max_years']
+        self.limiter = RateLimiter(*rate_limit)
+        self.session = session or _create_session(max_workers, MAX_RETRIES, BACKOFF_FACTOR)
+        self.requests_made = 0
+        self._count_lock = threading.Lock()
+
+    # Cache: one JSON file per series, year and request options with the list of observations of that year
+
+    def _cache_path(self, series_id: str, year: int, options: Optional[Dict] = None) -> str:
+        return os.path.join(self.cache_dir, series_id, f"{year}{options_key(options)}.json")
+
+    def _is_cached(self, series_id: str, year: int, options: Optional[Dict] = None) -> bool:
+        return self.cache_dir is not None and os.path.exists(self._cache_path(series_id, year, options))
+
+    def _read_cache(self, series_id: str, year: int, options: Optional[Dict] = None) -> Optional[List[Dict]]:
+        if not self._is_cached(series_id, year, options):
+            return None
+        with open(self._cache_path(series_id, year, options)) as f:
+            return json.load(f)
+
+    def _write_cache(self, series_id: str, year: int, observations: List[Dict], options: Optional[Dict] = None):
+        if self.cache_dir is None or year >= date.today().year:
+            return
+        path = self._cache_path(series_id, year, options)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(observations, f)
+        os.replace(path + '.tmp', path)
+
+    def _post(self, series_ids: List[str], start_year: int, end_year: int, **options) -> Dict[str, List[Dict]]:
+        """One API request: the observations of each series, by series id."""
+        payload = {'seriesid': series_ids, 'startyear': str(start_year), 'endyear': str(end_year), **options}
+        if self.api_key:
+            payload['registrationkey'] = self.api_key
+        self.limiter.acquire()
+        response = self.session.post(self.base_url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        with self._count_lock:
+            self.requests_made += 1
+        result = response.json()
+        if result.get('status') != 'REQUEST_SUCCEEDED':
+            raise BLSAPIError(f"{result.get('status')}: {' '.join(result.get('message', []))}")
+        for message in result.get('message', []):
+            logging.info(f"BLS API: {message}")
+        return {series['seriesID']: series.get('data', []) for series in result['Results'].get('series', [])}
+
+    def _plan(self, series_ids: List[str], start_year: int, end_year: int,
+              options: Optional[Dict] = None) -> List[Tuple[List[str], int, int]]:
+        """
+        Requests needed for the (series, year) pairs missing from the cache: series missing the same year
+        span are packed together, `max_series` per request, and spans are split every `max_years` years.
+        """
+        spans = {}
+        for series_id in series_ids:
+            missing = [year for year in range(start_year, end_year + 1) if not self._is_cached(series_id, year, options)]
+            if missing:
+                spans.setdefault((missing[0], missing[-1]), []).append(series_id)
+        plan = []
+        for (first, last), ids in spans.items():
+            for year in range(first, last + 1, self.max_years):
+                for batch in _chunks(ids, self.max_series):
+                    plan.append((batch, year, min(year + self.max_years - 1, last)))
+        return plan
+
+    def _fetch(self, request: Tuple[List[str], int, int], **options) -> Dict[Tuple[str, int], List[Dict]]:
+        series_ids, first, last = request
+        data = self._post(series_ids, first, last, **options)
+        observations = {(series_id, year): [] for series_id in series_ids for year in range(first, last + 1)}
+        for series_id, rows in data.items():
+            for row in rows:
+                observations.setdefault((series_id, int(row['year'])), []).append(row)
+        for (series_id, year), rows in observations.items():
+            self._write_cache(series_id, year, rows, options)
+        return observations
+
+    def get_series(self, series_ids: Iterable[str], start_year: int, end_year: int, **options) -> pd.DataFrame:
+        """
+        Observations of several series over a range of years.
+
+        Args:
+            series_ids: Series ids (duplicates are requested once).
+            start_year, end_year: Range of years (inclusive).
+            **options: Other request parameters of the API (e.g. catalog=True, annualaverage=True).
+
+        Returns:
+            A tidy DataFrame with one row per observation: SERIES_ID, YEAR, PERIOD, PERIOD_NAME, VALUE (NaN
+            where the value is not available) and FOOTNOTES.
+        """
+        series_ids = list(dict.fromkeys(series_ids))
+        plan = self._plan(series_ids, start_year, end_year, options)
+        logging.info(f"{len(series_ids)} series, {len(plan)} requests to the BLS API")
+        fetched = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for observations in executor.map(lambda request: self._fetch(request, **options), plan):
+                fetched.update(observations)
 
-url = 'https://api.bls.gov/publicAPI/v2/timeseries/data/'
-headers = {'Content-type': 'application/json'}
-data = json.dumps({
-    "seriesid": ["OEUM001018000000000000001"], # Example series ID for OEWS
-    "startyear": "2023",
-    "endyear": "2023",
-    "registrationkey": "b88f9f5001c84b3bb69c4771a63a6123"
-})
+        rows = []
+        for series_id in series_ids:
+            for year in range(start_year, end_year + 1):
+                observations = fetched.get((series_id, year))
+                if observations is None:
+                    observations = self._read_cache(series_id, year, options) or []
+                rows.extend((series_id, row) for row in observations)
+        return to_frame(rows)
 
-response = requests.post(url, data=data, headers=headers)
-json_data = json.loads(response.text)
+def to_frame(rows: List[Tuple[str, Dict]]) -> pd.DataFrame:
+    """Tidy DataFrame of (series id, observation) pairs of the API."""
+    df = pd.DataFrame({
+        'SERIES_ID': [series_id for series_id, _ in rows],
+        'YEAR': np.array([int(row['year']) for _, row in rows], dtype=np.int64),
+        'PERIOD': [row['period'] for _, row in rows],
+        'PERIOD_NAME': [row.get('periodName') for _, row in rows],
+        'VALUE': [row.get('value') for _, row in rows],
+        'FOOTNOTES': ['; '.join(note['text'] for note in row.get('footnotes', []) if note and note.get('text'))
+                      for _, row in rows],
+    })
+    # Values are strings, with '-' (or other markers) where not available
+    df['VALUE'] = pd.to_numeric(df['VALUE'].str.replace(',', '', regex=False), errors='coerce')
+    return df
 
-json_data
 # %%
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    client = BLSClient()
+    json_data = client.get_series(["OEUM001018000000000000001"], start_year=2023, end_year=2023)  # Example series ID for OEWS
+    print(json_data)
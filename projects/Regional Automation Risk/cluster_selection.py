@@ -0,0 +1,228 @@
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.cluster import KMeans
+from sklearn.metrics import pairwise_distances
+from sklearn.preprocessing import StandardScaler
+
+"""
+Model selection for the KMeans clustering of occupations by skill (elbow, silhouette and gap statistic).
+
+- Fits are cached per (matrix hash, k, random state), in memory and on disk, so sweeping k again, or
+  coming back to a skill subset, only fits what has not been fitted yet.
+- Within-cluster dispersions are computed from per-cluster sums (one sparse one-hot product), with no
+  loop over the clusters.
+- Silhouettes reuse one pairwise-distance matrix for every k (optionally over a fixed sample of
+  occupations): the distances of every occupation to every cluster are one matrix product.
+- The k x reference-draw grid of the gap statistic runs on a process pool (fits and references run in
+  this process when there is a single task, or max_workers is 1).
+
+Example:
+    from cluster_selection import skill_matrix, cluster_occupations, sweep_k, gap_statistic
+
+    matrix = skill_matrix(onet_data_pivot, scale='IM')
+    scores = sweep_k(matrix, range(2, 30))                       # K, INERTIA, SILHOUETTE
+    gaps = gap_statistic(matrix, range(1, 101), n_refs=20)       # K, GAP, SD, ...
+    clustered = cluster_occupations(onet_data_pivot, num_clusters=8)
+"""
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(PROJECT_DIR, 'data', 'clusters')
+RANDOM_STATE = 42
+MAX_WORKERS = os.cpu_count()
+
+_fits: Dict[Tuple[str, int, int], Tuple[np.ndarray, float]] = {}
+
+def skill_matrix(onet_data_pivot: pd.DataFrame, scale: str = 'IM', elements: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Occupation x element matrix of one scale (missing ratings as 0), optionally for a subset of elements."""
+    if elements is not None:
+        onet_data_pivot = onet_data_pivot[onet_data_pivot['Element ID'].isin(list(elements))]
+    return onet_data_pivot.pivot_table(index='OCC_CODE', columns='Element ID', values=scale, aggfunc='mean').fillna(0)
+
+def standardize(matrix) -> np.ndarray:
+    """Standardized (zero mean, unit variance) copy of a matrix as a float64 array."""
+    return StandardScaler().fit_transform(np.asarray(matrix, dtype='float64'))
+
+def matrix_hash(data: np.ndarray) -> str:
+    """Hash of the shape and values of a matrix, the cache key of its fits."""
+    data = np.ascontiguousarray(data, dtype='float64')
+    return hashlib.sha1(str(data.shape).encode() + data.tobytes()).hexdigest()[:16]
+
+def dispersion(data: np.ndarray, labels: np.ndarray, k: Optional[int] = None) -> float:
+    """
+    Total within-cluster sum of squared distances to the cluster means:
+    sum ||x||^2 - sum_c ||S_c||^2 / n_c, with S_c the sum and n_c the size of cluster c.
+    """
+    k = k or int(labels.max()) + 1
+    one_hot = sp.csr_matrix((np.ones(len(labels)), (labels, np.arange(len(labels)))), shape=(k, len(labels)))
+    sums = one_hot @ data
+    counts = np.bincount(labels, minlength=k)
+    nonempty = counts > 0
+    return float(np.square(data).sum() - (np.square(sums[nonempty]).sum(axis=1) / counts[nonempty]).sum())
+
+def _fit(data: np.ndarray, k: int, random_state: int) -> Tuple[np.ndarray, float]:
+    kmeans = KMeans(n_clusters=k, random_state=random_state, n_init=10).fit(data)
+    return kmeans.labels_.astype(np.int32), float(kmeans.inertia_)
+
+def _cache_path(key: Tuple[str, int, int], cache_dir: str) -> str:
+    digest, k, random_state = key
+    return os.path.join(cache_dir, digest, f"k{k}_seed{random_state}.npz")
+
+def fit_kmeans(data: np.ndarray, ks: Iterable[int], random_state: int = RANDOM_STATE,
+               cache_dir: Optional[str] = CACHE_DIR, max_workers: Optional[int] = MAX_WORKERS) -> Dict[int, Tuple[np.ndarray, float]]:
+    """
+    KMeans fits of a matrix for several k, from the cache when available (the others are fitted in parallel,
+    or in this process when only one k is missing or max_workers is 1).
+
+    Returns:
+        For each k, the cluster labels and the inertia.
+    """
+    digest = matrix_hash(data)
+    results, missing = {}, []
+    for k in ks:
+        key = (digest, k, random_state)
+        if key not in _fits and cache_dir is not None and os.path.exists(_cache_path(key, cache_dir)):
+            with np.load(_cache_path(key, cache_dir)) as cached:
+                _fits[key] = (cached['labels'], float(cached['inertia']))
+        if key in _fits:
+            results[k] = _fits[key]
+        else:
+            missing.append(k)
+
+    if len(missing) > 1 and (max_workers is None or max_workers > 1):
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            fitted = list(executor.map(_fit, [data] * len(missing), missing, [random_state] * len(missing)))
+    else:
+        fitted = [_fit(data, k, random_state) for k in missing]
+    for k, (labels, inertia) in zip(missing, fitted):
+        key = (digest, k, random_state)
+        _fits[key] = results[k] = (labels, inertia)
+        if cache_dir is not None:
+            path = _cache_path(key, cache_dir)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            np.savez(path, labels=labels, inertia=inertia)
+    return results
+
+def silhouette(distances: np.ndarray, labels: np.ndarray) -> float:
+    """
+    Mean silhouette coefficient from a precomputed distance matrix (same result as
+    `sklearn.metrics.silhouette_score(distances, labels, metric='precomputed')`).
+    """
+    _, labels = np.unique(labels, return_inverse=True)
+    n, k = len(labels), int(labels.max()) + 1
+    one_hot = sp.csr_matrix((np.ones(n), (np.arange(n), labels)), shape=(n, k))
+    # Sum of the distances of every point to every cluster
+    totals = np.asarray(one_hot.T @ distances.T).T
+    counts = np.bincount(labels, minlength=k).astype('float64')
+    own = counts[labels]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        a = totals[np.arange(n), labels] / (own - 1)
+        means = totals / counts
+        means[np.arange(n), labels] = np.inf
+        b = means.min(axis=1)
+        s = (b - a) / np.maximum(a, b)
+    # Points alone in their cluster have a silhouette of 0
+    return float(np.where(own > 1, np.nan_to_num(s), 0.0).mean())
+
+def sweep_k(matrix, ks: Iterable[int], sample_size: Optional[int] = None, random_state: int = RANDOM_STATE,
+            cache_dir: Optional[str] = CACHE_DIR, max_workers: Optional[int] = MAX_WORKERS) -> pd.DataFrame:
+    """
+    Elbow and silhouette scores of KMeans for several numbers of clusters.
+
+    Args:
+        matrix: Occupation x element matrix (standardized here).
+        ks: Numbers of clusters (at least 2).
+        sample_size: Compute the silhouettes on a fixed random sample of this many occupations (all of
+            them by default), for large matrices.
+        random_state: Random state of the fits and of the sample.
+
+    Returns:
+        A DataFrame with columns K, INERTIA and SILHOUETTE.
+    """
+    data = standardize(matrix)
+    ks = list(ks)
+    fits = fit_kmeans(data, ks, random_state, cache_dir, max_workers)
+
+    sample = np.arange(len(data))
+    if sample_size is not None and sample_size < len(data):
+        sample = np.sort(np.random.default_rng(random_state).choice(len(data), sample_size, replace=False))
+    distances = pairwise_distances(data[sample])
+    return pd.DataFrame({
+        'K': ks,
+        'INERTIA': [fits[k][1] for k in ks],
+        'SILHOUETTE': [silhouette(distances, fits[k][0][sample]) for k in ks],
+    })
+
+def _log_dispersions(data: np.ndarray, k: int, seeds: np.random.SeedSequence, random_state: int) -> np.ndarray:
+    """Log dispersions of the KMeans fits of reference datasets drawn uniformly over the bounding box of the data."""
+    low, high = data.min(axis=0), data.max(axis=0)
+    values = []
+    for seed in seeds:
+        reference = np.random.default_rng(seed).uniform(low, high, size=data.shape)
+        labels, _ = _fit(reference, k, random_state)
+        values.append(np.log(dispersion(reference, labels, k)))
+    return np.array(values)
+
+def gap_statistic(matrix, ks: Iterable[int], n_refs: int = 10, random_state: int = RANDOM_STATE,
+                  cache_dir: Optional[str] = CACHE_DIR, max_workers: Optional[int] = MAX_WORKERS) -> pd.DataFrame:
+    """
+    Gap statistic (Tibshirani, Walther and Hastie, 2001) for several numbers of clusters.
+
+    The fits on the data come from `fit_kmeans` (cached) and the n_refs reference fits of each k run on a
+    process pool, one task per k. Reference draws are seeded from `random_state`, so results are
+    reproducible.
+
+    Returns:
+        A DataFrame with columns K, LOG_W (log dispersion of the data), LOG_W_REF (mean over the
+        references), GAP, SD (standard error of the reference log dispersions, sd * sqrt(1 + 1 / n_refs)),
+        and BEST, True for the smallest k with GAP(k) >= GAP(k + 1) - SD(k + 1).
+    """
+    data = standardize(matrix)
+    ks = list(ks)
+    fits = fit_kmeans(data, ks, random_state, cache_dir, max_workers)
+    log_w = np.array([np.log(dispersion(data, fits[k][0], k)) for k in ks])
+
+    seeds = [seed.spawn(n_refs) for seed in np.random.SeedSequence(random_state).spawn(len(ks))]
+    if len(ks) > 1 and (max_workers is None or max_workers > 1):
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            references = list(executor.map(_log_dispersions, [data] * len(ks), ks, seeds, [random_state] * len(ks)))
+    else:
+        references = [_log_dispersions(data, k, k_seeds, random_state) for k, k_seeds in zip(ks, seeds)]
+    references = np.vstack(references)
+
+    gaps = pd.DataFrame({
+        'K': ks,
+        'LOG_W': log_w,
+        'LOG_W_REF': references.mean(axis=1),
+        'SD': references.std(axis=1) * np.sqrt(1 + 1 / n_refs),
+    })
+    gaps['GAP'] = gaps['LOG_W_REF'] - gaps['LOG_W']
+    criterion = gaps['GAP'] >= (gaps['GAP'] - gaps['SD']).shift(-1)
+    gaps['BEST'] = False
+    if criterion.any():
+        gaps.loc[criterion.idxmax(), 'BEST'] = True
+    return gaps
+
+def cluster_occupations(onet_data_pivot: pd.DataFrame, num_clusters: int = 3, scale: str = 'IM',
+                        elements: Optional[Iterable[str]] = None, random_state: int = RANDOM_STATE,
+                        cache_dir: Optional[str] = CACHE_DIR) -> pd.DataFrame:
+    """
+    Cluster occupations based on skill levels using KMeans clustering.
+
+    Args:
+        onet_data_pivot: Pivoted O*NET data (one row per occupation and element, one column per scale).
+        num_clusters: Number of clusters.
+        scale: Scale used for the clustering ('IM' for importance).
+        elements: Subset of elements to cluster on (all by default).
+
+    Returns:
+        The occupation x element skill matrix with a Cluster column.
+    """
+    matrix = skill_matrix(onet_data_pivot, scale, elements)
+    labels, _ = fit_kmeans(standardize(matrix), [num_clusters], random_state, cache_dir, max_workers=1)[num_clusters]
+    matrix['Cluster'] = labels
+    return matrix
@@ -0,0 +1,129 @@
+from typing import Optional, Sequence
+import numpy as np
+import pandas as pd
+
+"""
+Employment-weighted aggregation of OEWS area data (MSA and nonmetropolitan areas) to larger geographies
+(states, the nation, or any grouping of areas given by a mapping table), and location quotients.
+
+Target geographies and occupations are integer-coded once and every statistic is a segment sum over the
+(geography, occupation) codes (`np.bincount`), so all the statistics of all the groups come out of one
+grouped pass, with no Python code per group.
+
+Suppressed cells (NaN after `oews_data.coerce_numeric`) are left out: a mean is weighted by the employment
+of the areas where both the value and the employment are reported, and a sum is missing when none of the
+areas of the group reports it.
+
+Example:
+    from oews_aggregate import aggregate_areas, location_quotients
+
+    states = aggregate_areas(bls_data, "PRIM_STATE")                    # areas -> states
+    us = aggregate_areas(bls_data, None)                                # areas -> nation
+    regions = aggregate_areas(bls_data, "REGION", mapping=area_regions)  # AREA -> REGION (with SHARE)
+"""
+
+OCCUPATION_KEYS = ['OCC_CODE', 'OCC_TITLE', 'O_GROUP']
+
+def aggregate_areas(df: pd.DataFrame, target: Optional[str], mapping: Optional[pd.DataFrame] = None,
+                    keys: Sequence[str] = OCCUPATION_KEYS, sums: Sequence[str] = ('TOT_EMP',),
+                    means: Sequence[str] = ('H_MEAN', 'A_MEAN'), weight: str = 'TOT_EMP',
+                    area: str = 'AREA') -> pd.DataFrame:
+    """
+    Aggregate area rows to a target geography.
+
+    Args:
+        df: Area data, one row per area and occupation.
+        target: Column with the target geography of each area, in `df` or in `mapping`. None aggregates
+            all the areas together (national totals).
+        mapping: Table mapping each `area` code to its `target` geographies, for geographies that are not a
+            column of `df`. An area may belong to several targets, with an optional SHARE column giving the
+            fraction of its employment assigned to each one (1 by default).
+        keys: Columns identifying an occupation.
+        sums: Columns summed over the areas of a group.
+        means: Columns averaged over the areas of a group, weighted by `weight`.
+        weight: Weight of the means (employment).
+        area: Column with the area codes (used with `mapping`).
+
+    Returns:
+        One row per target geography and occupation with the `sums`, the weighted `means` and N_AREAS,
+        the number of areas of the group.
+    """
+    keys, sums, means = list(keys), list(sums), list(means)
+    rows = np.arange(len(df))
+    share = np.ones(len(df))
+    if target is None:
+        target_code, targets = np.zeros(len(df), dtype=np.int64), pd.Index([None])
+    else:
+        if mapping is not None:
+            # One row per (area row, target) pair, with the share of the area in the target
+            pairs = pd.DataFrame({area: df[area].to_numpy(), '_ROW': rows}).merge(mapping, on=area)
+            rows = pairs['_ROW'].to_numpy()
+            share = pairs['SHARE'].to_numpy(dtype='float64') if 'SHARE' in pairs.columns else np.ones(len(rows))
+            target_values = pairs[target]
+        else:
+            target_values = df[target]
+        target_code, targets = pd.factorize(target_values)
+        # Rows without a target geography are left out, as in groupby
+        keep = target_code >= 0
+        rows, share, target_code = rows[keep], share[keep], target_code[keep]
+
+    occupation_code, occupations = pd.MultiIndex.from_frame(df[keys]).factorize()
+    group, group_index = np.unique(target_code * len(occupations) + occupation_code[rows], return_inverse=True)
+    n_groups = len(group)
+
+    def column(name):
+        return df[name].to_numpy(dtype='float64', na_value=np.nan)[rows]
+
+    result = pd.DataFrame({target: targets.take(group // len(occupations))}) if target is not None else pd.DataFrame(index=range(n_groups))
+    for level, key in enumerate(keys):
+        result[key] = occupations.get_level_values(level).take(group % len(occupations))
+    for name in sums:
+        values = column(name) * share
+        reported = ~np.isnan(values)
+        total = np.bincount(group_index, weights=np.where(reported, values, 0.0), minlength=n_groups)
+        result[name] = np.where(np.bincount(group_index, weights=reported, minlength=n_groups) > 0, total, np.nan)
+    weights = column(weight) * share
+    for name in means:
+        values = column(name)
+        valid = ~np.isnan(values) & ~np.isnan(weights)
+        numerator = np.bincount(group_index, weights=np.where(valid, values * weights, 0.0), minlength=n_groups)
+        denominator = np.bincount(group_index, weights=np.where(valid, weights, 0.0), minlength=n_groups)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[name] = np.where(denominator > 0, numerator / denominator, np.nan)
+    result['N_AREAS'] = np.bincount(group_index, minlength=n_groups)
+    return result
+
+def location_quotients(df: pd.DataFrame, reference, area: str = 'AREA', occupation: str = 'OCC_CODE',
+                       employment: str = 'TOT_EMP', group: str = 'O_GROUP') -> pd.Series:
+    """
+    Location quotient of every row: the share of the occupation in the employment of its area (within
+    its occupation group level, e.g. 'detailed' or 'major'), over the same share in the reference area.
+    Rows with a missing group (e.g. files written before the O_GROUP column) form a group of their own.
+
+    Args:
+        df: Area data, one row per area and occupation.
+        reference: Code of the reference area (e.g. 0 for the nation).
+        area, occupation, employment, group: Columns of `df`.
+
+    Returns:
+        The location quotients, aligned with the rows of `df`.
+    """
+    # Missing areas and groups are codes of their own, so every (area, group) cell key is distinct
+    area_code = pd.factorize(df[area], use_na_sentinel=False)[0]
+    group_code, groups = pd.factorize(df[group], use_na_sentinel=False)
+    occupation_code, occupations = pd.factorize(df[occupation])
+    emp = df[employment].to_numpy(dtype='float64', na_value=np.nan)
+
+    # Share of each row in the employment of its (area, occupation group)
+    cell, cell_index = np.unique(area_code * len(groups) + group_code, return_inverse=True)
+    totals = np.bincount(cell_index, weights=np.nan_to_num(emp), minlength=len(cell))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shares = emp / totals[cell_index]
+
+    # Share of each occupation in the reference area, gathered back to the rows of the occupation
+    is_reference = (df[area] == reference).to_numpy(dtype=bool, na_value=False)
+    reference_share = np.full(len(occupations), np.nan)
+    reference_share[occupation_code[is_reference]] = shares[is_reference]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        quotients = shares / np.where(occupation_code >= 0, reference_share[occupation_code], np.nan)
+    return pd.Series(quotients, index=df.index, name='LOC_QUOTIENT')
@@ -0,0 +1,227 @@
+import os
+import re
+import json
+import logging
+import zipfile
+from typing import List, Optional, Sequence, Tuple
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import requests
+
+"""
+Ingestion of the OEWS (Occupational Employment and Wage Statistics) metropolitan and nonmetropolitan
+area releases (oesm23ma, oesm22ma, ...).
+
+The workbooks are read straight out of the release zip (`oesm23ma.zip`) the first time, streaming the
+rows of the data sheet and keeping only the columns in use (OEWS_COLUMNS, plus any other column asked
+for), the OEWS suppression markers are turned into typed nulls, and every table is cached as a Parquet
+file keyed by release, so later loads read only the requested columns from the columnar cache.
+
+Example:
+    from oews_data import load_oews
+
+    data_msa = load_oews("MSA", release="oesm23ma", columns=["AREA", "OCC_CODE", "TOT_EMP", "A_MEAN"])
+    data_non_msa = load_oews("BOS", release="oesm23ma")
+"""
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+ZIP_DIR = PROJECT_DIR
+DATA_DIR = os.path.join(PROJECT_DIR, 'data')
+CACHE_DIR = os.path.join(DATA_DIR, 'oews')
+DEFAULT_RELEASE = 'oesm23ma'
+RELEASE_URL_TEMPLATE = 'https://www.bls.gov/oes/special-requests/{release}.zip'
+# bls.gov answers requests without a browser-like User-Agent with an "Access Denied" HTML page
+HEADERS = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko)'}
+
+# Tables of a release: MSA (metropolitan areas) and BOS (nonmetropolitan areas, "balance of state")
+TABLE_PATTERNS = {
+    'MSA': r'(^|/)MSA_M\d{4}_dl\.xlsx?$',
+    'BOS': r'(^|/)BOS_M\d{4}_dl\.xlsx?$',
+}
+
+# Markers OEWS writes in numeric columns: '*' and '**' (estimate not released), '#' (wage above the
+# top-coding cap) and '~' (share of employment below 0.5%)
+SUPPRESSION_MARKERS = ['*', '**', '#', '~']
+
+# Columns kept as text, every other column is numeric
+TEXT_COLUMNS = ['AREA_TITLE', 'PRIM_STATE', 'NAICS', 'NAICS_TITLE', 'I_GROUP', 'OWN_CODE',
+                'OCC_CODE', 'OCC_TITLE', 'O_GROUP']
+FLAG_COLUMNS = ['ANNUAL', 'HOURLY']
+
+# Parquet metadata key of the cache listing every column of the workbook sheet (cached or not)
+SHEET_COLUMNS_KEY = b'oews_sheet_columns'
+
+# Columns read from the workbooks and cached by default (those of the analyses); load_oews adds the other
+# columns it is asked for to the cache
+OEWS_COLUMNS = ['AREA', 'AREA_TITLE', 'AREA_TYPE', 'PRIM_STATE', 'OCC_CODE', 'OCC_TITLE', 'O_GROUP',
+                'TOT_EMP', 'LOC_QUOTIENT', 'H_MEAN', 'A_MEAN']
+
+def release_zip_path(release: str = DEFAULT_RELEASE, zip_dir: str = ZIP_DIR) -> str:
+    """Path to the zip file of a release."""
+    return os.path.join(zip_dir, f"{release}.zip")
+
+def download_release(release: str = DEFAULT_RELEASE, zip_dir: str = ZIP_DIR, timeout: int = 300) -> str:
+    """
+    Download the zip file of a release (through a .part file, replaced once the download is complete).
+
+    Raises:
+        ValueError: If the server did not return a zip file (e.g. an "Access Denied" page).
+    """
+    path = release_zip_path(release, zip_dir)
+    url = RELEASE_URL_TEMPLATE.format(release=release)
+    logging.info(f"Downloading {url}")
+    with requests.get(url, headers=HEADERS, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        with open(path + '.part', 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+    if not zipfile.is_zipfile(path + '.part'):
+        os.remove(path + '.part')
+        raise ValueError(f"{url} did not return a zip file")
+    os.replace(path + '.part', path)
+    return path
+
+def _find_member(names: List[str], table: str) -> Optional[str]:
+    pattern = re.compile(TABLE_PATTERNS[table], re.IGNORECASE)
+    matches = [name for name in names if pattern.search(name)]
+    return matches[0] if matches else None
+
+def coerce_numeric(df: pd.DataFrame, markers: List[str] = SUPPRESSION_MARKERS) -> pd.DataFrame:
+    """
+    Convert the numeric columns of an OEWS table to numbers, with the suppression markers as NaN, the
+    text columns to strings and the ANNUAL/HOURLY flags to booleans.
+    """
+    df = df.copy()
+    for column in df.columns:
+        if column in TEXT_COLUMNS:
+            df[column] = df[column].astype('string')
+        elif column in FLAG_COLUMNS:
+            df[column] = df[column].astype('string').str.upper().eq('TRUE').astype('boolean').where(df[column].notna())
+        elif df[column].dtype == object:
+            values = df[column].where(~df[column].isin(markers))
+            df[column] = pd.to_numeric(values, errors='coerce')
+    return df
+
+def read_sheet(source, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Read the first sheet of a workbook (a path or a file object), streaming its rows in read-only mode
+    and keeping only `columns` (all columns by default; columns missing from the sheet are skipped).
+    Header names are stripped and upper-cased (older releases use lower-case headers). Cell values are
+    kept as read (object columns), as `pd.read_excel(..., dtype=object)` does. The names of all the
+    columns of the sheet are in `df.attrs['sheet_columns']`.
+    """
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(name).strip().upper() if name is not None else None for name in next(rows, ())]
+        wanted = {column.strip().upper() for column in columns} if columns is not None else None
+        keep = [(i, name) for i, name in enumerate(header) if name and (wanted is None or name in wanted)]
+        values = {name: [] for _, name in keep}
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            for i, name in keep:
+                values[name].append(row[i] if i < len(row) else None)
+    finally:
+        workbook.close()
+    df = pd.DataFrame({name: pd.Series(column, dtype=object) for name, column in values.items()})
+    df.attrs['sheet_columns'] = [name for name in header if name]
+    return df
+
+def read_release_table(table: str, release: str = DEFAULT_RELEASE, zip_dir: str = ZIP_DIR,
+                       data_dir: str = DATA_DIR, columns: Optional[Sequence[str]] = OEWS_COLUMNS) -> pd.DataFrame:
+    """
+    Read the `columns` of a table of a release (None for all columns) from its workbook, streamed from
+    the release zip. Falls back to an unzipped copy of the release in `data_dir`/{release}/ when the zip
+    is missing or is not a zip file.
+    """
+    path = release_zip_path(release, zip_dir)
+    if os.path.exists(path) and zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            member = _find_member(zf.namelist(), table)
+            if member is None:
+                raise FileNotFoundError(f"No {table} workbook in {path}")
+            logging.info(f"Reading {member} from {path}")
+            with zf.open(member) as f:
+                return read_sheet(f, columns)
+
+    directory = os.path.join(data_dir, release)
+    member = _find_member(os.listdir(directory), table) if os.path.isdir(directory) else None
+    if member is None:
+        problem = "is not a zip file" if os.path.exists(path) else "does not exist"
+        raise FileNotFoundError(f"{path} {problem} and there is no unzipped {table} workbook in {directory} "
+                                f"(download the release with download_release('{release}'))")
+    logging.info(f"Reading {os.path.join(directory, member)}")
+    return read_sheet(os.path.join(directory, member), columns)
+
+def cache_path(table: str, release: str = DEFAULT_RELEASE, cache_dir: str = CACHE_DIR) -> str:
+    """Path to the cached Parquet file of a table of a release."""
+    return os.path.join(cache_dir, release, f"{table}.parquet")
+
+def build_table(table: str, release: str = DEFAULT_RELEASE, zip_dir: str = ZIP_DIR,
+                cache_dir: str = CACHE_DIR, columns: Optional[Sequence[str]] = OEWS_COLUMNS) -> str:
+    """
+    Read the columns of a table from the release workbook, coerce their types and write them to the cache,
+    with the names of all the columns of the sheet in the metadata (see `cached_columns`).
+    """
+    df = read_release_table(table, release, zip_dir, columns=columns)
+    sheet_columns = df.attrs.get('sheet_columns', list(df.columns))
+    arrow_table = pa.Table.from_pandas(coerce_numeric(df), preserve_index=False)
+    metadata = {**(arrow_table.schema.metadata or {}), SHEET_COLUMNS_KEY: json.dumps(sheet_columns).encode()}
+    path = cache_path(table, release, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pq.write_table(arrow_table.replace_schema_metadata(metadata), path + '.tmp')
+    os.replace(path + '.tmp', path)
+    return path
+
+def cached_columns(path: str) -> Tuple[List[str], Optional[List[str]]]:
+    """
+    The columns of a cached table, and all the columns of the sheet it was read from (None if the cache
+    does not record them); ([], None) without a cache.
+    """
+    if not os.path.exists(path):
+        return [], None
+    schema = pq.read_schema(path)
+    sheet_columns = (schema.metadata or {}).get(SHEET_COLUMNS_KEY)
+    return schema.names, json.loads(sheet_columns) if sheet_columns is not None else None
+
+def load_oews(table: str = 'MSA', release: str = DEFAULT_RELEASE, columns: Optional[List[str]] = None,
+              zip_dir: str = ZIP_DIR, cache_dir: str = CACHE_DIR) -> pd.DataFrame:
+    """
+    Load a table of an OEWS release from the columnar cache, building the cache on first use (or when
+    the release zip is newer than the cache, or a requested column is not cached).
+
+    Args:
+        table: 'MSA' (metropolitan areas) or 'BOS' (nonmetropolitan areas).
+        release: Release name (e.g. 'oesm23ma').
+        columns: Columns to read (all the cached columns by default, OEWS_COLUMNS unless other columns
+            were asked for before).
+        zip_dir: Directory of the release zip files.
+        cache_dir: Directory of the cache.
+
+    Returns:
+        The table, with text columns as strings and numeric columns as numbers (NaN where suppressed).
+
+    Raises:
+        KeyError: If a requested column is not in the workbook of the release.
+    """
+    if table not in TABLE_PATTERNS:
+        raise ValueError(f"Unknown table {table!r}, expected one of {list(TABLE_PATTERNS)}")
+    path = cache_path(table, release, cache_dir)
+    zip_path = release_zip_path(release, zip_dir)
+    cached, sheet_columns = cached_columns(path)
+    if sheet_columns is not None:
+        _check_columns(columns, sheet_columns, table, release)
+    missing = [column for column in columns or [] if column not in cached]
+    if (not cached or missing
+            or (zipfile.is_zipfile(zip_path) and os.path.getmtime(zip_path) > os.path.getmtime(path))):
+        build_table(table, release, zip_dir, cache_dir, columns=list(dict.fromkeys(OEWS_COLUMNS + cached + missing)))
+        _check_columns(columns, cached_columns(path)[1], table, release)
+    return pq.read_table(path, columns=columns).to_pandas()
+
+def _check_columns(columns: Optional[Sequence[str]], sheet_columns: Sequence[str], table: str, release: str):
+    unknown = [column for column in columns or [] if column not in sheet_columns]
+    if unknown:
+        raise KeyError(f"Columns {unknown} are not in the {table} table of {release} (columns: {list(sheet_columns)})")
@@ -0,0 +1,77 @@
+import json
+from http.server import BaseHTTPRequestHandler
+import pytest
+from bls_data import BLSClient, BLSAPIError
+
+"""
+Tests of the BLS API client against a local stand-in of the time series endpoint.
+"""
+
+class MockBLSHandler(BaseHTTPRequestHandler):
+    """Answers every series with one annual observation per year; the value encodes the options."""
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.payloads.append(payload)
+        if payload['seriesid'] == ['FAIL']:
+            body = {'status': 'REQUEST_NOT_PROCESSED', 'message': ['Daily threshold reached']}
+        else:
+            value = '2.5' if payload.get('annualaverage') else '1,000'
+            series = [{
+                'seriesID': series_id,
+                'data': [{'year': str(year), 'period': 'A01', 'periodName': 'Annual', 'value': value, 'footnotes': [{}]}
+                         for year in range(int(payload['startyear']), int(payload['endyear']) + 1)],
+            } for series_id in payload['seriesid']]
+            body = {'status': 'REQUEST_SUCCEEDED', 'message': [], 'Results': {'series': series}}
+        content = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+@pytest.fixture
+def server(http_server):
+    return http_server(MockBLSHandler, payloads=[])
+
+@pytest.fixture
+def client(server, tmp_path):
+    return BLSClient(api_key='', base_url=server.url, cache_dir=str(tmp_path),
+                     max_series=2, max_years=2, rate_limit=(1000, 1.0))
+
+SERIES = ['S1', 'S2', 'S3', 'S4', 'S5']
+
+def test_batches_series_and_splits_years(client, server):
+    df = client.get_series(SERIES, 2010, 2014)
+    # 3 batches of at most 2 series x 3 spans of at most 2 years
+    assert client.requests_made == 9
+    assert all(len(payload['seriesid']) <= 2 for payload in server.payloads)
+    assert {(payload['startyear'], payload['endyear']) for payload in server.payloads} == {('2010', '2011'), ('2012', '2013'), ('2014', '2014')}
+    assert len(df) == len(SERIES) * 5
+    assert sorted(df['SERIES_ID'].unique()) == SERIES
+    assert (df['VALUE'] == 1000).all()
+
+def test_reuses_the_cache(client, server):
+    client.get_series(SERIES, 2010, 2012)
+    made = client.requests_made
+    df = client.get_series(SERIES, 2010, 2012)
+    assert client.requests_made == made
+    assert len(df) == len(SERIES) * 3
+
+    # Only the missing years are requested, for all the series at once
+    client.get_series(SERIES, 2010, 2013)
+    new_payloads = server.payloads[made:]
+    assert {(payload['startyear'], payload['endyear']) for payload in new_payloads} == {('2013', '2013')}
+
+def test_options_are_cached_separately(client):
+    plain = client.get_series(['S1'], 2010, 2010)
+    averaged = client.get_series(['S1'], 2010, 2010, annualaverage=True)
+    assert client.requests_made == 2
+    assert plain['VALUE'].tolist() == [1000]
+    assert averaged['VALUE'].tolist() == [2.5]
+    client.get_series(['S1'], 2010, 2010, annualaverage=True)
+    assert client.requests_made == 2
+
+def test_raises_when_the_request_is_not_processed(client):
+    with pytest.raises(BLSAPIError, match='Daily threshold'):
+        client.get_series(['FAIL'], 2010, 2010)
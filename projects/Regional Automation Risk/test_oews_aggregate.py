@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+from oews_aggregate import aggregate_areas, location_quotients
+
+"""
+Tests of the employment-weighted aggregation of OEWS areas and of the location quotients.
+"""
+
+@pytest.fixture
+def areas():
+    return pd.DataFrame({
+        'AREA': [1, 1, 2, 2, 3],
+        'PRIM_STATE': ['TX', 'TX', 'TX', 'TX', 'OK'],
+        'OCC_CODE': ['11-0000', '15-1252', '11-0000', '15-1252', '15-1252'],
+        'OCC_TITLE': ['Management', 'Software Developers', 'Management', 'Software Developers', 'Software Developers'],
+        'O_GROUP': ['major', 'detailed', 'major', 'detailed', 'detailed'],
+        'TOT_EMP': [100.0, 300.0, 50.0, np.nan, 20.0],
+        'H_MEAN': [50.0, 60.0, 40.0, 70.0, np.nan],
+        'A_MEAN': [104000.0, 124800.0, 83200.0, 145600.0, 90000.0],
+    })
+
+def test_aggregate_to_states(areas):
+    states = aggregate_areas(areas, 'PRIM_STATE').set_index(['PRIM_STATE', 'OCC_CODE'])
+    assert states.loc[('TX', '11-0000'), 'TOT_EMP'] == 150
+    # The employment-weighted mean leaves out the areas without employment
+    assert states.loc[('TX', '11-0000'), 'H_MEAN'] == pytest.approx((50 * 100 + 40 * 50) / 150)
+    assert states.loc[('TX', '15-1252'), 'H_MEAN'] == 60
+    assert states.loc[('TX', '15-1252'), 'N_AREAS'] == 2
+    # A mean is missing when no area of the group reports it
+    assert np.isnan(states.loc[('OK', '15-1252'), 'H_MEAN'])
+
+def test_aggregate_with_a_mapping(areas):
+    mapping = pd.DataFrame({'AREA': [1, 2, 2], 'REGION': ['North', 'North', 'South'], 'SHARE': [1.0, 0.5, 0.5]})
+    regions = aggregate_areas(areas, 'REGION', mapping=mapping).set_index(['REGION', 'OCC_CODE'])
+    assert regions.loc[('North', '11-0000'), 'TOT_EMP'] == 125
+    assert regions.loc[('South', '11-0000'), 'TOT_EMP'] == 25
+    # Area 3 has no region
+    assert ('OK' not in regions.index.get_level_values(0)) and len(regions) == 4
+
+def test_aggregate_nation(areas):
+    nation = aggregate_areas(areas, None).set_index('OCC_CODE')
+    assert nation.loc['15-1252', 'TOT_EMP'] == 320
+    assert nation.loc['15-1252', 'N_AREAS'] == 3
+
+def lq_frame(groups):
+    return pd.DataFrame({
+        'AREA': [0, 0, 1, 1],
+        'OCC_CODE': ['A', 'B', 'A', 'B'],
+        'O_GROUP': groups,
+        'TOT_EMP': [50.0, 50.0, 10.0, 30.0],
+    })
+
+def test_location_quotients():
+    quotients = location_quotients(lq_frame(['detailed'] * 4), reference=0)
+    assert quotients.tolist() == pytest.approx([1.0, 1.0, 0.5, 1.5])
+
+def test_location_quotients_within_groups():
+    df = pd.concat([lq_frame(['detailed'] * 4),
+                    pd.DataFrame({'AREA': [0, 1], 'OCC_CODE': ['M', 'M'], 'O_GROUP': 'major', 'TOT_EMP': [1e6, 1.0]})],
+                   ignore_index=True)
+    assert location_quotients(df, reference=0).tolist() == pytest.approx([1.0, 1.0, 0.5, 1.5, 1.0, 1.0])
+
+def test_location_quotients_missing_group():
+    # The row without a group is a cell of its own, not part of the previous area's last group
+    quotients = location_quotients(lq_frame(['detailed', 'detailed', 'detailed', np.nan]), reference=0)
+    assert quotients.tolist() == pytest.approx([1.0, 1.0, 2.0, 2.0])
+    # Without any group, every area is one cell
+    quotients = location_quotients(lq_frame([np.nan] * 4), reference=0)
+    assert quotients.tolist() == pytest.approx([1.0, 1.0, 0.5, 1.5])
@@ -0,0 +1,64 @@
+import io
+import os
+import zipfile
+import numpy as np
+import openpyxl
+import pytest
+from oews_data import cache_path, load_oews
+
+"""
+Tests of the OEWS ingestion from a release zip to the Parquet cache.
+"""
+
+RELEASE = 'oesm99ma'
+
+@pytest.fixture
+def zip_dir(tmp_path):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    # Lower-case, padded headers, as in older releases
+    sheet.append(['area', 'area_title', ' prim_state ', 'occ_code', 'o_group', 'tot_emp', 'h_mean', 'a_pct10', 'annual'])
+    sheet.append([10180, 'Abilene, TX', 'TX', '00-0000', 'total', 70000, 25.5, '*', None])
+    sheet.append([None] * 9)
+    sheet.append([10180, 'Abilene, TX', 'TX', '11-0000', 'major', '**', '#', 30000, 'TRUE'])
+    workbook.create_sheet('Field Descriptions').append(['Field', 'Description'])
+    content = io.BytesIO()
+    workbook.save(content)
+    with zipfile.ZipFile(tmp_path / f"{RELEASE}.zip", 'w') as zf:
+        zf.writestr(f"{RELEASE}/MSA_M2099_dl.xlsx", content.getvalue())
+    return str(tmp_path)
+
+def load(zip_dir, **kwargs):
+    return load_oews('MSA', release=RELEASE, zip_dir=zip_dir, cache_dir=os.path.join(zip_dir, 'cache'), **kwargs)
+
+def test_default_columns_with_suppression_markers(zip_dir):
+    df = load(zip_dir)
+    # The OEWS_COLUMNS the sheet has, with normalized names; empty rows are skipped
+    assert df.columns.tolist() == ['AREA', 'AREA_TITLE', 'PRIM_STATE', 'OCC_CODE', 'O_GROUP', 'TOT_EMP', 'H_MEAN']
+    assert len(df) == 2
+    assert df['TOT_EMP'].tolist()[0] == 70000 and np.isnan(df['TOT_EMP'].iloc[1])
+    assert np.isnan(df['H_MEAN'].iloc[1])
+    assert str(df['OCC_CODE'].dtype) == 'string'
+
+def test_other_columns_are_added_to_the_cache(zip_dir):
+    load(zip_dir)
+    df = load(zip_dir, columns=['OCC_CODE', 'A_PCT10', 'ANNUAL'])
+    assert np.isnan(df['A_PCT10'].iloc[0]) and df['A_PCT10'].iloc[1] == 30000
+    assert df['ANNUAL'].isna().iloc[0] and df['ANNUAL'].iloc[1]
+    path = cache_path('MSA', RELEASE, os.path.join(zip_dir, 'cache'))
+    mtime = os.path.getmtime(path)
+    assert load(zip_dir, columns=['TOT_EMP', 'ANNUAL']).shape == (2, 2)
+    assert os.path.getmtime(path) == mtime
+
+def test_unknown_column_raises_without_rebuilding(zip_dir):
+    load(zip_dir)
+    path = cache_path('MSA', RELEASE, os.path.join(zip_dir, 'cache'))
+    mtime = os.path.getmtime(path)
+    for _ in range(2):
+        with pytest.raises(KeyError, match='A_MEAN'):
+            load(zip_dir, columns=['AREA', 'A_MEAN'])
+    assert os.path.getmtime(path) == mtime
+
+def test_unknown_column_raises_on_first_build(zip_dir):
+    with pytest.raises(KeyError, match='A_MEAN'):
+        load(zip_dir, columns=['A_MEAN'])